@@ -1,12 +1,32 @@
 # C:\Abetos_app\backend\admin.py
+import os
+import math
 from functools import wraps
-from flask import Blueprint, request, jsonify
+from operator import itemgetter
+from datetime import datetime, date, timedelta
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
-from sqlalchemy import or_
+from sqlalchemy import or_, func, select
 
 from db import db
-from models import Customer, Transaction
+from models import User, Customer, Transaction, CustomerSegment, ProductPrice
 from rules import find_rule, calculate_points
+import leaderboard
+from anomaly import detector as anomaly_detector, rejection as anomaly_rejection
+import redeem_codes
+import redemptions
+from revocation import denylist
+from sharding import router as shard_router
+import sketches
+import exports
+import bulk_import
+import email_utils
+import dbtuning
+import fieldsets
+import segments
+import tiers
+from prices import price_book
+from admission import controller as admission_controller
 
 admin_api = Blueprint("admin_api", __name__)
 
@@ -31,6 +51,21 @@ def normalize_doc(doc: str) -> str:
     return "".join(ch for ch in doc if ch.isdigit())
 
 
+def _require_admin_role():
+    """Dentro de un endpoint admin_only: corta si el rol no es admin."""
+    role = ((get_jwt() or {}).get("role") or "").strip().lower()
+    if role != "admin":
+        return jsonify({"error": "forbidden", "detail": "admin_required"}), 403
+    return None
+
+
+def _operator_id():
+    try:
+        return int(get_jwt_identity())
+    except Exception:
+        return None
+
+
 # -------------------------
 # GET /api/admin/customers/find?doc_number=...
 # -------------------------
@@ -51,15 +86,29 @@ def customers_find():
         "doc_number": c.doc_number,
         "phone": c.phone,
         "member_number": c.member_number,
-        "points_balance": c.points_balance,
+        "points_balance": shard_router.balance(c.id),
         "created_at": c.created_at.isoformat() if c.created_at else None,
     })
 
 
 # -------------------------
 # GET /api/admin/customers/summary
-#   params: q, limit, offset
+#   params: q, limit, offset, fields (p.ej. fields=id,full_name,points_balance)
 # -------------------------
+CUSTOMER_FIELDS = {
+    "id": (Customer.id, fieldsets.same),
+    "full_name": (Customer.full_name, fieldsets.same),
+    "doc_number": (Customer.doc_number, fieldsets.same),
+    "phone": (Customer.phone, fieldsets.same),
+    "member_number": (Customer.member_number, fieldsets.same),
+    "points_balance": (None, fieldsets.same),
+    "created_at": (Customer.created_at, fieldsets.iso),
+    "segment": (CustomerSegment.segment, fieldsets.same),
+    "tier": (Customer.tier, fieldsets.same),
+    "tier_liters_90d": (Customer.tier_liters_90d, fieldsets.as_float),
+}
+
+
 @admin_api.get("/customers/summary")
 @admin_only
 def customers_summary():
@@ -67,10 +116,10 @@ def customers_summary():
     limit = int(request.args.get("limit") or request.args.get("size") or 50)
     offset = int(request.args.get("offset") or 0)
 
-    qry = Customer.query
+    conds = []
     if q:
         like = f"%{q}%"
-        qry = qry.filter(
+        conds.append(
             or_(
                 Customer.full_name.ilike(like),
                 Customer.doc_number.ilike(like),
@@ -79,22 +128,187 @@ def customers_summary():
             )
         )
 
-    total = qry.count()
-    rows = qry.order_by(Customer.created_at.desc()).limit(limit).offset(offset).all()
+    try:
+        fields = fieldsets.parse_fields(request.args.get("fields"), CUSTOMER_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": "bad_request", "detail": f"unknown fields: {e}"}), 400
+
+    # filtros RFM (tabla customer_segments, ver segments.py)
+    wanted = [s.strip() for s in (request.args.get("segment") or "").split(",") if s.strip()]
+    unknown = [s for s in wanted if s not in segments.SEGMENTS]
+    if unknown:
+        return jsonify({"error": "bad_request", "detail": f"unknown segments: {', '.join(unknown)}"}), 400
+    try:
+        min_scores = {col: int(request.args[arg]) for arg, col in (
+            ("min_r", CustomerSegment.r_score), ("min_f", CustomerSegment.f_score), ("min_m", CustomerSegment.m_score),
+        ) if request.args.get(arg)}
+    except ValueError:
+        return jsonify({"error": "bad_request", "detail": "min_r/min_f/min_m must be 1..5"}), 400
+
+    # solo las columnas pedidas (+ id, que hace falta para los saldos), como tuplas Core
+    cols = fieldsets.columns_for(fields, CUSTOMER_FIELDS, extra=("id",))
+    stmt = select(*cols).select_from(Customer)
+    count_stmt = select(func.count()).select_from(Customer)
+    seg_on = CustomerSegment.customer_id == Customer.id
+    if wanted or min_scores:
+        stmt = stmt.join(CustomerSegment, seg_on)
+        count_stmt = count_stmt.join(CustomerSegment, seg_on)
+        if wanted:
+            conds.append(CustomerSegment.segment.in_(wanted))
+        conds.extend(col >= v for col, v in min_scores.items())
+    elif "segment" in fields:
+        stmt = stmt.outerjoin(CustomerSegment, seg_on)  # 1:1, no cambia el total
+
+    total = db.session.execute(count_stmt.where(*conds)).scalar()
+    rows = db.session.execute(
+        stmt.where(*conds).order_by(Customer.created_at.desc()).limit(limit).offset(offset)
+    ).all()
+
+    # saldos de la página: una consulta agrupada por shard (solo si se pidieron)
+    id_of = itemgetter(next(i for i, col in enumerate(cols) if col is Customer.id))
+    balances = shard_router.balances(id_of(r) for r in rows) if "points_balance" in fields else None
+
+    to_dict = fieldsets.row_serializer(fields, CUSTOMER_FIELDS, cols)
+    if balances is None:
+        items = [to_dict(r) for r in rows]
+    else:
+        items = [to_dict(r, {"points_balance": balances.get(id_of(r), 0)}) for r in rows]
+
+    return jsonify({"total": total, "items": items})
+
+
+# -------------------------
+# GET /api/admin/segments  conteo por segmento RFM de la última corrida
+# (el job es `python segments.py`, como cron nocturno)
+# -------------------------
+@admin_api.get("/segments")
+@admin_only
+def segments_summary():
+    return jsonify(segments.segment_counts(db.session))
+
 
-    items = []
-    for c in rows:
+# -------------------------
+# Precios con vigencia (deriva litros cuando el POS solo manda $)
+# GET  /api/admin/prices?product_code=&station_id=
+# POST /api/admin/prices  body: product_code, unit_price, effective_from (opc, ISO UTC), station_id (opc)
+# -------------------------
+@admin_api.get("/prices")
+@admin_only
+def prices_list():
+    qry = ProductPrice.query
+    pc = (request.args.get("product_code") or "").strip()
+    if pc:
+        qry = qry.filter(ProductPrice.product_code == pc)
+    st = (request.args.get("station_id") or "").strip()
+    if st:
+        qry = qry.filter(ProductPrice.station_id == st)
+
+    rows = qry.order_by(ProductPrice.product_code, ProductPrice.station_id, ProductPrice.effective_from.desc()).all()
+
+    # vigente = el más reciente ya alcanzado de cada (producto, estación)
+    now, seen, items = datetime.utcnow(), set(), []
+    for p in rows:
+        key = (p.product_code, p.station_id)
+        current = key not in seen and p.effective_from <= now
+        if current:
+            seen.add(key)
         items.append({
-            "id": c.id,
-            "full_name": c.full_name,
-            "doc_number": c.doc_number,
-            "phone": c.phone,
-            "member_number": c.member_number,
-            "points_balance": c.points_balance,
-            "created_at": c.created_at.isoformat() if c.created_at else None,
+            "id": p.id,
+            "product_code": p.product_code,
+            "station_id": p.station_id,
+            "unit_price": p.unit_price,
+            "effective_from": p.effective_from.isoformat(),
+            "current": current,
         })
+    return jsonify(items)
 
-    return jsonify({"total": total, "items": items})
+
+@admin_api.post("/prices")
+@admin_only
+def prices_create():
+    denied = _require_admin_role()
+    if denied:
+        return denied
+
+    body = request.get_json(silent=True) or {}
+    pc = (body.get("product_code") or "").strip()
+    try:
+        unit_price = float(body.get("unit_price"))
+        eff = _parse_bound(body.get("effective_from"), end=False) or datetime.utcnow()
+    except (TypeError, ValueError):
+        return jsonify({"error": "bad_request", "detail": "unit_price and effective_from must be valid"}), 400
+    if not pc or not math.isfinite(unit_price) or unit_price <= 0:
+        return jsonify({"error": "bad_request", "detail": "product_code and unit_price > 0 required"}), 400
+
+    p = ProductPrice(
+        product_code=pc,
+        station_id=(body.get("station_id") or "").strip() or None,
+        unit_price=unit_price,
+        effective_from=eff,
+        created_by_user_id=_operator_id(),
+    )
+    db.session.add(p)
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        return jsonify({"error": "conflict", "detail": "price already exists for that effective_from"}), 409
+
+    # price_book se invalida solo (cachebus, en este y en los demás workers)
+    return jsonify({"ok": True, "id": p.id, "effective_from": p.effective_from.isoformat()}), 201
+
+
+# -------------------------
+# POST /api/admin/customers/import  (solo admin)
+#   multipart `file` o body text/csv; params: dry_run=1, station_id
+# Para archivos grandes usar el CLI: python bulk_import.py socios.csv
+# -------------------------
+@admin_api.post("/customers/import")
+@admin_only
+def customers_import():
+    denied = _require_admin_role()
+    if denied:
+        return denied
+
+    upload = request.files.get("file")
+    raw = upload.read() if upload else request.get_data()
+    if not raw:
+        return jsonify({"error": "bad_request", "detail": "csv file required"}), 400
+    try:
+        content = raw.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return jsonify({"error": "bad_request", "detail": "csv must be utf-8"}), 400
+
+    dry_run = (request.args.get("dry_run") or "").strip().lower() in ("1", "true", "yes")
+    try:
+        stats = bulk_import.import_text(
+            content,
+            station_id=request.args.get("station_id"),
+            dry_run=dry_run,
+            max_rejects_kept=1000,
+        )
+    except Exception:
+        return jsonify({"error": "server_error", "detail": "import_failed"}), 500
+
+    return jsonify({"ok": True, **stats})
+
+
+# -------------------------
+# POST /api/admin/customers/<id>/password-setup-link
+# Link de alta de contraseña para un socio importado (se entrega en caja / por mail).
+# -------------------------
+@admin_api.post("/customers/<int:customer_id>/password-setup-link")
+@admin_only
+def customer_password_setup_link(customer_id):
+    c = db.session.get(Customer, customer_id)
+    if not c:
+        return jsonify({"error": "not_found"}), 404
+
+    u = db.session.get(User, c.user_id)
+    if u.has_usable_password:
+        return jsonify({"error": "conflict", "detail": "password_already_set"}), 409
+
+    return jsonify({"ok": True, "link": email_utils.generate_password_setup_link(u.id, u.password_hash)})
 
 
 # -------------------------
@@ -105,6 +319,7 @@ def customers_summary():
 #   liters (float) OR amount_pesos (float) según regla
 #   unit_price (float) opcional (para calcular litros si viene amount_pesos)
 #   paid_with_app, payment_method, ticket_number, note (opc)
+#   station_id (opc; define regla y shard del ledger)
 # -------------------------
 @admin_api.post("/accredit-by-dni")
 @admin_only
@@ -122,6 +337,7 @@ def accredit_by_dni():
     payment_method = (body.get("payment_method") or "").strip() or None
     ticket_number = (body.get("ticket_number") or "").strip() or None
     note = (body.get("note") or "").strip() or None
+    station_id = (body.get("station_id") or "").strip() or None
 
     if not doc_number or not product_code:
         return jsonify({"error": "bad_request", "detail": "doc_number and product_code required"}), 400
@@ -132,7 +348,7 @@ def accredit_by_dni():
         return jsonify({"error": "not_found", "detail": "customer_not_found"}), 404
 
     # buscar regla activa (usamos helper común)
-    rule = find_rule(product_code)
+    rule = find_rule(product_code, station_id)
     if not rule:
         return jsonify({"error": "not_found", "detail": "earning_rule_not_found"}), 404
 
@@ -163,6 +379,10 @@ def accredit_by_dni():
         except Exception:
             return jsonify({"error": "bad_request", "detail": "invalid unit_price"}), 400
 
+    # sin unit_price del POS: precio vigente de product_prices (ver prices.py)
+    if liters_f is None and amount_f is not None and (unit_price_f is None or unit_price_f <= 0):
+        liters_f, unit_price_f = price_book.liters_for(product_code, amount_f, shard_router.normalize(station_id))
+
     # completar datos según unidad
     if rule_unit == "LITERS":
         # necesito liters o calcularlos con amount + unit_price
@@ -170,11 +390,13 @@ def accredit_by_dni():
             if amount_f is not None and unit_price_f is not None and unit_price_f > 0:
                 liters_f = round(amount_f / unit_price_f, 4)
             else:
-                return jsonify({"error": "bad_request", "detail": "liters or (amount_pesos + unit_price) required"}), 400
+                return jsonify({"error": "bad_request",
+                                "detail": "liters or amount_pesos (+ unit_price or a loaded price) required"}), 400
         if liters_f <= 0:
             return jsonify({"error": "bad_request", "detail": "liters must be > 0"}), 400
 
-        points = calculate_points(rule, liters=liters_f, rounding="floor", min_points=0)
+        points = calculate_points(rule, liters=liters_f, rounding="floor", min_points=0,
+                                  multiplier=tiers.multiplier(c.tier))
 
     else:  # CURRENCY
         if amount_f is None:
@@ -186,7 +408,8 @@ def accredit_by_dni():
         if liters_f is None and unit_price_f is not None and unit_price_f > 0:
             liters_f = round(amount_f / unit_price_f, 4)
 
-        points = calculate_points(rule, amount_pesos=amount_f, rounding="floor", min_points=0)
+        points = calculate_points(rule, amount_pesos=amount_f, rounding="floor", min_points=0,
+                                  multiplier=tiers.multiplier(c.tier))
 
     if not points or points <= 0:
         return jsonify({"error": "bad_request", "detail": "calculated points must be > 0"}), 400
@@ -198,6 +421,11 @@ def accredit_by_dni():
     except Exception:
         operator_id = None
 
+    # detección de anomalías en streaming (flag o reject según ANOMALY_MODE)
+    alerts = anomaly_detector.observe(operator_id, c.id, int(points))
+    if alerts and anomaly_detector.rejects:
+        return jsonify(anomaly_rejection(alerts)), 409
+
     tx = Transaction(
         customer_id=c.id,
         kind="earn",
@@ -211,13 +439,16 @@ def accredit_by_dni():
         ticket_number=ticket_number,
         note=note,
         operator_user_id=operator_id,
+        station_id=shard_router.normalize(station_id),
     )
 
+    # el ledger va al shard de la estación
+    sess = shard_router.session_for(station_id)
     try:
-        db.session.add(tx)
-        db.session.commit()
+        sess.add(tx)
+        sess.commit()
     except Exception:
-        db.session.rollback()
+        sess.rollback()
         return jsonify({"error": "server_error", "detail": "db_commit_failed"}), 500
 
     return jsonify({
@@ -232,6 +463,7 @@ def accredit_by_dni():
             "amount_pesos": tx.amount_pesos,
             "unit_price": tx.unit_price,
             "operator_user_id": tx.operator_user_id,
+            "station_id": tx.station_id,
             "payment_method": tx.payment_method,
             "ticket_number": tx.ticket_number,
             "note": tx.note,
@@ -241,6 +473,374 @@ def accredit_by_dni():
             "id": c.id,
             "full_name": c.full_name,
             "doc_number": c.doc_number,
-            "points_balance": c.points_balance,
-        }
-    })
\ No newline at end of file
+            "points_balance": shard_router.balance(c.id),
+        },
+        "alerts": alerts,
+    })
+
+
+# -------------------------
+# GET /api/admin/leaderboard
+#   params: period (YYYY-MM, default mes actual), product_code (default "*"), limit,
+#           station_id (default: estación por defecto; el ranking es por shard)
+# POST /api/admin/leaderboard/rebuild  (reconciliación desde transactions)
+# -------------------------
+@admin_api.get("/leaderboard")
+@admin_only
+def leaderboard_top():
+    period = (request.args.get("period") or "").strip() or leaderboard.current_period()
+    product_code = (request.args.get("product_code") or "").strip() or leaderboard.ALL
+    try:
+        limit = max(1, min(int(request.args.get("limit") or 10), 500))
+    except ValueError:
+        return jsonify({"error": "bad_request", "detail": "invalid limit"}), 400
+
+    station_id = shard_router.normalize(request.args.get("station_id"))
+
+    return jsonify({
+        "period": period,
+        "product_code": product_code,
+        "station_id": station_id,
+        "items": leaderboard.top_n(period, product_code, limit, station_id),
+    })
+
+
+@admin_api.post("/leaderboard/rebuild")
+@admin_only
+def leaderboard_rebuild():
+    body = request.get_json(silent=True) or {}
+    period = (body.get("period") or "").strip() or leaderboard.current_period()
+    station_id = shard_router.normalize(body.get("station_id"))
+    try:
+        rows = leaderboard.rebuild_period(period, station_id)
+    except ValueError:
+        return jsonify({"error": "bad_request", "detail": "period must be YYYY-MM"}), 400
+    except Exception:
+        return jsonify({"error": "server_error", "detail": "rebuild_failed"}), 500
+
+    return jsonify({"ok": True, "period": period, "station_id": station_id, "rows": rows})
+
+
+# -------------------------
+# GET /api/admin/anomalies  (solo admin)
+#   params: since_sec (default: ventana del detector)
+# Alertas de todos los workers del host (estado compartido, ver anomaly.py).
+# -------------------------
+@admin_api.get("/anomalies")
+@admin_only
+def anomalies_list():
+    denied = _require_admin_role()
+    if denied:
+        return denied
+
+    since = request.args.get("since_sec")
+    try:
+        since = int(since) if since else None
+    except ValueError:
+        return jsonify({"error": "bad_request", "detail": "invalid since_sec"}), 400
+
+    return jsonify({
+        "stats": anomaly_detector.stats(),
+        "items": anomaly_detector.active_alerts(since),
+    })
+
+
+# -------------------------
+# GET /api/admin/db/pool  (solo admin)
+# Pools de conexiones de este worker (DB principal + shards).
+# -------------------------
+@admin_api.get("/db/pool")
+@admin_only
+def db_pool_stats():
+    denied = _require_admin_role()
+    if denied:
+        return denied
+
+    return jsonify({"pid": os.getpid(), "profile": dbtuning.profile(), "engines": dbtuning.pool_stats()})
+
+
+# -------------------------
+# GET /api/admin/admission  (solo admin)
+# En vuelo por clase (todo el host), latencia de critical y rechazos de este worker.
+# -------------------------
+@admin_api.get("/admission")
+@admin_only
+def admission_stats():
+    denied = _require_admin_role()
+    if denied:
+        return denied
+
+    return jsonify({"pid": os.getpid(), **admission_controller.stats()})
+
+
+# -------------------------
+# Caja: códigos de canje
+# GET  /api/admin/redemptions/validate?code=...  (solo firma/vencimiento, sin DB)
+# POST /api/admin/redemptions/use   body: code   (consume el canje pendiente)
+# -------------------------
+@admin_api.get("/redemptions/validate")
+@admin_only
+def redemption_validate():
+    try:
+        payload = redeem_codes.verify_code(request.args.get("code"))
+    except ValueError as e:
+        return jsonify({"ok": False, "error": "invalid_code", "detail": str(e)}), 400
+    return jsonify({"ok": True, **payload})
+
+
+@admin_api.post("/redemptions/use")
+@admin_only
+def redemption_use():
+    body = request.get_json(silent=True) or {}
+    code = (body.get("code") or "").strip()
+    try:
+        payload = redeem_codes.mark_used(db.session, code)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": "invalid_code", "detail": str(e)}), 400
+
+    if payload is None:
+        db.session.rollback()
+        return jsonify({"ok": False, "error": "already_used", "detail": "código ya utilizado o inexistente"}), 409
+
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        return jsonify({"error": "server_error", "detail": "db_commit_failed"}), 500
+
+    return jsonify({"ok": True, "status": "approved", **payload})
+
+
+# -------------------------
+# Canjes pendientes (masivo, solo admin)
+# GET  /api/admin/redemptions/pending?after_id=&limit=&reward_id=&customer_id=&from=&to=
+# POST /api/admin/redemptions/approve   body: ids [..]  |  reward_id, customer_id, from, to, limit
+# POST /api/admin/redemptions/reject    idem (reintegra puntos y stock)
+# -------------------------
+def _redemption_filters(src) -> dict:
+    """Filtros de query string o body JSON; ValueError si alguno no es válido (-> 400)."""
+    out = {}
+    for key in ("reward_id", "customer_id"):
+        v = src.get(key)
+        if v in (None, ""):
+            continue
+        if isinstance(v, bool) or not isinstance(v, (int, str)):
+            raise ValueError(f"{key} must be an integer")
+        out[key] = int(v)
+    try:
+        out["created_from"] = _parse_bound(src.get("from"), end=False)
+        out["created_to"] = _parse_bound(src.get("to"), end=True)
+    except ValueError:
+        raise ValueError("from/to must be YYYY-MM-DD or ISO datetime") from None
+    return out
+
+
+@admin_api.get("/redemptions/pending")
+@admin_only
+def redemptions_pending():
+    denied = _require_admin_role()
+    if denied:
+        return denied
+
+    try:
+        after_id = int(request.args.get("after_id") or 0)
+        limit = max(1, min(int(request.args.get("limit") or 100), 1000))
+        filters = _redemption_filters(request.args)
+    except ValueError:
+        return jsonify({"error": "bad_request", "detail": "invalid after_id/limit/filters"}), 400
+
+    return jsonify(redemptions.list_pending(db.session, after_id=after_id, limit=limit, **filters))
+
+
+@admin_api.post("/redemptions/<action>")
+@admin_only
+def redemptions_bulk(action):
+    denied = _require_admin_role()
+    if denied:
+        return denied
+    if action not in ("approve", "reject"):
+        return jsonify({"error": "not_found"}), 404
+
+    body = request.get_json(silent=True) or {}
+    ids = body.get("ids")
+    try:
+        filters = _redemption_filters(body)
+        if ids is not None and not isinstance(ids, list):
+            raise ValueError("ids must be a list")
+        if ids is None and not any(v is not None for v in filters.values()):
+            # sin ids ni filtros sería "todos los pendientes": que sea explícito
+            if not body.get("all_pending"):
+                raise ValueError("ids, filters or all_pending required")
+        limit = int(body["limit"]) if body.get("limit") else None
+        result = redemptions.transition(db.session, action, ids=ids, limit=limit,
+                                        operator_id=_operator_id(), **filters)
+    except (TypeError, ValueError) as e:
+        db.session.rollback()
+        return jsonify({"error": "bad_request", "detail": str(e)}), 400
+
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        return jsonify({"error": "server_error", "detail": "db_commit_failed"}), 500
+
+    return jsonify({"ok": True, **result})
+
+
+# -------------------------
+# Revocación de tokens (solo admin)
+# POST /api/admin/users/<id>/revoke-tokens   body: reason (opc)
+# POST /api/admin/tokens/revoke              body: jti, exp (epoch), reason (opc)
+# -------------------------
+@admin_api.post("/users/<int:user_id>/revoke-tokens")
+@admin_only
+def revoke_user_tokens(user_id):
+    denied = _require_admin_role()
+    if denied:
+        return denied
+
+    if not db.session.get(User, user_id):
+        return jsonify({"error": "not_found", "detail": "user_not_found"}), 404
+
+    body = request.get_json(silent=True) or {}
+    row = denylist.revoke_user(
+        user_id,
+        token_ttl=current_app.config["JWT_ACCESS_TOKEN_EXPIRES"],
+        reason=(body.get("reason") or "").strip() or None,
+        revoked_by=_operator_id(),
+    )
+    return jsonify({"ok": True, "user_id": user_id, "revoked_at": row.revoked_at.isoformat()})
+
+
+@admin_api.post("/tokens/revoke")
+@admin_only
+def revoke_token():
+    denied = _require_admin_role()
+    if denied:
+        return denied
+
+    body = request.get_json(silent=True) or {}
+    jti = (body.get("jti") or "").strip()
+    if not jti:
+        return jsonify({"error": "bad_request", "detail": "jti required"}), 400
+
+    try:
+        exp = int(body.get("exp"))
+        expires_at = datetime.utcfromtimestamp(exp)
+    except (TypeError, ValueError, OverflowError):
+        expires_at = datetime.utcnow() + current_app.config["JWT_ACCESS_TOKEN_EXPIRES"]
+
+    denylist.revoke_jti(
+        jti,
+        expires_at=expires_at,
+        reason=(body.get("reason") or "").strip() or None,
+        revoked_by=_operator_id(),
+    )
+    return jsonify({"ok": True, "jti": jti})
+
+
+# -------------------------
+# GET /api/admin/analytics/sketches
+#   params: from, to (YYYY-MM-DD; default últimos 7 días), product_code (default "*"),
+#           group = range | day | week
+# Clientes distintos (HLL) y cuantiles de litros / $ por despacho (DDSketch).
+# -------------------------
+@admin_api.get("/analytics/sketches")
+@admin_only
+def analytics_sketches():
+    try:
+        day_to = date.fromisoformat(request.args["to"]) if request.args.get("to") else date.today()
+        day_from = (date.fromisoformat(request.args["from"]) if request.args.get("from")
+                    else day_to - timedelta(days=6))
+    except ValueError:
+        return jsonify({"error": "bad_request", "detail": "from/to must be YYYY-MM-DD"}), 400
+
+    group = (request.args.get("group") or "range").strip().lower()
+    if group not in ("range", "day", "week"):
+        return jsonify({"error": "bad_request", "detail": "group must be range, day or week"}), 400
+
+    product_code = (request.args.get("product_code") or "").strip() or sketches.ALL
+
+    items = sketches.query(shard_router.ledger_sessions(), day_from, day_to, product_code, group)
+    return jsonify({
+        "from": day_from.isoformat(),
+        "to": day_to.isoformat(),
+        "product_code": product_code,
+        "group": group,
+        "items": items,
+    })
+
+
+# -------------------------
+# GET /api/admin/exports/transactions  (solo admin, streaming)
+#   params: format = csv | ndjson, gzip = 1,
+#           from, to (YYYY-MM-DD o ISO; `to` exclusivo), product_code, operator_id,
+#           station_id (elige el ledger; sin shard filtra esa estación en la DB principal),
+#           after_id (retoma desde el último id recibido)
+# Filas ordenadas por id; memoria constante (cursor del lado del servidor).
+# -------------------------
+def _parse_bound(value: str, end: bool):
+    if value is not None and not isinstance(value, str):
+        raise ValueError("date bounds must be strings (YYYY-MM-DD or ISO datetime)")
+    value = (value or "").strip()
+    if not value:
+        return None
+    if len(value) == 10:
+        d = datetime.combine(date.fromisoformat(value), datetime.min.time())
+        return d + timedelta(days=1) if end else d
+    return datetime.fromisoformat(value)
+
+
+@admin_api.get("/exports/transactions")
+@admin_only
+def export_transactions():
+    denied = _require_admin_role()
+    if denied:
+        return denied
+
+    fmt = (request.args.get("format") or "csv").strip().lower()
+    if fmt not in ("csv", "ndjson"):
+        return jsonify({"error": "bad_request", "detail": "format must be csv or ndjson"}), 400
+
+    try:
+        date_from = _parse_bound(request.args.get("from"), end=False)
+        date_to = _parse_bound(request.args.get("to"), end=True)
+    except ValueError:
+        return jsonify({"error": "bad_request", "detail": "from/to must be YYYY-MM-DD or ISO datetime"}), 400
+
+    try:
+        after_id = int(request.args.get("after_id") or 0)
+        operator_id = int(request.args["operator_id"]) if request.args.get("operator_id") else None
+    except ValueError:
+        return jsonify({"error": "bad_request", "detail": "after_id/operator_id must be integers"}), 400
+
+    product_code = (request.args.get("product_code") or "").strip() or None
+    compress = (request.args.get("gzip") or "").strip().lower() in ("1", "true", "yes")
+
+    station_arg = (request.args.get("station_id") or "").strip()
+    station_id = shard_router.normalize(station_arg)
+    sess = shard_router.session_for(station_id)
+    # en la DB principal conviven varias estaciones: si se pidió una, se filtra
+    station_filter = None
+    if station_arg and not shard_router.has_shard(station_id):
+        station_filter = station_id
+
+    body = exports.stream_transactions(
+        sess, fmt=fmt, compress=compress,
+        date_from=date_from, date_to=date_to, product_code=product_code,
+        operator_id=operator_id, after_id=after_id, station_id=station_filter,
+        default_station=(station_id == current_app.config.get("DEFAULT_STATION")),
+    )
+
+    ext = "csv" if fmt == "csv" else "ndjson"
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    filename = f"transactions_{station_id}_{after_id}.{ext}"
+    if compress:
+        mimetype = "application/gzip"
+        filename += ".gz"
+
+    resp = Response(stream_with_context(body), mimetype=mimetype)
+    resp.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    resp.headers["Cache-Control"] = "no-store"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
@@ -0,0 +1,284 @@
+# C:\Abetos_app\backend\admission.py
+"""
+Control de admisión por prioridad (protege la acreditación en playa).
+
+Clases:
+- critical: escrituras de caja/admin (blueprint admin_api con POST/PUT/DELETE,
+            POST /api/purchases). Nunca se rechazan.
+- staff:    lecturas admin/clerk, login y el resto de /api con token admin/clerk.
+            Se rechazan solo si TODA la capacidad está ocupada.
+- customer: lecturas de la app de clientes. Cupo adaptativo (AIMD) entre
+            ADMISSION_CUSTOMER_MIN y capacidad - reservados: si la latencia
+            de critical supera el objetivo, el cupo se reduce a la mitad;
+            si está por debajo, crece de a 1 (como mucho cada ADJUST_SEC).
+Exentos: /health, /api/health, SSE (/api/me/stream), OPTIONS.
+
+Lo rechazado recibe 429 + Retry-After enseguida, así el worker queda libre
+para el próximo request (con workers sync, un request encolado espera a que
+alguno se libere).
+
+En vuelo y latencia se comparten entre workers del host: un archivo mmap con
+un slot por (proceso, thread); cada uno escribe solo el suyo (clase, inicio,
+EWMA de latencia critical) y cualquiera puede leerlos todos sin lock. Sin
+fcntl (Windows) el estado es por proceso.
+
+Variables:
+    ADMISSION                   on | off (default on)
+    ADMISSION_CAPACITY          requests simultáneos del host (default GUNICORN_WORKERS o 4)
+    ADMISSION_RESERVED          lugares reservados para staff/critical (default 1)
+    ADMISSION_CRITICAL_TARGET_MS  objetivo de latencia de critical (default 100)
+    ADMISSION_CUSTOMER_MIN      cupo mínimo de customer (default 1)
+    ADMISSION_RETRY_AFTER       segundos sugeridos (default 2)
+    ADMISSION_FILE / ADMISSION_SLOTS
+"""
+import os
+import time
+import struct
+import tempfile
+import threading
+from typing import Optional
+
+try:
+    import fcntl
+    import mmap
+except ImportError:  # Windows
+    fcntl = None
+    mmap = None
+
+
+EXEMPT, CUSTOMER, STAFF, CRITICAL = 0, 1, 2, 3
+CLASS_NAMES = {CUSTOMER: "customer", STAFF: "staff", CRITICAL: "critical"}
+
+EXEMPT_PATHS = ("/health", "/api/health", "/api/me/stream")
+CRITICAL_ENDPOINTS = {"api.create_purchase"}
+STAFF_ENDPOINTS = {"api.auth_login", "api.auth_logout", "api.auth_register", "api.auth_password_setup"}
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+# pid, thread id, clase en vuelo (0 = libre), inicio, EWMA critical (ms), cuándo
+_SLOT = struct.Struct("<iQBddd")
+STALE_SEC = 120.0
+EWMA_ALPHA = 0.2
+ADJUST_SEC = 0.1
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+class _Slots:
+    """Slots en un archivo compartido; en Windows, un bytearray local."""
+
+    def __init__(self, path: str, n: int):
+        self.path = path
+        self.n = n
+        self.size = n * _SLOT.size
+        self._pid = None
+        self._buf = None
+        self._fd = None
+        self._local = threading.local()
+        self._claim_lock = threading.Lock()
+
+    def _open(self) -> None:
+        if self._pid == os.getpid():
+            return
+        if fcntl is None:
+            self._buf = bytearray(self.size)
+        else:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            if os.fstat(fd).st_size < self.size:
+                os.ftruncate(fd, self.size)
+            self._fd = fd
+            self._buf = mmap.mmap(fd, self.size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        self._pid = os.getpid()
+        self._local = threading.local()
+
+    @staticmethod
+    def _alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+            return True
+        except ProcessLookupError:
+            return False
+        except OSError:
+            return True
+
+    def mine(self) -> Optional[int]:
+        """Offset del slot de este (proceso, thread); lo reclama la primera vez."""
+        self._open()
+        off = getattr(self._local, "off", None)
+        if off is not None:
+            return off
+
+        pid, tid = os.getpid(), threading.get_ident()
+        with self._claim_lock:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                for i in range(self.n):
+                    o = i * _SLOT.size
+                    spid = _SLOT.unpack_from(self._buf, o)[0]
+                    if spid == 0 or (spid != pid and not self._alive(spid)):
+                        _SLOT.pack_into(self._buf, o, pid, tid, 0, 0.0, 0.0, 0.0)
+                        self._local.off = o
+                        return o
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+        return None  # sin slots libres: no se contabiliza
+
+    def write(self, off: int, cls: int, started: float, ewma: float, ewma_at: float) -> None:
+        pid, tid = _SLOT.unpack_from(self._buf, off)[:2]
+        _SLOT.pack_into(self._buf, off, pid, tid, cls, started, ewma, ewma_at)
+
+    def read(self, off: int) -> tuple:
+        return _SLOT.unpack_from(self._buf, off)
+
+    def all(self):
+        self._open()
+        return _SLOT.iter_unpack(bytes(self._buf[:self.size]))
+
+
+class AdmissionController:
+    def __init__(self):
+        self.enabled = os.getenv("ADMISSION", "on").strip().lower() not in ("off", "0", "false")
+        self.capacity = _env_int("ADMISSION_CAPACITY", _env_int("GUNICORN_WORKERS", 4))
+        self.reserved = _env_int("ADMISSION_RESERVED", 1)
+        self.target_ms = float(_env_int("ADMISSION_CRITICAL_TARGET_MS", 100))
+        self.customer_min = _env_int("ADMISSION_CUSTOMER_MIN", 1)
+        self.retry_after = _env_int("ADMISSION_RETRY_AFTER", 2)
+        path = os.getenv("ADMISSION_FILE", os.path.join(tempfile.gettempdir(), "abetos_admission.bin"))
+        self._slots = _Slots(path, _env_int("ADMISSION_SLOTS", 256))
+        self.shed = {CUSTOMER: 0, STAFF: 0}
+        self._climit = float(self._customer_max())
+        self._adjusted_at = 0.0
+
+    # ---------- clasificación ----------
+    def classify(self, req) -> int:
+        if req.method == "OPTIONS" or req.path in EXEMPT_PATHS:
+            return EXEMPT
+        endpoint = req.endpoint or ""
+        if endpoint in CRITICAL_ENDPOINTS:
+            return CRITICAL
+        if req.blueprint == "admin_api":
+            return CRITICAL if req.method in WRITE_METHODS else STAFF
+        if endpoint in STAFF_ENDPOINTS:
+            return STAFF
+        if self._token_role(req) in ("admin", "clerk"):
+            return STAFF
+        return CUSTOMER
+
+    @staticmethod
+    def _token_role(req) -> Optional[str]:
+        auth = req.headers.get("Authorization") or ""
+        if not auth.startswith("Bearer "):
+            return None
+        try:
+            from flask_jwt_extended import decode_token
+            return (decode_token(auth[7:].strip()).get("role") or "").lower()
+        except Exception:
+            return None
+
+    # ---------- estado compartido ----------
+    def snapshot(self, now: Optional[float] = None) -> dict:
+        now = time.time() if now is None else now
+        inflight = {CUSTOMER: 0, STAFF: 0, CRITICAL: 0}
+        crit_ms = 0.0
+        for pid, _tid, cls, started, ewma, ewma_at in self._slots.all():
+            if not pid:
+                continue
+            if cls in inflight and now - started < STALE_SEC:
+                inflight[cls] += 1
+            if ewma_at and now - ewma_at < 60:
+                crit_ms = max(crit_ms, ewma)
+        return {"inflight": inflight, "critical_ewma_ms": crit_ms}
+
+    def _customer_max(self) -> int:
+        return max(self.customer_min, self.capacity - self.reserved)
+
+    def customer_limit(self, crit_ms: float, now: Optional[float] = None) -> int:
+        """Cupo de customer en vuelo (AIMD sobre la latencia de critical)."""
+        now = time.time() if now is None else now
+        if now - self._adjusted_at >= ADJUST_SEC:
+            if crit_ms > self.target_ms:
+                self._climit = max(float(self.customer_min), self._climit / 2)
+            else:
+                self._climit = min(float(self._customer_max()), self._climit + 1)
+            self._adjusted_at = now
+        return int(self._climit)
+
+    # ---------- por request ----------
+    def admit(self, cls: int) -> bool:
+        """Decide y, si admite, marca el slot como en vuelo."""
+        if cls == EXEMPT:
+            return True
+        now = time.time()
+        if cls != CRITICAL:
+            snap = self.snapshot(now)
+            busy = sum(snap["inflight"].values())
+            if cls == CUSTOMER and snap["inflight"][CUSTOMER] >= self.customer_limit(snap["critical_ewma_ms"], now):
+                self.shed[CUSTOMER] += 1
+                return False
+            if cls == STAFF and busy >= self.capacity:
+                self.shed[STAFF] += 1
+                return False
+
+        off = self._slots.mine()
+        if off is not None:
+            _p, _t, _c, _s, ewma, ewma_at = self._slots.read(off)
+            self._slots.write(off, cls, now, ewma, ewma_at)
+        return True
+
+    def done(self, cls: int, started_perf: float) -> None:
+        if cls == EXEMPT:
+            return
+        off = self._slots.mine()
+        if off is None:
+            return
+        _p, _t, _c, _s, ewma, ewma_at = self._slots.read(off)
+        if cls == CRITICAL:
+            ms = (time.perf_counter() - started_perf) * 1000
+            ewma = ms if not ewma_at else EWMA_ALPHA * ms + (1 - EWMA_ALPHA) * ewma
+            ewma_at = time.time()
+        self._slots.write(off, 0, 0.0, ewma, ewma_at)
+
+    def stats(self) -> dict:
+        snap = self.snapshot()
+        return {
+            "enabled": self.enabled,
+            "capacity": self.capacity,
+            "reserved": self.reserved,
+            "critical_target_ms": self.target_ms,
+            "critical_ewma_ms": round(snap["critical_ewma_ms"], 2),
+            "customer_limit": int(self._climit),
+            "inflight": {CLASS_NAMES[k]: v for k, v in snap["inflight"].items()},
+            "shed_here": {CLASS_NAMES[k]: v for k, v in self.shed.items()},
+        }
+
+
+# Instancia única por proceso (el estado en vuelo vive en el archivo compartido)
+controller = AdmissionController()
+
+
+def init_app(app) -> None:
+    if not controller.enabled:
+        return
+
+    from flask import request, g, jsonify
+
+    @app.before_request
+    def _admission_check():
+        cls = controller.classify(request)
+        if not controller.admit(cls):
+            resp = jsonify({"error": "overloaded", "retry_after": controller.retry_after})
+            resp.headers["Retry-After"] = str(controller.retry_after)
+            return resp, 429
+        g.admission = (cls, time.perf_counter())
+
+    @app.teardown_request
+    def _admission_done(_exc):
+        adm = g.pop("admission", None)
+        if adm:
+            controller.done(*adm)
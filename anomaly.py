@@ -0,0 +1,367 @@
+# C:\Abetos_app\backend\anomaly.py
+"""
+Detección de anomalías en acreditaciones, en streaming y compartida entre los
+workers de gunicorn del mismo host.
+
+Por cada clave (operador y cliente) se guarda un estado de tamaño fijo:
+- ring buffer de N buckets por minuto -> cantidad de acreditaciones en la ventana
+- EWMA de media/varianza de puntos por acreditación -> z-score del evento actual
+
+El estado vive en un archivo mapeado en memoria (mmap, MAP_SHARED), como en
+throttle.py: una tabla asociativa por conjuntos por tipo de clave (WAYS slots
+por conjunto, se reemplaza el usado hace más tiempo o el inactivo) y un ring
+de las últimas alertas. Todos los workers cuentan sobre los mismos buckets y
+GET /api/admin/anomalies ve las alertas de todos. Exclusión entre procesos con
+fcntl.flock; sin fcntl (Windows) el estado es por proceso.
+
+Modo reject: la operación con alertas se rechaza (409) y no entra en la
+ventana ni en la EWMA; así un intento rechazado no deja al cliente bloqueado.
+
+Config (env):
+  ANOMALY_MODE              off | flag | reject   (default flag)
+  ANOMALY_WINDOW_MIN        minutos de la ventana deslizante (default 60)
+  ANOMALY_CUSTOMER_MAX      acreditaciones por cliente en la ventana (default 6)
+  ANOMALY_OPERATOR_MAX      acreditaciones por operador en la ventana (default 120)
+  ANOMALY_ZSCORE            z-score de puntos para alertar (default 4.0)
+  ANOMALY_MAX_KEYS          claves por tipo (default 50000)
+  ANOMALY_IDLE_SEC          segundos sin actividad para descartar una clave (default 86400)
+  ANOMALY_MAX_ALERTS        alertas recientes guardadas (default 1000)
+  ANOMALY_FILE              default <tmp>/abetos_anomaly.bin
+"""
+import os
+import math
+import time
+import struct
+import hashlib
+import tempfile
+import threading
+from typing import Optional
+
+try:
+    import fcntl
+    import mmap
+except ImportError:  # Windows
+    fcntl = None
+    mmap = None
+
+
+MODE_OFF = "off"
+MODE_FLAG = "flag"
+MODE_REJECT = "reject"
+
+SCOPE_OPERATOR = "operator"
+SCOPE_CUSTOMER = "customer"
+SCOPES = (SCOPE_CUSTOMER, SCOPE_OPERATOR)
+
+RULES = ("window_count", "points_zscore")
+
+EWMA_ALPHA = 0.1
+EWMA_WARMUP = 10  # eventos antes de evaluar z-score
+
+WAYS = 8
+_MAGIC = 0xABE7_0A11
+# magic, minutos de ventana, conjuntos por tipo, capacidad de alertas, alertas escritas
+_HEADER = struct.Struct("<IIIIQ")
+# at, scope, regla, clave, operador (-1 = ninguno), cliente, puntos, valor, límite, rechazada
+_ALERT = struct.Struct("<dBBqqqqddB")
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class _KeyState:
+    """Estado fijo por clave: ring buffer por minuto + EWMA de puntos."""
+    __slots__ = ("buckets", "minute", "mean", "var", "n", "last_seen")
+
+    def __init__(self, size: int):
+        self.buckets = [0] * size   # conteo por minuto (índice = minuto % size)
+        self.minute = -1            # último minuto escrito
+        self.mean = 0.0
+        self.var = 0.0
+        self.n = 0
+        self.last_seen = 0.0
+
+    def advance(self, minute: int) -> None:
+        """Vacía los buckets de los minutos que pasaron desde el último evento."""
+        size = len(self.buckets)
+        if self.minute < 0 or minute - self.minute >= size:
+            self.buckets = [0] * size
+        else:
+            for m in range(self.minute + 1, minute + 1):
+                self.buckets[m % size] = 0
+        self.minute = max(self.minute, minute)
+
+    def count(self) -> int:
+        return sum(self.buckets)
+
+    def zscore(self, x: float) -> Optional[float]:
+        """z-score de x contra la EWMA actual (sin actualizarla)."""
+        if self.n >= EWMA_WARMUP and self.var > 0:
+            return (x - self.mean) / math.sqrt(self.var)
+        return None
+
+    def record(self, x: float, now: float) -> None:
+        """Cuenta el evento en el minuto actual y actualiza la EWMA."""
+        self.buckets[self.minute % len(self.buckets)] += 1
+        if self.n == 0:
+            self.mean = x
+        else:
+            diff = x - self.mean
+            incr = EWMA_ALPHA * diff
+            self.mean += incr
+            self.var = (1 - EWMA_ALPHA) * (self.var + diff * incr)
+        self.n += 1
+        self.last_seen = now
+
+
+class _SharedState:
+    """
+    Archivo compartido: header | tabla de clientes | tabla de operadores | ring de alertas.
+    En Windows, un bytearray local con el mismo formato.
+    """
+
+    def __init__(self, path: str, window_min: int, max_keys: int, max_alerts: int):
+        self.path = path
+        self.window_min = window_min
+        self.sets = max(1, -(-max_keys // WAYS))
+        self.max_alerts = max(1, max_alerts)
+        # clave (hash 64 bits), último minuto, último uso, media, varianza, n, buckets
+        self.slot = struct.Struct(f"<QqdddI{window_min}I")
+        self.table_size = self.sets * WAYS * self.slot.size
+        self.alerts_off = _HEADER.size + len(SCOPES) * self.table_size
+        self.size = self.alerts_off + self.max_alerts * _ALERT.size
+        self._pid = None
+        self._fd = None
+        self._buf = None
+        self._lock = threading.Lock()
+
+    def _open(self) -> None:
+        if self._pid == os.getpid():
+            return
+        # tras un fork hay que reabrir: flock sobre un descriptor heredado no excluye
+        if fcntl is None:
+            self._buf = bytearray(self.size)
+        else:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            if os.fstat(fd).st_size < self.size:
+                os.ftruncate(fd, self.size)
+            self._fd = fd
+            self._buf = mmap.mmap(fd, self.size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        self._pid = os.getpid()
+
+    def __enter__(self):
+        self._lock.acquire()
+        try:
+            self._open()
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            self._check_header()
+        except BaseException:
+            self._lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            self._lock.release()
+
+    def _check_header(self) -> None:
+        """Archivo nuevo o de otra configuración (ventana, tamaños): se reinicia."""
+        magic, window, sets, alerts, _seq = _HEADER.unpack_from(self._buf, 0)
+        if (magic, window, sets, alerts) != (_MAGIC, self.window_min, self.sets, self.max_alerts):
+            self._buf[:self.size] = bytes(self.size)
+            _HEADER.pack_into(self._buf, 0, _MAGIC, self.window_min, self.sets, self.max_alerts, 0)
+
+    # ---------- tabla de claves ----------
+    @staticmethod
+    def key_hash(scope: str, key) -> int:
+        h = hashlib.blake2b(f"{scope}:{key}".encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(h, "little") or 1
+
+    def find(self, scope: str, key: int, now: float, idle_sec: float):
+        """(offset, estado) de la clave; si no está (o quedó inactiva), slot a reemplazar y estado vacío."""
+        buf, slot = self._buf, self.slot
+        base = (_HEADER.size + SCOPES.index(scope) * self.table_size
+                + (key % self.sets) * WAYS * slot.size)
+        victim, victim_seen = base, math.inf
+        for off in range(base, base + WAYS * slot.size, slot.size):
+            k, minute, last_seen, mean, var, n, *buckets = slot.unpack_from(buf, off)
+            if k == key and now - last_seen <= idle_sec:
+                st = _KeyState(self.window_min)
+                st.buckets, st.minute, st.mean, st.var, st.n, st.last_seen = (
+                    buckets, minute, mean, var, n, last_seen)
+                return off, st
+            if k == 0 or now - last_seen > idle_sec:
+                last_seen = -1.0
+            if last_seen < victim_seen:
+                victim, victim_seen = off, last_seen
+        return victim, _KeyState(self.window_min)
+
+    def write(self, off: int, key: int, st: _KeyState) -> None:
+        self.slot.pack_into(self._buf, off, key, st.minute, st.last_seen, st.mean, st.var, st.n, *st.buckets)
+
+    def tracked(self, scope: str, now: float, idle_sec: float) -> int:
+        head = struct.Struct("<Qqd")
+        base = _HEADER.size + SCOPES.index(scope) * self.table_size
+        n = 0
+        for off in range(base, base + self.table_size, self.slot.size):
+            k, _minute, last_seen = head.unpack_from(self._buf, off)
+            if k and now - last_seen <= idle_sec:
+                n += 1
+        return n
+
+    # ---------- alertas ----------
+    def add_alert(self, a: dict) -> None:
+        seq = _HEADER.unpack_from(self._buf, 0)[4]
+        op = a["operator_user_id"]
+        _ALERT.pack_into(self._buf, self.alerts_off + (seq % self.max_alerts) * _ALERT.size,
+                         a["at"], SCOPES.index(a["scope"]), RULES.index(a["rule"]), a["key"],
+                         -1 if op is None else op, a["customer_id"], a["points"],
+                         a["value"], a["limit"], a["rejected"])
+        _HEADER.pack_into(self._buf, 0, _MAGIC, self.window_min, self.sets, self.max_alerts, seq + 1)
+
+    def alerts(self, cutoff: float) -> list:
+        """Alertas desde cutoff, más nuevas primero."""
+        seq = _HEADER.unpack_from(self._buf, 0)[4]
+        out = []
+        for i in range(seq - 1, max(0, seq - self.max_alerts) - 1, -1):
+            at, scope, rule, key, op, cust, points, value, limit, rejected = _ALERT.unpack_from(
+                self._buf, self.alerts_off + (i % self.max_alerts) * _ALERT.size)
+            if at < cutoff:
+                break
+            out.append({
+                "at": int(at),
+                "scope": SCOPES[scope],
+                "key": key,
+                "operator_user_id": None if op < 0 else op,
+                "customer_id": cust,
+                "points": points,
+                "rejected": bool(rejected),
+                "rule": RULES[rule],
+                "value": int(value) if RULES[rule] == "window_count" else value,
+                "limit": int(limit) if RULES[rule] == "window_count" else limit,
+            })
+        return out
+
+
+class AnomalyDetector:
+    def __init__(self):
+        self.mode = (os.getenv("ANOMALY_MODE", MODE_FLAG) or MODE_FLAG).strip().lower()
+        self.window_min = max(1, _env_int("ANOMALY_WINDOW_MIN", 60))
+        self.max_count = {
+            SCOPE_CUSTOMER: _env_int("ANOMALY_CUSTOMER_MAX", 6),
+            SCOPE_OPERATOR: _env_int("ANOMALY_OPERATOR_MAX", 120),
+        }
+        self.z_threshold = _env_float("ANOMALY_ZSCORE", 4.0)
+        self.max_keys = max(1, _env_int("ANOMALY_MAX_KEYS", 50000))
+        self.idle_sec = _env_int("ANOMALY_IDLE_SEC", 86400)
+        path = os.getenv("ANOMALY_FILE", os.path.join(tempfile.gettempdir(), "abetos_anomaly.bin"))
+
+        self._shared = _SharedState(path, self.window_min, self.max_keys,
+                                    _env_int("ANOMALY_MAX_ALERTS", 1000))
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode in (MODE_FLAG, MODE_REJECT)
+
+    @property
+    def rejects(self) -> bool:
+        return self.mode == MODE_REJECT
+
+    def _reasons(self, scope: str, st: _KeyState, points: float) -> list:
+        reasons = []
+        count = st.count() + 1  # con el evento actual
+        limit = self.max_count[scope]
+        if limit > 0 and count > limit:
+            reasons.append({"rule": "window_count", "value": count, "limit": limit})
+        z = st.zscore(points)
+        if z is not None and z > self.z_threshold:
+            reasons.append({"rule": "points_zscore", "value": round(z, 2), "limit": self.z_threshold})
+        return reasons
+
+    # ---------- API ----------
+    def observe(self, operator_id: Optional[int], customer_id: int, points: int,
+                now: Optional[float] = None) -> list:
+        """
+        Evalúa una acreditación y devuelve la lista de alertas (vacía si es normal).
+        Cuenta en la ventana y la EWMA salvo que el modo reject la rechace.
+        """
+        if not self.enabled:
+            return []
+
+        now = time.time() if now is None else now
+        minute = int(now // 60)
+        x = float(points or 0)
+        keys = [(SCOPE_CUSTOMER, customer_id)]
+        if operator_id is not None:
+            keys.append((SCOPE_OPERATOR, operator_id))
+
+        with self._shared as sh:
+            states, alerts = [], []
+            for scope, key in keys:
+                h = sh.key_hash(scope, key)
+                off, st = sh.find(scope, h, now, self.idle_sec)
+                st.advance(minute)
+                states.append((off, h, st))
+                for reason in self._reasons(scope, st, x):
+                    alerts.append({
+                        "at": int(now),
+                        "scope": scope,
+                        "key": key,
+                        "operator_user_id": operator_id,
+                        "customer_id": customer_id,
+                        "points": int(points or 0),
+                        "rejected": self.rejects,
+                        **reason,
+                    })
+
+            if not (alerts and self.rejects):
+                for off, h, st in states:
+                    st.record(x, now)
+                    sh.write(off, h, st)
+            for alert in alerts:
+                sh.add_alert(alert)
+
+        return alerts
+
+    def active_alerts(self, since_sec: Optional[int] = None) -> list:
+        """Alertas recientes de todos los workers (más nuevas primero); por defecto las de la ventana."""
+        since_sec = self.window_min * 60 if since_sec is None else since_sec
+        with self._shared as sh:
+            return sh.alerts(time.time() - since_sec)
+
+    def stats(self) -> dict:
+        now = time.time()
+        with self._shared as sh:
+            return {
+                "mode": self.mode,
+                "window_min": self.window_min,
+                "backend": "local" if fcntl is None else "file",
+                "tracked_operators": sh.tracked(SCOPE_OPERATOR, now, self.idle_sec),
+                "tracked_customers": sh.tracked(SCOPE_CUSTOMER, now, self.idle_sec),
+                "max_keys": self.max_keys,
+            }
+
+
+def rejection(alerts: list) -> dict:
+    """Cuerpo del 409 de una acreditación rechazada (igual en /api y /api/admin)."""
+    return {"ok": False, "error": "anomaly_rejected",
+            "detail": "Operación rechazada por detección de anomalías", "alerts": alerts}
+
+
+# Instancia única por proceso (el estado vive en el archivo compartido)
+detector = AnomalyDetector()
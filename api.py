@@ -1,21 +1,39 @@
 # C:\Abetos_app\backend\api.py
 from functools import wraps
+from operator import itemgetter
 from datetime import datetime
 import os
 
-from flask import Blueprint, request, jsonify
-from sqlalchemy import func
+from flask import Blueprint, request, jsonify, Response
+from sqlalchemy import func, select
+from werkzeug.security import check_password_hash
 from flask_jwt_extended import (
     jwt_required, get_jwt_identity, get_jwt, create_access_token
 )
 
 from db import db
-from models import User, Customer, Transaction, EarningRule, Reward
+from models import User, Customer, Transaction, EarningRule, Reward, Redemption
 from rules import find_rule, calculate_points
+import leaderboard
+import redeem_codes
+import tiers
+from prices import price_book
+from cachebus import bus as cache_bus, REWARDS
+import email_utils
+import fieldsets
+from revocation import denylist
+from sharding import router as shard_router
+from stream_hub import hub as stream_hub
+from anomaly import detector as anomaly_detector, rejection as anomaly_rejection
+from throttle import login_throttle
 
 
 api = Blueprint("api", __name__)
 
+# hash de referencia para que "usuario inexistente" cueste lo mismo que "contraseña incorrecta"
+# (literal: no pagar un scrypt al importar el módulo)
+_DUMMY_HASH = "scrypt:32768:8:1$fNfRS9ASiLXVS7OO$cef2e38458d5d107446939f7a3eedc0b3147f05a511ce2b83eaf840f606165401fca2910a3c2d5e74cf8282d445e7009a716e228e7931e2e24c8f17c447f60bc"
+
 # ----------------- Health (para /api/health) -----------------
 @api.get("/health")
 def api_health():
@@ -24,11 +42,8 @@ def api_health():
 
 # ----------------- Helpers -----------------
 def current_balance(customer_id: int) -> int:
-    return int(
-        db.session.query(func.coalesce(func.sum(Transaction.points), 0))
-        .filter(Transaction.customer_id == customer_id)
-        .scalar() or 0
-    )
+    # suma de parciales por shard (sin STATION_SHARDS = una sola consulta)
+    return shard_router.balance(customer_id)
 
 
 def ensure_member_number(customer: Customer) -> None:
@@ -135,6 +150,15 @@ def auth_login():
     if not email and not doc:
         return jsonify({"error": "missing_fields", "hint": "email_or_doc_number_required"}), 400
 
+    # antes de tocar la DB o hashear: corta ráfagas por IP y por identificador
+    identifier = email or doc
+    wait = login_throttle.acquire(login_throttle.client_ip(request), identifier)
+    if wait > 0:
+        retry_after = int(wait) + 1
+        resp = jsonify({"error": "too_many_attempts", "retry_after": retry_after})
+        resp.headers["Retry-After"] = str(retry_after)
+        return resp, 429
+
     u = None
     if email:
         u = User.query.filter(func.lower(User.email) == email).first()
@@ -143,15 +167,21 @@ def auth_login():
         if c:
             u = User.query.get(c.user_id)
 
-    if not u:
-        return jsonify({"error": "invalid_credentials", "hint": "user_not_found"}), 401
+    if not u or not u.has_usable_password:
+        # mismo costo y misma respuesta que una contraseña incorrecta. Los
+        # importados sin contraseña tampoco se distinguen (no se puede saber
+        # qué DNIs/emails se importaron): el aviso les llega con el link de alta.
+        check_password_hash(_DUMMY_HASH, pwd)
+        return jsonify({"error": "invalid_credentials"}), 401
 
     try:
         ok = u.check_password(pwd)
     except Exception:
         ok = False
     if not ok:
-        return jsonify({"error": "invalid_credentials", "hint": "bad_password"}), 401
+        return jsonify({"error": "invalid_credentials"}), 401
+
+    login_throttle.success(identifier)
 
     claims = {"role": u.role, "email": u.email}
 
@@ -171,6 +201,54 @@ def auth_login():
     })
 
 
+# ----------------- Alta de contraseña (usuarios importados) -----------------
+@api.post("/auth/password/setup")
+def auth_password_setup():
+    data = get_json_body()
+    token = (data.get("token") or request.args.get("token") or "").strip()
+    password = data.get("password") or ""
+
+    if not token or not password:
+        return jsonify({"error": "missing_fields", "hint": "token_and_password_required"}), 400
+    if len(password) < 6:
+        return jsonify({"error": "weak_password", "hint": "min_6_chars"}), 400
+
+    def hash_of(uid):
+        row = db.session.query(User.password_hash).filter(User.id == uid).first()
+        return row[0] if row else None
+
+    try:
+        payload = email_utils.verify_password_setup_token(token, hash_of)
+    except ValueError as e:
+        return jsonify({"error": "invalid_token", "detail": str(e)}), 400
+
+    u = db.session.get(User, int(payload["uid"]))
+    u.set_password(password)
+    u.is_verified = True
+    db.session.commit()
+    return jsonify({"ok": True, "message": "Contraseña definida. Ya podés iniciar sesión."})
+
+
+@api.post("/auth/logout")
+@jwt_required()
+def auth_logout():
+    """Revoca el token actual (jti)."""
+    claims = get_jwt()
+    try:
+        uid = int(get_jwt_identity())
+    except Exception:
+        uid = None
+
+    denylist.revoke_jti(
+        claims["jti"],
+        expires_at=datetime.utcfromtimestamp(int(claims["exp"])),
+        user_id=uid,
+        reason="logout",
+        revoked_by=uid,
+    )
+    return jsonify({"ok": True})
+
+
 @api.get("/auth/me")
 @jwt_required()
 def auth_me():
@@ -207,13 +285,29 @@ def me_profile():
         'email': u.email,
         'role': u.role,
         'full_name': (c.full_name if c else None),
-        'points_balance': (c.points_balance if c else 0),
+        'points_balance': (current_balance(c.id) if c else 0),
         'customer_id': (c.id if c else None),
         'member_number': (c.member_number if c else None),
         'doc_number': (c.doc_number if c else None),
+        'tier': (c.tier if c else None),
+        'tier_liters_90d': (round(c.tier_liters_90d or 0.0, 2) if c else 0.0),
     })
 
 
+# campos de /me/transactions (?fields=id,points,created_at)
+TX_FIELDS = {
+    "id": (Transaction.id, fieldsets.same),
+    "station_id": (Transaction.station_id, fieldsets.same),
+    "kind": (Transaction.kind, fieldsets.same),
+    "points": (Transaction.points, fieldsets.same),
+    "amount_pesos": (Transaction.amount_pesos, fieldsets.as_float),
+    "liters": (Transaction.liters, fieldsets.as_float),
+    "product_code": (Transaction.product_code, fieldsets.same),
+    "note": (Transaction.note, fieldsets.same),
+    "created_at": (Transaction.created_at, fieldsets.iso),
+}
+
+
 @api.get("/me/transactions")
 @jwt_required()
 def me_transactions():
@@ -222,20 +316,69 @@ def me_transactions():
     if not c:
         return jsonify([])
 
-    txs = (Transaction.query
-           .filter_by(customer_id=c.id)
-           .order_by(Transaction.created_at.desc())
-           .all())
-    return jsonify([{
-        'id': t.id,
-        'kind': t.kind,
-        'points': t.points,
-        'amount_pesos': float(t.amount_pesos) if t.amount_pesos is not None else None,
-        'liters': float(t.liters) if t.liters is not None else None,
-        'product_code': t.product_code,
-        'note': t.note,
-        'created_at': t.created_at.isoformat()
-    } for t in txs])
+    try:
+        fields = fieldsets.parse_fields(request.args.get("fields"), TX_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": "bad_request", "detail": f"unknown fields: {e}"}), 400
+
+    # solo las columnas pedidas (+ created_at para ordenar el merge entre shards),
+    # como tuplas Core: sin Query ni identity map
+    cols = fieldsets.columns_for(fields, TX_FIELDS, extra=("created_at",))
+    stmt = (
+        select(*cols)
+        .where(Transaction.customer_id == c.id)
+        .order_by(Transaction.created_at.desc())
+    )
+    sessions = shard_router.ledger_sessions()
+    rows = []
+    for sess in sessions:
+        rows.extend(sess.execute(stmt).all())
+    if len(sessions) > 1:
+        rows.sort(key=itemgetter(next(i for i, col in enumerate(cols) if col is Transaction.created_at)),
+                  reverse=True)
+
+    to_dict = fieldsets.row_serializer(fields, TX_FIELDS, cols)
+    return jsonify([to_dict(t) for t in rows])
+
+
+@api.get("/me/stream")
+@jwt_required(locations=["headers", "query_string"])
+def me_stream():
+    """
+    SSE: empuja un evento por cada transacción del cliente.
+    EventSource no manda headers -> acepta ?jwt=<token>.
+    """
+    uid = int(get_jwt_identity())
+    c = Customer.query.filter_by(user_id=uid).first()
+    if not c:
+        return jsonify({"error": "Cliente no encontrado"}), 404
+
+    customer_id = c.id
+    db.session.remove()  # no retener conexión de DB mientras dura el stream
+
+    return Response(
+        stream_hub.stream(customer_id),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@api.get("/me/rank")
+@jwt_required()
+def me_rank():
+    uid = int(get_jwt_identity())
+    c = Customer.query.filter_by(user_id=uid).first()
+    if not c:
+        return jsonify({"error": "Cliente no encontrado"}), 404
+
+    period = (request.args.get("period") or "").strip() or leaderboard.current_period()
+    product_code = (request.args.get("product_code") or "").strip() or leaderboard.ALL
+
+    station_id = shard_router.normalize(request.args.get("station_id"))
+
+    out = leaderboard.rank_of(c.id, period, product_code, station_id)
+    out.update({"period": period, "product_code": product_code, "station_id": station_id})
+    return jsonify(out)
 
 
 # ----------------- Rules (semilla) -----------------
@@ -275,17 +418,30 @@ def seed_rules():
 
 
 # ----------------- Catálogo/Canje -----------------
+REWARD_FIELDS = {
+    "id": (Reward.id, fieldsets.same),
+    "title": (Reward.title, fieldsets.same),
+    "required_points": (Reward.required_points, fieldsets.same),
+    "valid_from": (Reward.valid_from, fieldsets.iso),
+    "valid_to": (Reward.valid_to, fieldsets.iso),
+    "stock": (Reward.stock, fieldsets.same),
+}
+
+_rewards_cache = (None, None)  # (versión "rewards" del cachebus, lista serializada)
+
+
 @api.get("/rewards")
 def list_rewards():
-    rows = Reward.query.order_by(Reward.required_points.asc()).all()
-    return jsonify([{
-        "id": r.id,
-        "title": r.title,
-        "required_points": r.required_points,
-        "valid_from": r.valid_from.isoformat() if r.valid_from else None,
-        "valid_to": r.valid_to.isoformat() if r.valid_to else None,
-        "stock": r.stock
-    } for r in rows])
+    global _rewards_cache
+    version = cache_bus.version(REWARDS)
+    cached_version, payload = _rewards_cache
+    if payload is None or cached_version != version:
+        cols = fieldsets.columns_for(list(REWARD_FIELDS), REWARD_FIELDS)
+        to_dict = fieldsets.row_serializer(list(REWARD_FIELDS), REWARD_FIELDS, cols)
+        rows = db.session.execute(select(*cols).order_by(Reward.required_points.asc())).all()
+        payload = [to_dict(r) for r in rows]
+        _rewards_cache = (version, payload)
+    return jsonify(payload)
 
 
 @api.post("/me/redeem/<int:reward_id>")
@@ -326,9 +482,24 @@ def redeem_reward(reward_id):
     db.session.add(tx)
     if r.stock is not None:
         r.stock -= 1
+
+    # canje pendiente + código firmado para mostrar en caja
+    red = Redemption(
+        customer_id=c.id,
+        reward_id=r.id,
+        points_spent=int(r.required_points),
+        status=Redemption.STATUS_PENDING,
+    )
+    db.session.add(red)
+    db.session.flush()
+    red.code = redeem_codes.generate_code(red.id, r.id)
     db.session.commit()
 
-    return jsonify({"ok": True, "new_balance": current_balance(c.id)})
+    return jsonify({
+        "ok": True,
+        "new_balance": current_balance(c.id),
+        "redemption": {"id": red.id, "code": red.code, "status": red.status},
+    })
 
 
 # ----------------- Cargas genéricas (por IDs) -----------------
@@ -344,6 +515,7 @@ def create_purchase():
     note = data.get("note")
     payment_method = (data.get("payment_method") or None)
     ticket_number = (data.get("ticket_number") or None)
+    station_id = (data.get("station_id") or "").strip() or None
 
     c = None
     if customer_id:
@@ -356,7 +528,7 @@ def create_purchase():
     if not product_code:
         return jsonify({"ok": False, "error": "product_code es requerido"}), 400
 
-    rule = find_rule(product_code)
+    rule = find_rule(product_code, station_id)
     if not rule:
         return jsonify({"ok": False, "error": f"No hay regla activa para {product_code}"}), 409
 
@@ -379,7 +551,12 @@ def create_purchase():
         if not amount_f or amount_f <= 0:
             return jsonify({"ok": False, "error": "Se requiere 'amount_pesos' > 0 para esta regla"}), 400
 
-    points = calculate_points(rule, liters=liters_f, amount_pesos=amount_f)
+    # litros para reportes aunque se cobre por $: precio vigente (ver prices.py)
+    unit_price_f = None
+    if liters_f is None and amount_f is not None:
+        liters_f, unit_price_f = price_book.liters_for(product_code, amount_f, shard_router.normalize(station_id))
+
+    points = calculate_points(rule, liters=liters_f, amount_pesos=amount_f, multiplier=tiers.multiplier(c.tier))
     try:
         points = int(points)
     except Exception:
@@ -390,20 +567,28 @@ def create_purchase():
 
     operator_uid = int(get_jwt_identity())
 
+    alerts = anomaly_detector.observe(operator_uid, c.id, int(points))
+    if alerts and anomaly_detector.rejects:
+        return jsonify(anomaly_rejection(alerts)), 409
+
     tx = Transaction(
         customer_id=c.id,
         kind="earn",
         points=int(points),
         amount_pesos=amount_f,
         liters=liters_f,
+        unit_price=unit_price_f,
         product_code=product_code,
         note=note,
         payment_method=payment_method,
         ticket_number=ticket_number,
         operator_user_id=operator_uid,
+        station_id=shard_router.normalize(station_id),
     )
-    db.session.add(tx)
-    db.session.commit()
+    # el ledger va al shard de la estación
+    sess = shard_router.session_for(station_id)
+    sess.add(tx)
+    sess.commit()
 
     ensure_member_number(c)
     balance = current_balance(c.id)
@@ -417,5 +602,6 @@ def create_purchase():
             "id": c.id,
             "full_name": c.full_name,
             "member_number": c.member_number
-        }
+        },
+        "alerts": alerts,
     }), 201
\ No newline at end of file
@@ -7,6 +7,12 @@ from flask_jwt_extended import JWTManager
 from dotenv import load_dotenv
 
 from db import db
+import sharding
+import dbtuning
+import compression
+import admission
+import capture
+import fastjson
 from api import api as api_bp
 from admin import admin_api as admin_bp
 
@@ -32,16 +38,19 @@ def create_app():
 
         # ✅ JWT dura 7 días (evita Token expired a cada rato)
         JWT_ACCESS_TOKEN_EXPIRES=timedelta(days=7),
-
-        # opciones para conexiones (sirve tanto para sqlite como para Postgres)
-        SQLALCHEMY_ENGINE_OPTIONS={
-            "pool_pre_ping": True,
-            "pool_recycle": 300,
-        },
     )
 
+    # jsonify / get_json con orjson si está instalado (ver fastjson.py)
+    fastjson.init_app(app)
+
+    # opciones de conexión según dialecto (Postgres: pool + prepared statements, ver dbtuning.py)
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = dbtuning.engine_options(app.config["SQLALCHEMY_DATABASE_URI"])
+
     # ---------- EXTENSIONES ----------
+    sharding.configure(app)  # STATION_SHARDS -> binds "station:<id>"
     db.init_app(app)
+    dbtuning.init_app(app)   # contadores del pool + ping solo por inactividad
+    sharding.init_app(app)
     jwt = JWTManager(app)
 
     # ---------- CORS ----------
@@ -74,6 +83,15 @@ def create_app():
 
     app.url_map.strict_slashes = False
 
+    # captura opt-in para replay.py (antes de admission: registra también los 503)
+    capture.init_app(app)
+
+    # prioridad: la acreditación en playa no espera detrás de la app de clientes
+    admission.init_app(app)
+
+    # gzip/brotli para respuestas JSON grandes (ver compression.py)
+    compression.init_app(app)
+
     # ---------- BLUEPRINTS ----------
     app.register_blueprint(api_bp,   url_prefix="/api")
     app.register_blueprint(admin_bp, url_prefix="/api/admin")
@@ -81,10 +99,24 @@ def create_app():
     # ---------- MODELOS / DB ----------
     with app.app_context():
         import models  # asegura que los modelos se registren
-
-        auto = os.getenv("AUTO_CREATE_DB", "true").lower() == "true"
+        import leaderboard
+        import outbox
+        import sketches
+        import tiers
+        from cachebus import bus
+
+        leaderboard.register()  # mantiene leaderboard_scores al insertar earns
+        outbox.register()       # eventos transaction/redemption -> outbox_events
+        sketches.register()     # HLL/cuantiles diarios por producto
+        tiers.register()        # nivel por litros de 90 días en customers
+        bus.init_app(app)       # versiones de caches en memoria entre workers
+
+        # ✅ Sin DDL al arrancar workers: el esquema se aplica una vez con
+        #    `python migrations.py`. AUTO_CREATE_DB=true lo corre acá (dev).
+        auto = os.getenv("AUTO_CREATE_DB", "false").lower() == "true"
         if auto:
-            db.create_all()
+            import migrations
+            migrations.upgrade()
 
     # ---------- SALUD ----------
     @app.get("/health")
@@ -117,12 +149,28 @@ def create_app():
     def expired_token(jwt_header, jwt_payload):
         return jsonify({"error": "Token expired"}), 401
 
+    # ✅ Revocación por jti: se resuelve en memoria (ver revocation.py)
+    from revocation import denylist
+
+    @jwt.token_in_blocklist_loader
+    def token_revoked_check(jwt_header, jwt_payload):
+        return denylist.is_revoked(jwt_payload)
+
+    @jwt.revoked_token_loader
+    def revoked_token(jwt_header, jwt_payload):
+        return jsonify({"error": "Token revoked"}), 401
+
     return app
 
 
 app = create_app()
 
 if __name__ == "__main__":
+    # servidor de desarrollo: aplica migraciones pendientes antes de arrancar
+    import migrations
+    with app.app_context():
+        migrations.upgrade()
+
     app.run(
         host="0.0.0.0",
         port=8000,
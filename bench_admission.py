@@ -0,0 +1,130 @@
+# C:\Abetos_app\backend\bench_admission.py
+"""
+Prueba de carga del control de admisión: latencia de acreditación (clerk)
+mientras la app de clientes inunda /api/me, /api/me/transactions y /api/rewards.
+
+    python bench_admission.py [workers] [clientes] [segundos]
+
+Levanta N workers forkeados sobre una DB SQLite temporal (ver bench_login.py)
+y mide p50/p99 de POST /api/admin/accredit-by-dni:
+1) sin inundación, 2) inundación con ADMISSION=off, 3) inundación con ADMISSION=on.
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import tempfile
+import multiprocessing as mp
+import subprocess
+from datetime import datetime
+
+from werkzeug.security import generate_password_hash
+
+from bench_login import _start, _stop, _req, _pct
+
+
+CUSTOMER_PATHS = ["/api/me", "/api/me/transactions", "/api/rewards"]
+
+
+def _seed(db_path: str, n_tx: int) -> None:
+    here = os.path.dirname(os.path.abspath(__file__))
+    subprocess.run([sys.executable, "seed.py"], cwd=here, check=True, capture_output=True,
+                   env=dict(os.environ, SQLALCHEMY_DATABASE_URI=f"sqlite:///{db_path}"))
+    con = sqlite3.connect(db_path)
+    now = datetime.utcnow().isoformat(sep=" ")
+    cur = con.execute(
+        "INSERT INTO users (email, password_hash, role, is_verified, created_at) VALUES (?, ?, 'customer', 1, ?)",
+        ("cliente@bench.local", generate_password_hash("Cliente123"), now),
+    )
+    cur = con.execute(
+        "INSERT INTO customers (user_id, full_name, doc_number, member_number, created_at) VALUES (?, ?, ?, ?, ?)",
+        (cur.lastrowid, "Cliente Bench", "30111222", "B000001", now),
+    )
+    con.executemany(
+        "INSERT INTO transactions (customer_id, kind, points, liters, product_code, note, station_id, created_at) "
+        "VALUES (?, 'earn', 10, 20.0, 'NAFTA_SUPER', 'bench', 'main', ?)",
+        [(cur.lastrowid, now)] * n_tx,
+    )
+    con.commit()
+    con.close()
+
+
+def _login(port: int, email: str, pwd: str) -> dict:
+    _, body = _req(port, "POST", "/api/auth/login", {"email": email, "password": pwd})
+    return {"Authorization": "Bearer " + json.loads(body)["access_token"]}
+
+
+def _flood(port: int, headers: dict, stop, out) -> None:
+    """Un proceso por cliente: el GIL del benchmark no debe inflar la latencia medida."""
+    counts, i = {}, 0
+    while not stop.is_set():
+        i += 1
+        try:
+            status, _ = _req(port, "GET", CUSTOMER_PATHS[i % len(CUSTOMER_PATHS)], headers=headers)
+        except OSError:
+            status = 0
+        counts[status] = counts.get(status, 0) + 1
+    out.put(counts)
+
+
+def _clerk(port: int, headers: dict, seconds: float) -> tuple:
+    lat, errors = [], 0
+    end = time.perf_counter() + seconds
+    body = {"doc_number": "11111111", "product_code": "NAFTA_SUPER", "liters": 30}
+    while time.perf_counter() < end:
+        t = time.perf_counter()
+        status, _ = _req(port, "POST", "/api/admin/accredit-by-dni", body, headers=headers)
+        lat.append(time.perf_counter() - t)
+        errors += status >= 300
+        time.sleep(0.02)  # un auto cada tanto, no un loop cerrado
+    return lat, errors
+
+
+def run_mode(label, workers, clients, seconds, env, db_uri) -> None:
+    port, procs = _start(workers, env, db_uri)
+    try:
+        clerk = _login(port, "clerk@abetos.local", "Clerk123")
+        cust = _login(port, "cliente@bench.local", "Cliente123")
+
+        ctx = mp.get_context("fork")
+        stop, out, flooders = ctx.Event(), ctx.Queue(), []
+        for _ in range(clients):
+            p = ctx.Process(target=_flood, args=(port, cust, stop, out), daemon=True)
+            p.start()
+            flooders.append(p)
+        time.sleep(0.5 if clients else 0)
+        lat, errors = _clerk(port, clerk, seconds)
+        stop.set()
+        counts = {}
+        for _ in flooders:
+            for k, v in out.get(timeout=30).items():
+                counts[k] = counts.get(k, 0) + v
+        for p in flooders:
+            p.join(5)
+
+        flood = " ".join(f"{k}:{v}" for k, v in sorted(counts.items())) or "-"
+        print(f"{label:<24} clerk p50 {_pct(lat, .5):7.1f} ms  p99 {_pct(lat, .99):7.1f} ms  "
+              f"n={len(lat):<4} err={errors:<3} clientes {flood}")
+    finally:
+        _stop(procs)
+
+
+if __name__ == "__main__":
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 8
+
+    tmp = tempfile.mkdtemp()
+    db_path = os.path.join(tmp, "bench.db")
+    _seed(db_path, 3000)
+    db_uri = f"sqlite:///{db_path}"
+
+    base = {
+        "LOGIN_THROTTLE": "off", "ANOMALY_MODE": "off",
+        "ADMISSION_FILE": os.path.join(tmp, "admission.bin"),
+        "ADMISSION_CAPACITY": str(workers),
+    }
+    run_mode("sin inundación", workers, 0, seconds, {**base, "ADMISSION": "on"}, db_uri)
+    run_mode("inundación, off", workers, clients, seconds, {**base, "ADMISSION": "off"}, db_uri)
+    run_mode("inundación, on", workers, clients, seconds, {**base, "ADMISSION": "on"}, db_uri)
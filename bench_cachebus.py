@@ -0,0 +1,125 @@
+# C:\Abetos_app\backend\bench_cachebus.py
+"""
+Benchmark del cachebus (invalidación de caches entre workers).
+
+    python bench_cachebus.py [workers] [cambios]
+
+Sobre una DB SQLite temporal (seed) levanta N procesos lectores que llaman a
+find_rule("NAFTA_SUPER") en loop (como un worker de gunicorn) y anotan cuándo
+ven cada valor nuevo de points_per_unit. El proceso principal cambia la regla
+por ORM (admin) M veces y mide:
+1) demora commit -> primer find_rule con el valor nuevo, por worker (p50/p95/máx);
+2) que ningún worker se quede con un valor viejo;
+3) costo de find_rule con el cache caliente y de bus.version().
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import subprocess
+
+
+def _app(db_path: str):
+    os.environ["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
+    from app import create_app
+    return create_app()
+
+
+def _reader(db_path: str, duration: float) -> None:
+    app = _app(db_path)
+    from rules import find_rule
+
+    seen = []
+    with app.app_context():
+        last = find_rule("NAFTA_SUPER").points_per_unit
+        print("ready", flush=True)
+        end = time.time() + duration
+        while time.time() < end:
+            ppu = find_rule("NAFTA_SUPER").points_per_unit
+            if ppu != last:
+                seen.append((ppu, time.time()))
+                last = ppu
+            time.sleep(0.001)  # un request cada ~1 ms
+    print(json.dumps(seen), flush=True)
+
+
+def _pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def main(workers: int, changes: int) -> None:
+    here = os.path.dirname(os.path.abspath(__file__))
+    tmp = tempfile.mkdtemp(prefix="bench_cachebus_")
+    db_path = os.path.join(tmp, "bench.db")
+    env = dict(os.environ, SQLALCHEMY_DATABASE_URI=f"sqlite:///{db_path}",
+               CACHE_BUS_STAMP_FILE=os.path.join(tmp, "cache.stamp"))
+    os.environ["CACHE_BUS_STAMP_FILE"] = env["CACHE_BUS_STAMP_FILE"]
+    subprocess.run([sys.executable, "seed.py"], cwd=here, check=True, capture_output=True, env=env)
+
+    gap = 0.5
+    duration = changes * gap + 5
+    procs = [
+        subprocess.Popen([sys.executable, __file__, "_reader", db_path, str(duration)],
+                         cwd=here, env=env, stdout=subprocess.PIPE, text=True)
+        for _ in range(workers)
+    ]
+    for p in procs:
+        assert p.stdout.readline().strip() == "ready"
+
+    app = _app(db_path)
+    from db import db
+    from models import EarningRule
+    from rules import find_rule
+    from cachebus import bus, RULES
+
+    commits = {}
+    with app.app_context():
+        rule = EarningRule.query.filter_by(product_code="NAFTA_SUPER", station_id=None).first()
+        base = float(rule.points_per_unit)
+        for i in range(1, changes + 1):
+            time.sleep(gap)
+            rule.points_per_unit = base + i
+            db.session.commit()
+            commits[base + i] = time.time()
+
+        # costo en caliente (mismo proceso)
+        find_rule("NAFTA_SUPER")
+        n = 200_000
+        t0 = time.perf_counter()
+        for _ in range(n):
+            find_rule("NAFTA_SUPER")
+        hit_ns = (time.perf_counter() - t0) / n * 1e9
+        t0 = time.perf_counter()
+        for _ in range(n):
+            bus.version(RULES)
+        version_ns = (time.perf_counter() - t0) / n * 1e9
+
+    delays, stale = [], 0
+    final = base + changes
+    for p in procs:
+        out, _ = p.communicate()
+        seen = json.loads(out.strip().splitlines()[-1])
+        for ppu, ts in seen:
+            if ppu in commits:
+                delays.append((ts - commits[ppu]) * 1000)
+        if not seen or seen[-1][0] != final:
+            stale += 1
+
+    print(f"workers={workers} cambios={changes} (poll {bus.poll_sec * 1000:.0f} ms)")
+    if delays:
+        print(f"  demora commit -> visto: p50 {_pct(delays, 50):.0f} ms, p95 {_pct(delays, 95):.0f} ms, "
+              f"máx {max(delays):.0f} ms ({len(delays)} observaciones)")
+    print(f"  workers con valor viejo al final: {stale}")
+    print(f"  find_rule (hit): {hit_ns:.0f} ns/llamada; bus.version(): {version_ns:.0f} ns/llamada")
+    if stale:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "_reader":
+        _reader(sys.argv[2], float(sys.argv[3]))
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 4,
+             int(sys.argv[2]) if len(sys.argv) > 2 else 10)
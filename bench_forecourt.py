@@ -0,0 +1,140 @@
+# C:\Abetos_app\backend\bench_forecourt.py
+"""
+Benchmark de la ingesta de surtidores (forecourt.py).
+
+    python bench_forecourt.py [despachos] [clientes]
+
+Sobre una DB SQLite temporal (seed + N clientes por sqlite3) genera un feed
+de despachos (JSON por línea, 2% con DNI inexistente, la mitad con tarjeta)
+y mide:
+1) archivo: --once sobre el feed completo, cortado a la mitad (stop) y
+   retomado desde el checkpoint: no debe duplicar ni perder despachos.
+2) socket: un cliente TCP manda el feed lo más rápido que puede (el daemon
+   lo frena con back-pressure: cola de 5000) y se mide hasta el último commit.
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import sqlite3
+import tempfile
+import threading
+import subprocess
+from datetime import datetime
+
+
+def _seed(db_path: str, n_customers: int) -> None:
+    here = os.path.dirname(os.path.abspath(__file__))
+    subprocess.run([sys.executable, "seed.py"], cwd=here, check=True, capture_output=True,
+                   env=dict(os.environ, SQLALCHEMY_DATABASE_URI=f"sqlite:///{db_path}"))
+    con = sqlite3.connect(db_path)
+    stamp = datetime.utcnow().isoformat(sep=" ")
+    con.executemany(
+        "INSERT INTO users (id, email, password_hash, role, is_verified, created_at) VALUES (?, ?, '!', 'customer', 0, ?)",
+        ((1000 + i, f"f{i}@bench.local", stamp) for i in range(n_customers)),
+    )
+    con.executemany(
+        "INSERT INTO customers (id, user_id, full_name, doc_number, member_number, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+        ((1000 + i, 1000 + i, f"Cliente {i}", str(40000000 + i), f"F{i:07d}", stamp) for i in range(n_customers)),
+    )
+    con.commit()
+    con.close()
+
+
+def _feed(path: str, n: int, n_customers: int, start_seq: int = 1) -> int:
+    rnd = random.Random(11)
+    products = ["NAFTA_SUPER", "INFINIA", "GNC"]
+    bad = 0
+    with open(path, "w") as fh:
+        for i in range(n):
+            c = rnd.randrange(n_customers)
+            d = {"seq": start_seq + i, "ts": datetime.utcnow().isoformat(timespec="seconds"),
+                 "pump": rnd.randint(1, 12), "product": rnd.choice(products)}
+            liters = round(rnd.uniform(5, 60), 2)
+            d["liters"], d["amount"] = liters, round(liters * 1250, 2)
+            d["ticket"] = f"B-0001-{start_seq + i:08d}"
+            if rnd.random() < 0.02:
+                d["dni"] = str(10000000 + i)  # no existe
+                bad += 1
+            elif i % 2:
+                d["card"] = f"F{c:07d}"
+            else:
+                d["dni"] = str(40000000 + c)
+            fh.write(json.dumps(d) + "\n")
+    return bad
+
+
+def _count(db_path: str) -> int:
+    con = sqlite3.connect(db_path)
+    n = con.execute("SELECT count(*) FROM transactions").fetchone()[0]
+    con.close()
+    return n
+
+
+def main(n: int, n_customers: int) -> None:
+    tmp = tempfile.mkdtemp()
+    db_path = os.path.join(tmp, "bench.db")
+    _seed(db_path, n_customers)
+    feed = os.path.join(tmp, "despachos.log")
+    bad = _feed(feed, n, n_customers)
+
+    os.environ["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
+    from app import create_app
+    import forecourt
+
+    app = create_app()
+    with app.app_context():
+        # 1) archivo, con corte a la mitad y reanudación
+        stop = threading.Event()
+        ing = forecourt.Ingestor("file:" + feed)
+        q = forecourt.start_file(ing, feed, stop, once=True)
+        t = time.perf_counter()
+        for items in forecourt.batches(q, forecourt.BATCH_SIZE, forecourt.MAX_WAIT_MS / 1000):
+            ing.ingest(items)
+            if ing.stats["read"] >= n // 2:
+                stop.set()
+                break
+        first = ing.stats["read"]
+        while q.get() is not forecourt._EOF:  # el lector suelta lo que tenía en la cola
+            pass
+
+        ing = forecourt.Ingestor("file:" + feed)
+        q = forecourt.start_file(ing, feed, threading.Event(), once=True)
+        res = forecourt.run(ing, q, threading.Event(), report_sec=0)
+        total = time.perf_counter() - t
+        written = _count(db_path)
+        ok = "✅" if written == n - bad and first + res["read"] == n else "❌"
+        print(f"archivo: {n} despachos en {total:.2f} s = {n / total:,.0f}/s  "
+              f"(corte en {first}, reanudado desde offset; {written} escritos, {bad} rechazos esperados) {ok}")
+
+        # 2) socket
+        before = _count(db_path)
+        stop = threading.Event()
+        q, (host, port) = forecourt.start_socket(("127.0.0.1", 0), stop, queue_size=5000)
+        ing = forecourt.Ingestor(f"tcp:127.0.0.1:{port}")
+        with open(feed, "rb") as fh:
+            payload = fh.read().replace(b'"seq": ', b'"seq": 1000000')  # seq nuevos (misma fuente no)
+
+        def client():
+            with socket.create_connection((host, port)) as s:
+                s.sendall(payload)
+            while ing.stats["read"] < n:  # el daemon corta cuando procesó todo
+                time.sleep(0.01)
+            stop.set()
+
+        t = time.perf_counter()
+        threading.Thread(target=client, daemon=True).start()
+        res = forecourt.run(ing, q, stop, report_sec=0)
+        total = time.perf_counter() - t
+        written = _count(db_path) - before
+        ok = "✅" if written == n - bad else "❌"
+        print(f"socket:  {n} despachos en {total:.2f} s = {n / total:,.0f}/s  "
+              f"({written} escritos, {res['rejected']} rechazados, {res['batches']} lotes) {ok}")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    c = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    main(n, c)
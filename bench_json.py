@@ -0,0 +1,146 @@
+# C:\Abetos_app\backend\bench_json.py
+"""
+Benchmark de CPU por respuesta de 1000 filas: camino ORM vs tuplas Core +
+proveedor JSON rápido (fastjson.py).
+
+    python bench_json.py [filas] [repeticiones]
+
+Usa una DB SQLite temporal: un cliente con N transacciones y N clientes.
+Por listado (me/transactions, customers/summary) mide tiempo de CPU
+(process_time) por respuesta armada, en el contexto de un request:
+- orm + stdlib:   objetos ORM completos, dicts con isoformat(), json stdlib
+                  (lo que hacían los endpoints antes de los sparse fieldsets);
+- core + stdlib:  select(*cols) -> tuplas, row_serializer, json stdlib;
+- core + orjson:  igual, con orjson (si está instalado).
+Además, el request completo por el test client con cada proveedor.
+"""
+import os
+import sys
+import time
+import tempfile
+from datetime import datetime, timedelta
+
+
+def _cpu_ms(fn, reps: int) -> float:
+    fn()  # calentar (compilación de la consulta, caches)
+    t = time.process_time()
+    for _ in range(reps):
+        fn()
+    return (time.process_time() - t) * 1000 / reps
+
+
+def main(n_rows: int, reps: int) -> None:
+    tmp = tempfile.mkdtemp()
+    os.environ["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ["CACHE_BUS_STAMP_FILE"] = os.path.join(tmp, "cache.stamp")
+    os.environ.setdefault("LOGIN_THROTTLE", "off")
+    os.environ.setdefault("COMPRESS", "off")
+
+    import seed
+    seed.main()
+    from sqlalchemy import select
+    from app import create_app
+    from db import db
+    from models import User, Customer, Transaction
+    import fastjson
+    import fieldsets
+    from api import TX_FIELDS
+    from admin import CUSTOMER_FIELDS
+
+    app = create_app()
+    cl = app.test_client()
+
+    with app.app_context():
+        admin = User.query.filter_by(email="admin@abetos.local").first()
+        cust = Customer.query.filter_by(user_id=admin.id).first()
+        now = datetime.utcnow()
+        db.session.add_all([
+            Transaction(customer_id=cust.id, kind="earn", points=10 + i % 90, liters=10.0 + i % 30,
+                        amount_pesos=12000.0 + i, product_code="NAFTA_SUPER", station_id="main",
+                        note="Acreditación por DNI", created_at=now - timedelta(minutes=i))
+            for i in range(n_rows)
+        ])
+        pw = admin.password_hash
+        users = [User(email=f"j{i}@bench.local", role="customer", password_hash=pw) for i in range(n_rows)]
+        db.session.add_all(users)
+        db.session.flush()
+        db.session.add_all([Customer(user_id=u.id, full_name=f"Cliente Bench {i}", doc_number=f"{35000000 + i}",
+                                     phone="+54 9 11 5555-0000", member_number=f"J{i:06d}",
+                                     created_at=now - timedelta(seconds=i))
+                            for i, u in enumerate(users)])
+        db.session.commit()
+        cust_id = cust.id
+
+    providers = [("stdlib", fastjson.StdlibJSONProvider(app))]
+    if fastjson.orjson is not None:
+        providers.append(("orjson", fastjson.OrjsonJSONProvider(app)))
+    for _, p in providers:
+        p.sort_keys = False
+
+    # ---------- armado de la respuesta (sin JWT ni routing) ----------
+    def tx_orm(provider):
+        rows = (Transaction.query.filter_by(customer_id=cust_id)
+                .order_by(Transaction.created_at.desc()).all())
+        provider.response([{
+            "id": t.id, "station_id": t.station_id, "kind": t.kind, "points": t.points,
+            "amount_pesos": float(t.amount_pesos) if t.amount_pesos is not None else None,
+            "liters": float(t.liters) if t.liters is not None else None,
+            "product_code": t.product_code, "note": t.note,
+            "created_at": t.created_at.isoformat() if t.created_at else None,
+        } for t in rows]).get_data()
+        db.session.expunge_all()
+
+    def tx_core(provider):
+        fields = list(TX_FIELDS)
+        cols = fieldsets.columns_for(fields, TX_FIELDS, extra=("created_at",))
+        rows = db.session.execute(select(*cols).where(Transaction.customer_id == cust_id)
+                                  .order_by(Transaction.created_at.desc())).all()
+        to_dict = fieldsets.row_serializer(fields, TX_FIELDS, cols)
+        provider.response([to_dict(r) for r in rows]).get_data()
+
+    def cu_orm(provider):
+        rows = Customer.query.order_by(Customer.created_at.desc()).limit(n_rows).all()
+        provider.response({"total": len(rows), "items": [{
+            "id": c.id, "full_name": c.full_name, "doc_number": c.doc_number, "phone": c.phone,
+            "member_number": c.member_number,
+            "created_at": c.created_at.isoformat() if c.created_at else None,
+            "tier": c.tier, "tier_liters_90d": float(c.tier_liters_90d),
+        } for c in rows]}).get_data()
+        db.session.expunge_all()
+
+    def cu_core(provider):
+        fields = [f for f in CUSTOMER_FIELDS if f not in ("points_balance", "segment")]
+        cols = fieldsets.columns_for(fields, CUSTOMER_FIELDS, extra=("id",))
+        rows = db.session.execute(select(*cols).order_by(Customer.created_at.desc()).limit(n_rows)).all()
+        to_dict = fieldsets.row_serializer(fields, CUSTOMER_FIELDS, cols)
+        provider.response({"total": len(rows), "items": [to_dict(r) for r in rows]}).get_data()
+
+    print(f"{n_rows} filas, {reps} repeticiones; ms de CPU por respuesta")
+    print(f"{'listado':<20}{'camino':<16}{'ms':>8}{'x':>7}")
+    with app.test_request_context():
+        for label, orm_fn, core_fn in (("me/transactions", tx_orm, tx_core),
+                                       ("customers/summary", cu_orm, cu_core)):
+            base = _cpu_ms(lambda: orm_fn(providers[0][1]), reps)
+            print(f"{label:<20}{'orm + stdlib':<16}{base:>8.2f}{1.0:>7.1f}")
+            for name, p in providers:
+                ms = _cpu_ms(lambda: core_fn(p), reps)
+                print(f"{'':<20}{'core + ' + name:<16}{ms:>8.2f}{base / ms:>7.1f}")
+
+    # ---------- request completo ----------
+    r = cl.post("/api/auth/login", json={"email": "admin@abetos.local", "password": "Admin123"})
+    auth = {"Authorization": "Bearer " + r.get_json()["access_token"]}
+    print(f"\n{'request completo':<44}{'ms':>8}")
+    for path in ("/api/me/transactions", f"/api/admin/customers/summary?limit={n_rows}"
+                                         "&fields=id,full_name,doc_number,phone,member_number,created_at,tier"):
+        for name, p in providers:
+            app.json = p
+            ms = _cpu_ms(lambda: cl.get(path, headers=auth), reps)
+            print(f"{path.split('?')[0] + ' (' + name + ')':<44}{ms:>8.2f}")
+    if fastjson.orjson is None:
+        print("(orjson no instalado: pip install orjson para medirlo)")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    reps = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    main(n, reps)
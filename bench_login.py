@@ -0,0 +1,149 @@
+# C:\Abetos_app\backend\bench_login.py
+"""
+Benchmark: ¿siguen atendiendo los workers a los playeros durante un ataque
+de credential stuffing contra /api/auth/login?
+
+    python bench_login.py [workers] [atacantes] [segundos]
+
+Levanta N workers forkeados (como gunicorn --preload) sobre una DB SQLite
+temporal y mide la latencia de GET /api/admin/customers/find de un clerk:
+1) sin ataque, 2) con ataque y LOGIN_THROTTLE=off, 3) con ataque y throttle.
+Los atacantes prueban emails/DNIs distintos con contraseñas incorrectas.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import signal
+import tempfile
+import subprocess
+import threading
+import http.client
+import multiprocessing as mp
+
+
+def _serve(sock, env: dict, db_uri: str) -> None:
+    os.environ.update(env)
+    os.environ["SQLALCHEMY_DATABASE_URI"] = db_uri
+    os.environ["AUTO_CREATE_DB"] = "false"
+    from werkzeug.serving import BaseWSGIServer
+    from werkzeug.serving import WSGIRequestHandler
+    from app import create_app
+
+    app = create_app()
+
+    class Quiet(WSGIRequestHandler):
+        def log(self, *a, **k):
+            pass
+
+    srv = BaseWSGIServer("127.0.0.1", 0, app, handler=Quiet, fd=sock.fileno())
+    srv.serve_forever()
+
+
+def _start(workers: int, env: dict, db_uri: str):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(256)
+    port = sock.getsockname()[1]
+    ctx = mp.get_context("fork")
+    procs = [ctx.Process(target=_serve, args=(sock, env, db_uri), daemon=True) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    sock.close()
+    for _ in range(100):
+        try:
+            _req(port, "GET", "/health")
+            break
+        except OSError:
+            time.sleep(0.1)
+    return port, procs
+
+
+def _stop(procs) -> None:
+    for p in procs:
+        os.kill(p.pid, signal.SIGTERM)
+    for p in procs:
+        p.join(5)
+
+
+def _req(port: int, method: str, path: str, body=None, headers=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    data = json.dumps(body).encode() if body is not None else None
+    h = {"Content-Type": "application/json", **(headers or {})}
+    conn.request(method, path, body=data, headers=h)
+    r = conn.getresponse()
+    out = r.status, r.read()
+    conn.close()
+    return out
+
+
+def _attacker(port: int, n: int, stop: threading.Event, counts: dict) -> None:
+    i = 0
+    while not stop.is_set():
+        i += 1
+        ident = {"email": f"victim{n}_{i}@mail.com"} if i % 2 else {"doc_number": f"{40000000 + n * 100000 + i}"}
+        try:
+            status, _ = _req(port, "POST", "/api/auth/login", {**ident, "password": "hunter2"})
+        except OSError:
+            status = 0
+        counts[status] = counts.get(status, 0) + 1
+
+
+def _clerk(port: int, headers: dict, seconds: float) -> list:
+    lat = []
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        t = time.perf_counter()
+        _req(port, "GET", "/api/admin/customers/find?doc_number=11111111", headers=headers)
+        lat.append(time.perf_counter() - t)
+    return lat
+
+
+def _pct(xs: list, p: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(len(xs) * p))] * 1000 if xs else float("nan")
+
+
+def run_mode(label: str, workers: int, attackers: int, seconds: float, env: dict, db_uri: str) -> None:
+    port, procs = _start(workers, env, db_uri)
+    try:
+        _, body = _req(port, "POST", "/api/auth/login", {"email": "clerk@abetos.local", "password": "Clerk123"})
+        headers = {"Authorization": "Bearer " + json.loads(body)["access_token"]}
+
+        stop, counts, threads = threading.Event(), {}, []
+        for n in range(attackers):
+            th = threading.Thread(target=_attacker, args=(port, n, stop, counts), daemon=True)
+            th.start()
+            threads.append(th)
+        lat = _clerk(port, headers, seconds)
+        stop.set()
+        for th in threads:
+            th.join(5)
+
+        att = " ".join(f"{k}:{v}" for k, v in sorted(counts.items())) or "-"
+        print(f"{label:<26} clerk p50 {_pct(lat, .5):7.1f} ms  p95 {_pct(lat, .95):7.1f} ms  "
+              f"n={len(lat):<5} login {att}")
+    finally:
+        _stop(procs)
+
+
+if __name__ == "__main__":
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    attackers = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    tmp = tempfile.mkdtemp()
+    db_uri = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    # el seed corre en otro proceso: este no debe importar la app (los workers
+    # leen la configuración del throttle al importarla)
+    subprocess.run([sys.executable, "seed.py"], env=dict(os.environ, SQLALCHEMY_DATABASE_URI=db_uri),
+                   cwd=os.path.dirname(os.path.abspath(__file__)), check=True, capture_output=True)
+
+    base = {"LOGIN_THROTTLE_FILE": os.path.join(tmp, "throttle.bin"), "ANOMALY_MODE": "off"}
+    run_mode("sin ataque", workers, 0, seconds, {**base, "LOGIN_THROTTLE": "on"}, db_uri)
+    run_mode("ataque, throttle off", workers, attackers, seconds, {**base, "LOGIN_THROTTLE": "off"}, db_uri)
+    if os.path.exists(base["LOGIN_THROTTLE_FILE"]):
+        os.remove(base["LOGIN_THROTTLE_FILE"])
+    run_mode("ataque, throttle on", workers, attackers, seconds, {**base, "LOGIN_THROTTLE": "on"}, db_uri)
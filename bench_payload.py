@@ -0,0 +1,82 @@
+# C:\Abetos_app\backend\bench_payload.py
+"""
+Benchmark de bytes en el cable y tiempo de respuesta para los listados,
+con y sin ?fields= y con/sin compresión.
+
+    python bench_payload.py [transacciones] [repeticiones]
+
+Usa una DB SQLite temporal: un cliente con N transacciones y 200 clientes
+para el resumen admin.
+"""
+import os
+import sys
+import time
+import tempfile
+from datetime import datetime, timedelta
+
+
+def main(n_tx: int, reps: int) -> None:
+    tmp = tempfile.mkdtemp()
+    os.environ["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ.setdefault("LOGIN_THROTTLE", "off")
+
+    import seed
+    seed.main()
+    from app import create_app
+    from db import db
+    from models import User, Customer, Transaction
+    import compression
+
+    app = create_app()
+    cl = app.test_client()
+
+    with app.app_context():
+        admin = User.query.filter_by(email="admin@abetos.local").first()
+        cust = Customer.query.filter_by(user_id=admin.id).first()
+        now = datetime.utcnow()
+        db.session.add_all([
+            Transaction(customer_id=cust.id, kind="earn", points=10 + i % 90, liters=10.0 + i % 30,
+                        amount_pesos=12000.0 + i, product_code="NAFTA_SUPER", station_id="main",
+                        note="Acreditación por DNI", created_at=now - timedelta(minutes=i))
+            for i in range(n_tx)
+        ])
+        pw = admin.password_hash
+        users = [User(email=f"b{i}@bench.local", role="customer", password_hash=pw) for i in range(200)]
+        db.session.add_all(users)
+        db.session.flush()
+        db.session.add_all([Customer(user_id=u.id, full_name=f"Cliente Bench {i}", doc_number=f"{35000000 + i}",
+                                     phone="+54 9 11 5555-0000", member_number=f"B{i:06d}")
+                            for i, u in enumerate(users)])
+        db.session.commit()
+
+    r = cl.post("/api/auth/login", json={"email": "admin@abetos.local", "password": "Admin123"})
+    auth = {"Authorization": "Bearer " + r.get_json()["access_token"]}
+
+    cases = [
+        ("me/transactions", "/api/me/transactions"),
+        ("me/transactions fields", "/api/me/transactions?fields=id,points,created_at"),
+        ("customers/summary", "/api/admin/customers/summary?limit=200"),
+        ("customers/summary fields", "/api/admin/customers/summary?limit=200&fields=id,full_name,points_balance"),
+    ]
+    encodings = [("identity", "identity"), ("gzip", "gzip")]
+    if compression.brotli is not None:
+        encodings.append(("br", "br"))
+
+    print(f"{'caso':<28}{'enc':>9}{'bytes':>10}{'ms/req':>9}")
+    for label, path in cases:
+        for name, accept in encodings:
+            headers = {**auth, "Accept-Encoding": accept}
+            cl.get(path, headers=headers)  # calentar
+            t = time.perf_counter()
+            for _ in range(reps):
+                resp = cl.get(path, headers=headers)
+            ms = (time.perf_counter() - t) * 1000 / reps
+            print(f"{label:<28}{name:>9}{len(resp.data):>10}{ms:>9.2f}")
+    if compression.brotli is None:
+        print("(brotli no instalado: pip install brotli para medirlo)")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    reps = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    main(n, reps)
@@ -0,0 +1,137 @@
+# C:\Abetos_app\backend\bench_redemptions.py
+"""
+Benchmark de aprobación / rechazo masivo de canjes.
+
+    python bench_redemptions.py [canjes]
+
+Sobre una DB SQLite temporal crea N canjes pendientes (con su redeem en el
+ledger) y mide, vía HTTP (test client):
+- recorrer los pendientes con paginación keyset (páginas de 1000);
+- aprobar N por filtro en una llamada;
+- rechazar N por lista de ids en una llamada (reintegro + stock);
+- referencia: rechazar de a uno con el ORM (lo que haría un loop de llamadas).
+Al final verifica saldos y stock.
+"""
+import os
+import sys
+import time
+import tempfile
+from datetime import datetime
+
+
+def _seed_pending(db, n: int, customer_ids: list, reward) -> None:
+    from models import Transaction, Redemption
+
+    now = datetime.utcnow()
+    conn = db.session.connection()
+    conn.execute(Transaction.__table__.insert(), [{
+        "customer_id": customer_ids[i % len(customer_ids)], "kind": "redeem",
+        "points": -reward.required_points, "product_code": f"REWARD:{reward.id}", "reward_id": reward.id,
+        "note": "bench", "paid_with_app": False, "created_at": now,
+    } for i in range(n)])
+    conn.execute(Redemption.__table__.insert(), [{
+        "customer_id": customer_ids[i % len(customer_ids)], "reward_id": reward.id,
+        "points_spent": reward.required_points, "status": "pending", "created_at": now,
+    } for i in range(n)])
+    reward.stock -= n
+    db.session.commit()
+
+
+def main(n: int) -> None:
+    tmp = tempfile.mkdtemp()
+    os.environ["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ.setdefault("LOGIN_THROTTLE", "off")
+    os.environ.setdefault("ADMISSION", "off")
+
+    import seed
+    seed.main()
+    from app import create_app
+    from db import db
+    from models import User, Customer, Reward, Redemption, Transaction
+    from sharding import router
+
+    app = create_app()
+    cl = app.test_client()
+
+    with app.app_context():
+        pw = User.query.filter_by(email="admin@abetos.local").first().password_hash
+        users = [User(email=f"r{i}@bench.local", role="customer", password_hash=pw) for i in range(500)]
+        db.session.add_all(users)
+        db.session.flush()
+        custs = [Customer(user_id=u.id, full_name=f"Cliente {i}", doc_number=f"{36000000 + i}",
+                          member_number=f"R{i:06d}") for i, u in enumerate(users)]
+        db.session.add_all(custs)
+        reward = Reward(title="Café bench", required_points=100, stock=10 * n)
+        db.session.add(reward)
+        db.session.commit()
+        cids, rid = [c.id for c in custs], reward.id
+
+    r = cl.post("/api/auth/login", json={"email": "admin@abetos.local", "password": "Admin123"})
+    auth = {"Authorization": "Bearer " + r.get_json()["access_token"]}
+
+    def seed_round():
+        with app.app_context():
+            _seed_pending(db, n, cids, db.session.get(Reward, rid))
+
+    def timed(label, fn):
+        t = time.perf_counter()
+        out = fn()
+        print(f"{label:<36}{(time.perf_counter() - t) * 1000:10.1f} ms   {out}")
+        return out
+
+    # 1) listado keyset + aprobación por filtro
+    seed_round()
+
+    def page_all():
+        after, pages, items = 0, 0, 0
+        while after is not None:
+            body = cl.get(f"/api/admin/redemptions/pending?reward_id={rid}&limit=1000&after_id={after}",
+                          headers=auth).get_json()
+            pages, items, after = pages + 1, items + len(body["items"]), body["next_after_id"]
+        return f"{items} en {pages} páginas"
+
+    timed(f"listar {n} pendientes (keyset)", page_all)
+    timed(f"aprobar {n} por filtro", lambda: cl.post(
+        "/api/admin/redemptions/approve", json={"reward_id": rid}, headers=auth).get_json()["updated"])
+
+    # 2) rechazo por ids (reintegro + stock)
+    seed_round()
+    with app.app_context():
+        ids = [i for (i,) in db.session.query(Redemption.id).filter_by(status="pending")]
+        before = router.balances(cids)
+        stock_before = db.session.get(Reward, rid).stock
+    timed(f"rechazar {n} por ids", lambda: "updated={updated} refunded_points={refunded_points}".format(
+        **cl.post("/api/admin/redemptions/reject", json={"ids": ids}, headers=auth).get_json()))
+
+    with app.app_context():
+        after_bal = router.balances(cids)
+        gained = sum(after_bal[c] - before[c] for c in cids)
+        stock_after = db.session.get(Reward, rid).stock
+        refunds = db.session.query(Transaction).filter(Transaction.product_code.like("REFUND:%")).count()
+    ok = gained == n * 100 and stock_after - stock_before == n and refunds == n
+    print(f"{'verificación':<36}puntos +{gained}  stock +{stock_after - stock_before}  "
+          f"reintegros {refunds}  {'OK' if ok else 'ERROR'}")
+
+    # 3) referencia: de a uno con el ORM
+    seed_round()
+    with app.app_context():
+        ids = [i for (i,) in db.session.query(Redemption.id).filter_by(status="pending")]
+
+    def one_by_one():
+        with app.app_context():
+            for i in ids:
+                red = db.session.get(Redemption, i)
+                if red.status != "pending":
+                    continue
+                red.status = "rejected"
+                db.session.add(Transaction(customer_id=red.customer_id, kind="earn", points=red.points_spent,
+                                           product_code=f"REFUND:{red.id}", reward_id=red.reward_id))
+                red.reward.stock += 1
+                db.session.commit()
+        return len(ids)
+
+    timed(f"rechazar {n} de a uno (ORM)", one_by_one)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
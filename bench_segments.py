@@ -0,0 +1,88 @@
+# C:\Abetos_app\backend\bench_segments.py
+"""
+Benchmark del job RFM (segments.py).
+
+    python bench_segments.py [clientes] [despachos_por_cliente]
+
+Crea una DB SQLite temporal con N clientes y ~K despachos cada uno (insert
+directo con sqlite3) y corre segments.rebuild() con NumPy y, si N es chico,
+también en Python puro.
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+import tempfile
+import subprocess
+from datetime import datetime, timedelta
+
+
+def _seed(db_path: str, n_customers: int, per_customer: int) -> int:
+    here = os.path.dirname(os.path.abspath(__file__))
+    subprocess.run([sys.executable, "seed.py"], cwd=here, check=True, capture_output=True,
+                   env=dict(os.environ, SQLALCHEMY_DATABASE_URI=f"sqlite:///{db_path}"))
+    con = sqlite3.connect(db_path)
+    con.execute("PRAGMA journal_mode=OFF")
+    con.execute("PRAGMA synchronous=OFF")
+    now = datetime.utcnow()
+    rnd = random.Random(7)
+
+    stamp = now.isoformat(sep=" ")
+    con.executemany(
+        "INSERT INTO users (id, email, password_hash, role, is_verified, created_at) VALUES (?, ?, '!', 'customer', 0, ?)",
+        ((1000 + i, f"s{i}@bench.local", stamp) for i in range(n_customers)),
+    )
+    con.executemany(
+        "INSERT INTO customers (id, user_id, full_name, doc_number, member_number, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        ((1000 + i, 1000 + i, f"Cliente {i}", str(40000000 + i), f"S{i:07d}", stamp) for i in range(n_customers)),
+    )
+
+    def rows():
+        for i in range(n_customers):
+            for _ in range(rnd.randint(1, 2 * per_customer - 1)):
+                liters = round(rnd.uniform(5, 60), 2)
+                when = now - timedelta(days=rnd.randint(0, 365), seconds=rnd.randint(0, 86399))
+                yield (1000 + i, "earn", int(liters), liters, liters * 1200, "NAFTA_SUPER", when.isoformat(sep=" "))
+
+    con.executemany(
+        "INSERT INTO transactions (customer_id, kind, points, liters, amount_pesos, product_code, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)", rows(),
+    )
+    con.commit()
+    n = con.execute("SELECT count(*) FROM transactions").fetchone()[0]
+    con.close()
+    return n
+
+
+def main(n_customers: int, per_customer: int) -> None:
+    tmp = tempfile.mkdtemp()
+    db_path = os.path.join(tmp, "bench.db")
+    t = time.perf_counter()
+    n_tx = _seed(db_path, n_customers, per_customer)
+    print(f"seed: {n_customers} clientes, {n_tx} transacciones en {time.perf_counter() - t:.1f} s")
+
+    os.environ["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
+    from app import create_app
+    import segments
+
+    app = create_app()
+    modes = [("numpy", segments.np)] if segments.np is not None else []
+    if n_customers <= 200000 or segments.np is None:
+        modes.append(("python", None))
+
+    for label, np_mod in modes:
+        segments.np = np_mod
+        with app.app_context():
+            t = time.perf_counter()
+            stats = segments.rebuild()
+            total = time.perf_counter() - t
+        print(f"{label:<8} total {total:6.1f} s  {stats['seconds']}  clientes={stats['customers']}")
+    print("   " + "  ".join(f"{k}={v}" for k, v in stats["segments"].items()))
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    main(n, k)
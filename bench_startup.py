@@ -0,0 +1,120 @@
+# C:\Abetos_app\backend\bench_startup.py
+"""
+Benchmark de arranque y memoria por worker (Linux).
+
+    python bench_startup.py [workers]
+
+1) Tiempo de `import app` (create_app) en un proceso nuevo, con y sin DDL
+   (AUTO_CREATE_DB=true vs false).
+2) Memoria privada (USS) y compartida de N hijos forkeados desde un master
+   con la app precargada, con y sin prefork.warmup() (gc.freeze + caches).
+   Cada hijo atiende algunos requests antes de medir.
+"""
+import os
+import sys
+import json
+import subprocess
+
+
+def _startup_time(auto_create: str, runs: int = 5) -> float:
+    code = (
+        "import time; t=time.perf_counter(); import app; "
+        "print(time.perf_counter()-t)"
+    )
+    env = dict(os.environ, AUTO_CREATE_DB=auto_create)
+    best = None
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True)
+        if out.returncode != 0:
+            raise SystemExit(out.stderr)
+        dt = float(out.stdout.strip().splitlines()[-1])
+        best = dt if best is None else min(best, dt)
+    return best
+
+
+def _smaps() -> dict:
+    out = {}
+    with open("/proc/self/smaps_rollup") as fh:
+        for line in fh:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                out[parts[0][:-1]] = int(parts[1])
+    return {
+        "uss_kb": out.get("Private_Clean", 0) + out.get("Private_Dirty", 0),
+        "shared_kb": out.get("Shared_Clean", 0) + out.get("Shared_Dirty", 0),
+        "rss_kb": out.get("Rss", 0),
+    }
+
+
+def _fork_workers(app, n: int) -> list:
+    results = []
+    for _ in range(n):
+        r, w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(r)
+            import prefork
+            prefork.post_fork(app)
+            cl = app.test_client()
+            for _ in range(20):
+                cl.get("/health")
+                cl.get("/api/rewards")
+            os.write(w, json.dumps(_smaps()).encode())
+            os._exit(0)
+        os.close(w)
+        data = b""
+        while True:
+            chunk = os.read(r, 4096)
+            if not chunk:
+                break
+            data += chunk
+        os.close(r)
+        os.waitpid(pid, 0)
+        results.append(json.loads(data))
+    return results
+
+
+def _rss_mode(warm: bool, n: int) -> dict:
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(r)
+        from app import app
+        if warm:
+            import prefork
+            prefork.warmup(app)
+        res = _fork_workers(app, n)
+        os.write(w, json.dumps(res).encode())
+        os._exit(0)
+    os.close(w)
+    data = b""
+    while True:
+        chunk = os.read(r, 65536)
+        if not chunk:
+            break
+        data += chunk
+    os.close(r)
+    os.waitpid(pid, 0)
+    res = json.loads(data)
+    return {
+        "uss_kb": sum(x["uss_kb"] for x in res) // len(res),
+        "shared_kb": sum(x["shared_kb"] for x in res) // len(res),
+        "rss_kb": sum(x["rss_kb"] for x in res) // len(res),
+    }
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+
+    with_ddl = _startup_time("true")
+    without_ddl = _startup_time("false")
+    print("Arranque (import app, mejor de 5):")
+    print(f"   AUTO_CREATE_DB=true : {with_ddl * 1000:8.1f} ms")
+    print(f"   AUTO_CREATE_DB=false: {without_ddl * 1000:8.1f} ms")
+
+    os.environ["AUTO_CREATE_DB"] = "false"
+    cold = _rss_mode(False, n)
+    warm = _rss_mode(True, n)
+    print(f"Memoria por worker (promedio de {n}, KB):")
+    print(f"   sin warmup: USS {cold['uss_kb']:>8}  compartida {cold['shared_kb']:>8}  RSS {cold['rss_kb']:>8}")
+    print(f"   con warmup: USS {warm['uss_kb']:>8}  compartida {warm['shared_kb']:>8}  RSS {warm['rss_kb']:>8}")
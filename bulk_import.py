@@ -0,0 +1,333 @@
+# C:\Abetos_app\backend\bulk_import.py
+"""
+Importación masiva de socios desde el sistema de fidelización anterior (CSV).
+
+    python bulk_import.py socios.csv [--rejects rechazos.csv] [--links links.csv]
+                                     [--batch 5000] [--station ID] [--dry-run]
+
+Columnas (con encabezado, en cualquier orden; se aceptan alias):
+    doc_number | dni, full_name | nombre, email, phone | telefono,
+    member_number | socio, points | saldo (saldo inicial), created_at | alta
+
+- DNI normalizado igual que normalize_doc (solo dígitos).
+- Duplicados (DNI, email, n° de socio) se detectan en memoria contra un índice
+  precargado de la DB y contra lo ya leído del archivo: nada de consultas por fila.
+- users / customers / transactions (saldo inicial) se escriben por lotes:
+  COPY en Postgres (ids reservados de la secuencia), executemany con RETURNING en el resto.
+- Los usuarios quedan sin contraseña (User.UNUSABLE_PASSWORD): el login les
+  responde invalid_credentials como a cualquiera; entran por el link de
+  /api/auth/password/setup (--links genera uno por socio, o el admin con
+  POST /api/admin/customers/<id>/password-setup-link).
+- Lo que no entra va al archivo de rechazos con el número de línea y el motivo.
+
+El saldo inicial se inserta por Core: no dispara leaderboard/outbox/sketches
+(no es un despacho real). Va marcado con product_code Transaction.OPENING_CODE
+para que los recálculos desde el ledger tampoco lo cuenten (dispatch_clause).
+"""
+import io
+import re
+import math
+import csv
+import sys
+import argparse
+from datetime import datetime
+from typing import Iterator, Optional
+
+from sqlalchemy import insert, select, text
+
+from db import db
+from models import User, Customer, Transaction
+from api import normalize_doc
+
+
+BATCH_SIZE = 5000
+MAX_POINTS = 2 ** 31 - 1  # transactions.points es INTEGER
+OPENING_NOTE = "Saldo inicial (migración)"
+
+_ALIASES = {
+    "dni": "doc_number", "documento": "doc_number",
+    "nombre": "full_name", "name": "full_name",
+    "telefono": "phone", "tel": "phone",
+    "socio": "member_number", "nro_socio": "member_number",
+    "saldo": "points", "puntos": "points", "balance": "points",
+    "alta": "created_at",
+}
+_EMAIL = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+REJECT_FIELDS = ["line", "reason", "doc_number", "full_name", "email", "phone", "member_number", "points"]
+
+
+class ImportIndex:
+    """DNIs, emails y números de socio ya tomados (DB + archivo)."""
+
+    def __init__(self):
+        self.docs = set()
+        self.emails = set()
+        self.members = set()
+
+    @classmethod
+    def load(cls, session) -> "ImportIndex":
+        idx = cls()
+        for doc, member in session.execute(select(Customer.doc_number, Customer.member_number)):
+            idx.docs.add(doc)
+            if member:
+                idx.members.add(member)
+        for (email,) in session.execute(select(User.email).where(User.email.isnot(None))):
+            idx.emails.add(email.lower())
+        return idx
+
+
+def read_rows(fh) -> Iterator[tuple]:
+    """(n° de línea, dict con claves normalizadas)."""
+    reader = csv.DictReader(fh)
+    for raw in reader:
+        row = {}
+        for k, v in raw.items():
+            if k is None:
+                continue
+            key = k.strip().lower()
+            row[_ALIASES.get(key, key)] = (v or "").strip()
+        yield reader.line_num, row
+
+
+def validate(row: dict, idx: ImportIndex, now: datetime):
+    """Devuelve (registro limpio, None) o (None, motivo). Reserva las claves en el índice."""
+    doc = normalize_doc(row.get("doc_number"))
+    full_name = row.get("full_name") or ""
+    email = (row.get("email") or "").lower() or None
+    member = row.get("member_number") or None
+
+    if not doc or len(doc) > 20:
+        return None, "invalid_doc_number"
+    if not full_name:
+        return None, "missing_full_name"
+    if email and not _EMAIL.match(email):
+        return None, "invalid_email"
+    if doc in idx.docs:
+        return None, "duplicate_doc_number"
+    if email and email in idx.emails:
+        return None, "duplicate_email"
+    if member and member in idx.members:
+        return None, "duplicate_member_number"
+
+    try:
+        points = float(row.get("points") or 0)
+    except (ValueError, OverflowError):
+        return None, "invalid_points"
+    if not math.isfinite(points) or points > MAX_POINTS:
+        return None, "invalid_points"
+    if points < 0:
+        return None, "negative_points"
+    points = int(points)
+
+    created_at = now
+    if row.get("created_at"):
+        try:
+            created_at = datetime.fromisoformat(row["created_at"])
+        except ValueError:
+            return None, "invalid_created_at"
+
+    if not member:
+        # mismo formato que /auth/register; si choca queda NULL y se asigna al primer /me
+        cand = f"A{doc[-6:].zfill(6)}"
+        member = cand if cand not in idx.members else None
+
+    idx.docs.add(doc)
+    if email:
+        idx.emails.add(email)
+    if member:
+        idx.members.add(member)
+
+    return {
+        "doc_number": doc,
+        "full_name": full_name[:120],
+        "email": email,
+        "phone": (row.get("phone") or None),
+        "member_number": member,
+        "points": points,
+        "created_at": created_at,
+    }, None
+
+
+# ------------------------------------------------------
+# Escritura por lotes
+# ------------------------------------------------------
+def _alloc_ids(conn, table: str, n: int) -> list:
+    """Postgres: reserva n ids de la secuencia del serial."""
+    return [r[0] for r in conn.execute(
+        text("SELECT nextval(pg_get_serial_sequence(:t, 'id')) FROM generate_series(1, :n)"),
+        {"t": table, "n": n},
+    )]
+
+
+def _copy(conn, table: str, columns: list, rows: list) -> None:
+    """COPY ... FROM STDIN con psycopg 3, dentro de la transacción de `conn`."""
+    raw = conn.connection.dbapi_connection
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+    with raw.cursor() as cur:
+        with cur.copy(sql) as cp:
+            for r in rows:
+                cp.write_row([r[c] for c in columns])
+
+
+def _write_batch(main_conn, ledger_conn, batch: list, station_id: str) -> list:
+    """Inserta el lote y devuelve los user_id en el mismo orden."""
+    pg = main_conn.dialect.name == "postgresql"
+    now = datetime.utcnow()
+
+    users = [{
+        "email": r["email"], "full_name": r["full_name"], "password_hash": User.UNUSABLE_PASSWORD,
+        "role": User.ROLE_CUSTOMER, "is_verified": False, "created_at": r["created_at"],
+    } for r in batch]
+
+    if pg:
+        for u, uid in zip(users, _alloc_ids(main_conn, "users", len(users))):
+            u["id"] = uid
+        _copy(main_conn, "users", ["id", "email", "full_name", "password_hash", "role",
+                                   "is_verified", "created_at"], users)
+        user_ids = [u["id"] for u in users]
+    else:
+        user_ids = list(main_conn.execute(
+            insert(User.__table__).returning(User.__table__.c.id, sort_by_parameter_order=True), users
+        ).scalars())
+
+    customers = [{
+        "user_id": uid, "full_name": r["full_name"], "doc_number": r["doc_number"],
+        "phone": r["phone"], "member_number": r["member_number"], "created_at": r["created_at"],
+    } for r, uid in zip(batch, user_ids)]
+
+    if pg:
+        for c, cid in zip(customers, _alloc_ids(main_conn, "customers", len(customers))):
+            c["id"] = cid
+        _copy(main_conn, "customers", ["id", "user_id", "full_name", "doc_number", "phone",
+                                       "member_number", "created_at"], customers)
+        customer_ids = [c["id"] for c in customers]
+    else:
+        customer_ids = list(main_conn.execute(
+            insert(Customer.__table__).returning(Customer.__table__.c.id, sort_by_parameter_order=True),
+            customers,
+        ).scalars())
+
+    opening = [{
+        "customer_id": cid, "kind": Transaction.KIND_EARN, "points": r["points"],
+        "product_code": Transaction.OPENING_CODE, "note": OPENING_NOTE, "paid_with_app": False, "station_id": station_id, "created_at": now,
+    } for r, cid in zip(batch, customer_ids) if r["points"] > 0]
+
+    if opening:
+        if ledger_conn.dialect.name == "postgresql":
+            _copy(ledger_conn, "transactions", ["customer_id", "kind", "points", "product_code", "note",
+                                                "paid_with_app", "station_id", "created_at"], opening)
+        else:
+            ledger_conn.execute(insert(Transaction.__table__), opening)
+
+    return user_ids
+
+
+def import_csv(fh, rejects=None, links=None, batch_size: int = BATCH_SIZE,
+               station_id: Optional[str] = None, dry_run: bool = False, max_rejects_kept: int = 0) -> dict:
+    """
+    Corre la importación dentro de un app context.
+    rejects / links: archivos de texto abiertos (o None).
+    Devuelve estadísticas (+ los primeros `max_rejects_kept` rechazos).
+    """
+    from sharding import router
+    import email_utils
+
+    station_id = router.normalize(station_id)
+    main_sess = db.session
+    ledger_sess = router.session_for(station_id)
+    same_db = ledger_sess is main_sess
+
+    idx = ImportIndex.load(main_sess)
+    main_sess.rollback()  # no retener la transacción de lectura
+
+    rej_writer = csv.DictWriter(rejects, fieldnames=REJECT_FIELDS, extrasaction="ignore") if rejects else None
+    if rej_writer:
+        rej_writer.writeheader()
+    link_writer = csv.writer(links) if links else None
+    if link_writer:
+        link_writer.writerow(["doc_number", "email", "link"])
+
+    stats = {"read": 0, "imported": 0, "rejected": 0, "opening_points": 0, "batches": 0,
+             "dry_run": dry_run, "station_id": station_id, "rejects": []}
+    now = datetime.utcnow()
+    batch = []
+
+    def flush():
+        if not batch:
+            return
+        if not dry_run:
+            try:
+                user_ids = _write_batch(main_sess.connection(), ledger_sess.connection(), batch, station_id)
+                main_sess.commit()
+                if not same_db:
+                    ledger_sess.commit()
+            except Exception:
+                main_sess.rollback()
+                if not same_db:
+                    ledger_sess.rollback()
+                raise
+            if link_writer:
+                for r, uid in zip(batch, user_ids):
+                    link_writer.writerow([
+                        r["doc_number"], r["email"] or "",
+                        email_utils.generate_password_setup_link(uid, User.UNUSABLE_PASSWORD),
+                    ])
+        stats["imported"] += len(batch)
+        stats["opening_points"] += sum(r["points"] for r in batch)
+        stats["batches"] += 1
+        batch.clear()
+
+    for line, row in read_rows(fh):
+        stats["read"] += 1
+        rec, reason = validate(row, idx, now)
+        if rec is None:
+            stats["rejected"] += 1
+            if rej_writer:
+                rej_writer.writerow({"line": line, "reason": reason, **row})
+            if len(stats["rejects"]) < max_rejects_kept:
+                stats["rejects"].append({"line": line, "reason": reason, "doc_number": row.get("doc_number")})
+            continue
+        batch.append(rec)
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+
+    return stats
+
+
+def import_text(content: str, **kwargs) -> dict:
+    """Variante en memoria (para el endpoint admin con archivos chicos)."""
+    return import_csv(io.StringIO(content), **kwargs)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Importación masiva de socios (CSV)")
+    ap.add_argument("csv_path")
+    ap.add_argument("--rejects", default=None, help="CSV de rechazos (default: <csv>.rejects.csv)")
+    ap.add_argument("--links", default=None, help="CSV con links de alta de contraseña")
+    ap.add_argument("--batch", type=int, default=BATCH_SIZE)
+    ap.add_argument("--station", default=None, help="estación del saldo inicial (shard)")
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args()
+
+    from app import create_app
+
+    app = create_app()
+    rejects_path = args.rejects or args.csv_path + ".rejects.csv"
+    t0 = datetime.utcnow()
+    with app.app_context(), \
+            open(args.csv_path, newline="", encoding="utf-8-sig") as fh, \
+            open(rejects_path, "w", newline="", encoding="utf-8") as rej:
+        links = open(args.links, "w", newline="", encoding="utf-8") if args.links else None
+        try:
+            st = import_csv(fh, rej, links, args.batch, args.station, args.dry_run)
+        finally:
+            if links:
+                links.close()
+
+    secs = (datetime.utcnow() - t0).total_seconds()
+    print(f"{'(dry-run) ' if st['dry_run'] else ''}leídos {st['read']}, importados {st['imported']}, "
+          f"rechazados {st['rejected']} -> {rejects_path}")
+    print(f"saldo inicial: {st['opening_points']} pts en {st['station_id']}; "
+          f"{st['batches']} lotes, {secs:.1f}s ({st['imported'] / max(secs, 1e-9):.0f} filas/s)")
+    sys.exit(0)
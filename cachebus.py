@@ -0,0 +1,289 @@
+# C:\Abetos_app\backend\cachebus.py
+"""
+Invalidación de caches en memoria entre workers (y hosts).
+
+- Tabla cache_versions (key -> version creciente) en la DB principal, con
+  una fila por clave sembrada por la migración 010. Un flush del ORM que toca
+  EarningRule / Reward / ProductPrice suma 1 a la versión de su clave ("rules",
+  "rewards", "prices") en la MISMA transacción: si hay rollback, no se
+  invalida nada. Customer solo cuenta si cambia una columna que algún cache
+  guarda (CUSTOMER_COLUMNS) o se borra: las altas y la edición de datos de
+  contacto no tocan la fila "customers" (sería un punto caliente que
+  serializa los registros y vacía los caches de todos los workers).
+- touch() es un upsert (INSERT ... ON CONFLICT en sqlite / Postgres): dos
+  transacciones que tocan una clave nueva a la vez no chocan.
+- UPDATEs por Core sobre esas tablas llaman touch(conn, key) o
+  mark(session, key) a mano (como outbox.emit).
+- Cada worker tiene un hilo vigía que actualiza las versiones en memoria:
+  * stamp file (mismo host, como revocation.py): touch() lo toca; los demás
+    lo ven en <= CACHE_BUS_POLL_SEC y releen la tabla en cada vuelta durante
+    GRACE_SEC (el commit llega después del touch);
+  * relectura completa cada CACHE_BUS_SYNC_SEC (otros hosts contra la misma DB);
+  * Postgres + CACHE_BUS_LISTEN=on: LISTEN/NOTIFY (NOTIFY va en la transacción
+    del cambio; llega al commit).
+  El worker que commitea ve su propio cambio en el acto (after_commit).
+- Los caches se suscriben a una clave (subscribe) y se vacían desde el hilo
+  vigía; o comparan version(key) (una lectura de dict, sin consulta).
+
+Variables:
+    CACHE_BUS_POLL_SEC    default 0.2
+    CACHE_BUS_SYNC_SEC    default 5 (0 = solo stamp / NOTIFY)
+    CACHE_BUS_STAMP_FILE  default <tmp>/abetos_cache_bus.stamp ("" = sin stamp)
+    CACHE_BUS_LISTEN      on | off (default off; solo Postgres)
+"""
+import os
+import time
+import logging
+import tempfile
+import threading
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy import event, select, update, insert, inspect, text
+from sqlalchemy.orm import Session
+
+from db import db
+from models import CacheVersion, EarningRule, Reward, Customer, ProductPrice
+
+
+log = logging.getLogger("cachebus")
+
+RULES, REWARDS, CUSTOMERS, PRICES = "rules", "rewards", "customers", "prices"
+
+KEYS = (RULES, REWARDS, CUSTOMERS, PRICES)
+
+# columnas de customers que guardan los caches (forecourt.CustomerCache)
+CUSTOMER_COLUMNS = ("doc_number", "member_number", "tier")
+
+# modelo -> (clave que invalida, columnas que importan o None = cualquier cambio, incluso altas)
+WATCHED = {
+    EarningRule: (RULES, None),
+    Reward: (REWARDS, None),
+    Customer: (CUSTOMERS, CUSTOMER_COLUMNS),
+    ProductPrice: (PRICES, None),
+}
+
+CHANNEL = "abetos_cache"
+GRACE_SEC = 2.0
+_PENDING = "cachebus_pending"
+
+
+class CacheBus:
+    def __init__(self):
+        self.poll_sec = float(os.getenv("CACHE_BUS_POLL_SEC", "0.2"))
+        self.sync_sec = float(os.getenv("CACHE_BUS_SYNC_SEC", "5"))
+        self.stamp_path = os.getenv("CACHE_BUS_STAMP_FILE",
+                                    os.path.join(tempfile.gettempdir(), "abetos_cache_bus.stamp"))
+        self.listen = os.getenv("CACHE_BUS_LISTEN", "off").strip().lower() in ("on", "1", "true")
+
+        self._versions = {}       # key -> versión vista por este proceso
+        self._subscribers = {}    # key -> [fn(key)]
+        self._app = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    # ---------- API de los caches ----------
+    def version(self, key: str) -> int:
+        """Versión vigente de la clave (lectura de dict; arranca el vigía si hace falta)."""
+        if self._thread is None:
+            self._start()
+        return self._versions.get(key, 0)
+
+    def subscribe(self, key: str, fn: Callable[[str], None]) -> None:
+        """fn(key) se llama (desde el vigía o tras el commit local) cuando cambia la clave."""
+        subs = self._subscribers.setdefault(key, [])
+        if fn not in subs:
+            subs.append(fn)
+        if self._thread is None:
+            self._start()
+
+    # ---------- escritura (en la transacción del cambio) ----------
+    def touch(self, conn, key: str) -> None:
+        """Sube la versión de `key` en la transacción de `conn` (Connection de la DB principal)."""
+        t = CacheVersion.__table__
+        now = datetime.utcnow()
+        stmt = _upsert_stmt(conn)
+        if stmt is not None:
+            conn.execute(stmt, {"key": key, "version": 1, "updated_at": now})
+        elif not conn.execute(update(t).where(t.c.key == key)
+                              .values(version=t.c.version + 1, updated_at=now)).rowcount:
+            conn.execute(insert(t).values(key=key, version=1, updated_at=now))
+        if self.listen and conn.dialect.name == "postgresql":
+            conn.execute(text("SELECT pg_notify(:ch, :key)"), {"ch": CHANNEL, "key": key})
+        # aviso temprano: los vigías releen durante GRACE_SEC (cubre el commit que viene)
+        self._touch_stamp()
+
+    # ---------- lectura ----------
+    def _apply(self, versions: dict) -> None:
+        changed = [k for k, v in versions.items() if v != self._versions.get(k, 0)]
+        if not changed:
+            return
+        with self._lock:
+            self._versions = {**self._versions, **versions}  # reemplazo atómico para los lectores
+        for key in changed:
+            for fn in self._subscribers.get(key, ()):
+                try:
+                    fn(key)
+                except Exception:
+                    log.exception("cachebus: falló la invalidación de %s", key)
+
+    def _read_all(self, engine) -> dict:
+        t = CacheVersion.__table__
+        with engine.connect() as conn:
+            return {k: v for k, v in conn.execute(select(t.c.key, t.c.version))}
+
+    def _read_stamp(self):
+        if not self.stamp_path:
+            return None
+        try:
+            return os.stat(self.stamp_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _touch_stamp(self) -> None:
+        if not self.stamp_path:
+            return
+        try:
+            with open(self.stamp_path, "a"):
+                pass
+            now_ns = time.time_ns()
+            os.utime(self.stamp_path, ns=(now_ns, now_ns))
+        except OSError:
+            pass
+
+    # ---------- hilo vigía ----------
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is not None or self._app is None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, name="cachebus", daemon=True)
+            self._thread.start()
+
+    def _watch(self) -> None:
+        with self._app.app_context():
+            engine = db.engine
+        if self.listen and engine.dialect.name == "postgresql":
+            try:
+                self._watch_notify(engine)
+                return
+            except Exception:
+                log.exception("cachebus: LISTEN no disponible, se sigue por polling")
+        self._watch_poll(engine)
+
+    def _watch_poll(self, engine) -> None:
+        stamp, synced, hot_until = self._read_stamp(), 0.0, 0.0
+        while not self._stop.wait(self.poll_sec if synced else 0):
+            now_stamp = self._read_stamp()
+            mono = time.monotonic()
+            if now_stamp != stamp:
+                hot_until = mono + GRACE_SEC  # el stamp se toca antes del commit: releer un rato
+            if not synced or mono < hot_until or (self.sync_sec > 0 and mono - synced >= self.sync_sec):
+                try:
+                    self._apply(self._read_all(engine))
+                    stamp, synced = now_stamp, mono
+                except Exception:
+                    log.exception("cachebus: no se pudo leer cache_versions")
+
+    def _watch_notify(self, engine) -> None:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text(f"LISTEN {CHANNEL}"))
+            raw = conn.connection.dbapi_connection
+            self._apply(self._read_all(engine))
+            synced = time.monotonic()
+            while not self._stop.is_set():
+                got = list(raw.notifies(timeout=self.poll_sec, stop_after=64))
+                mono = time.monotonic()
+                if got or (self.sync_sec > 0 and mono - synced >= self.sync_sec):
+                    self._apply(self._read_all(engine))
+                    synced = mono
+
+    def _after_fork(self) -> None:
+        # el hilo no sobrevive al fork (gunicorn --preload): cada hijo arranca el suyo
+        self._thread = None
+        self._lock = threading.Lock()
+
+    # ---------- listeners ORM ----------
+    def _on_after_flush(self, session, _ctx) -> None:
+        keys = set()
+        for obj in session.new:
+            key, columns = WATCHED.get(type(obj), (None, None))
+            if key and columns is None:
+                keys.add(key)
+        for obj in session.deleted:
+            key, _columns = WATCHED.get(type(obj), (None, None))
+            if key:
+                keys.add(key)
+        for obj in session.dirty:
+            key, columns = WATCHED.get(type(obj), (None, None))
+            if not key or key in keys:
+                continue
+            if columns is None:
+                if session.is_modified(obj, include_collections=False):
+                    keys.add(key)
+            elif any(inspect(obj).attrs[c].history.has_changes() for c in columns):
+                keys.add(key)
+        if not keys:
+            return
+        mark(session, *keys)
+
+    def _on_after_commit(self, session) -> None:
+        keys = session.info.pop(_PENDING, None)
+        if not keys:
+            return
+        self._touch_stamp()
+        try:
+            # el propio worker no espera al vigía (lee lo que acaba de commitear)
+            self._apply(self._read_all(db.engine))
+        except Exception:
+            log.exception("cachebus: no se pudo releer cache_versions")
+
+    def _on_after_rollback(self, session) -> None:
+        session.info.pop(_PENDING, None)
+
+    def init_app(self, app) -> None:
+        self._app = app
+        for target, name, fn in (
+            (Session, "after_flush", self._on_after_flush),
+            (Session, "after_commit", self._on_after_commit),
+            (Session, "after_rollback", self._on_after_rollback),
+        ):
+            if not event.contains(target, name, fn):
+                event.listen(target, name, fn)
+
+
+def _upsert_stmt(conn):
+    """INSERT ... ON CONFLICT que suma 1 a la versión (sqlite / postgres) o None."""
+    dialect = conn.dialect.name
+    if dialect not in ("sqlite", "postgresql"):
+        return None
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as d_insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert as d_insert
+
+    t = CacheVersion.__table__
+    stmt = d_insert(t)
+    return stmt.on_conflict_do_update(
+        index_elements=[t.c.key],
+        set_={"version": t.c.version + 1, "updated_at": stmt.excluded.updated_at},
+    )
+
+
+# Instancia única por proceso
+bus = CacheBus()
+os.register_at_fork(after_in_child=bus._after_fork)
+
+
+def touch(conn, key: str) -> None:
+    """Para UPDATEs por Core sobre una Connection (misma transacción que el cambio)."""
+    bus.touch(conn, key)
+
+
+def mark(session, *keys: str) -> None:
+    """Para cambios dentro de una Session: una vez por clave y transacción; al commit, aviso inmediato."""
+    pending = session.info.setdefault(_PENDING, set())
+    for key in sorted(set(keys) - pending):
+        bus.touch(session.connection(bind_arguments={"mapper": CacheVersion}), key)
+        pending.add(key)
@@ -0,0 +1,234 @@
+# C:\Abetos_app\backend\capture.py
+"""
+Captura de tráfico real (opt-in) para re-ejecutarlo con replay.py.
+
+Cada request (salvo /health, SSE y OPTIONS) deja una línea JSON con: instante,
+método, ruta real y regla de Flask, query, body JSON, status, duración y el
+actor (usuario del JWT) con su rol. Nada sensible queda en claro:
+
+- JWT: no se guarda; el actor es un token HMAC del user id ("u:<hex>").
+- contraseñas / tokens / códigos: "***".
+- DNI y emails: tokens HMAC deterministas ("dni:<hex>", "e:<hex>"): el mismo
+  DNI da el mismo token en toda la captura (replay los mapea a datos de staging).
+- q= de búsquedas: token (puede traer nombres o DNIs).
+
+Archivos: CAPTURE_DIR/capture-<YYYYmmdd-HHMMSS>-<pid>.ndjson.gz, uno por
+worker (sin locks entre procesos), rotando al superar CAPTURE_MAX_MB de JSON
+o al cambiar el día. gzip con flush de sincronización cada CAPTURE_FLUSH_SEC:
+si el proceso muere se pierde a lo sumo ese intervalo.
+
+Variables:
+    CAPTURE              on | off (default off)
+    CAPTURE_DIR          default instance/capture
+    CAPTURE_SAMPLE       fracción de requests (default 1.0)
+    CAPTURE_MAX_MB       default 64
+    CAPTURE_MAX_BODY     bytes de body a guardar (default 8192; más grande: solo tamaño)
+    CAPTURE_FLUSH_SEC    default 1
+    CAPTURE_KEY          clave HMAC de los tokens (default: derivada de SECRET_KEY)
+"""
+import os
+import gzip
+import json
+import hmac
+import time
+import zlib
+import random
+import hashlib
+import threading
+from datetime import datetime
+from typing import Optional
+
+
+EXEMPT_PATHS = ("/health", "/api/health", "/api/me/stream")
+
+SECRET_KEYS = {"password", "new_password", "current_password", "token", "access_token",
+               "refresh_token", "code", "secret"}
+DNI_KEYS = {"doc_number", "doc", "dni"}
+EMAIL_KEYS = {"email"}
+OPAQUE_KEYS = {"q", "full_name", "phone", "member_number", "ticket_number", "note"}
+
+
+def _key() -> bytes:
+    raw = os.getenv("CAPTURE_KEY")
+    if raw:
+        return raw.encode("utf-8")
+    from email_utils import SECRET
+    return hmac.new(SECRET.encode("utf-8"), b"capture-key", hashlib.sha256).digest()
+
+
+class Tokenizer:
+    """Tokens HMAC cortos y deterministas (mismo valor -> mismo token)."""
+
+    def __init__(self, key: bytes):
+        self._key = key
+
+    def token(self, kind: str, value) -> Optional[str]:
+        if value is None or value == "":
+            return value
+        v = str(value).strip().lower()
+        if kind == "dni":
+            v = "".join(ch for ch in v if ch.isdigit())
+        digest = hmac.new(self._key, f"{kind}:{v}".encode("utf-8"), hashlib.sha256).hexdigest()[:16]
+        return f"{kind}:{digest}"
+
+    def scrub(self, obj):
+        """Copia de un body/query JSON con lo sensible tokenizado."""
+        if isinstance(obj, dict):
+            out = {}
+            for k, v in obj.items():
+                lk = str(k).lower()
+                if lk in SECRET_KEYS:
+                    out[k] = "***"
+                elif lk in DNI_KEYS:
+                    out[k] = self.token("dni", v)
+                elif lk in EMAIL_KEYS:
+                    out[k] = self.token("e", v)
+                elif lk in OPAQUE_KEYS and isinstance(v, str):
+                    out[k] = self.token("x", v)
+                else:
+                    out[k] = self.scrub(v)
+            return out
+        if isinstance(obj, list):
+            return [self.scrub(v) for v in obj]
+        return obj
+
+
+class _Writer:
+    """Un archivo gzip por proceso; se reabre después de un fork."""
+
+    def __init__(self, directory: str, max_bytes: int, flush_sec: float):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.flush_sec = flush_sec
+        self._pid = None
+        self._fh = None
+        self._day = None
+        self._written = 0
+        self._flushed_at = 0.0
+        self._lock = threading.Lock()
+
+    def _open(self, now: datetime) -> None:
+        if self._fh is not None:
+            self._fh.close()
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"capture-{now:%Y%m%d-%H%M%S}-{os.getpid()}.ndjson.gz"
+        self._fh = gzip.open(os.path.join(self.directory, name), "ab", compresslevel=6)
+        self._pid, self._day, self._written = os.getpid(), now.date(), 0
+
+    def write(self, record: dict) -> None:
+        line = (json.dumps(record, separators=(",", ":"), ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        now = datetime.utcnow()
+        with self._lock:
+            if (self._pid != os.getpid() or self._day != now.date()
+                    or self._written + len(line) > self.max_bytes):
+                if self._pid != os.getpid():
+                    self._fh = None  # el del padre no se cierra desde el hijo
+                self._open(now)
+            self._fh.write(line)
+            self._written += len(line)
+            mono = time.monotonic()
+            if mono - self._flushed_at >= self.flush_sec:
+                self._fh.flush(zlib.Z_SYNC_FLUSH)
+                self._flushed_at = mono
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fh is not None and self._pid == os.getpid():
+                self._fh.close()
+            self._fh = None
+
+
+def _actor(req, tok: Tokenizer):
+    """(token del usuario, rol) desde el JWT, sin guardarlo."""
+    auth = req.headers.get("Authorization") or ""
+    if not auth.startswith("Bearer "):
+        return None, None
+    try:
+        from flask_jwt_extended import decode_token
+        claims = decode_token(auth[7:].strip())
+    except Exception:
+        return "invalid", None
+    return tok.token("u", claims.get("sub")), (claims.get("role") or "").lower() or None
+
+
+def init_app(app) -> None:
+    if os.getenv("CAPTURE", "off").strip().lower() not in ("on", "1", "true"):
+        return
+
+    from flask import request, g
+
+    sample = float(os.getenv("CAPTURE_SAMPLE", "1.0"))
+    max_body = int(os.getenv("CAPTURE_MAX_BODY", "8192"))
+    writer = _Writer(
+        os.getenv("CAPTURE_DIR", os.path.join(app.instance_path, "capture")),
+        int(float(os.getenv("CAPTURE_MAX_MB", "64")) * 1024 * 1024),
+        float(os.getenv("CAPTURE_FLUSH_SEC", "1")),
+    )
+    tok = Tokenizer(_key())
+    app.extensions["capture"] = writer
+
+    @app.before_request
+    def _capture_start():
+        if request.method == "OPTIONS" or request.path in EXEMPT_PATHS:
+            return
+        if sample < 1.0 and random.random() >= sample:
+            return
+        g.capture = (time.time(), time.perf_counter())
+
+    @app.after_request
+    def _capture_record(response):
+        started = g.pop("capture", None)
+        if started is None:
+            return response
+        try:
+            record = _build_record(request, response, started, tok, max_body)
+            writer.write(record)
+        except Exception:
+            app.logger.exception("capture: no se pudo registrar el request")
+        return response
+
+
+def _build_record(req, response, started, tok: Tokenizer, max_body: int) -> dict:
+    ts, perf = started
+    actor, role = _actor(req, tok)
+
+    body, body_bytes = None, req.content_length or 0
+    if req.is_json and body_bytes <= max_body:
+        body = tok.scrub(req.get_json(silent=True))
+
+    # login: el actor sale del token emitido (así replay sabe con quién entrar)
+    # (capture corre después de compression: un body comprimido se deja pasar)
+    if (req.endpoint == "api.auth_login" and response.status_code == 200 and not response.is_streamed
+            and not response.headers.get("Content-Encoding")):
+        try:
+            from flask_jwt_extended import decode_token
+            claims = decode_token((response.get_json(silent=True) or {}).get("access_token") or "")
+            actor, role = tok.token("u", claims.get("sub")), (claims.get("role") or "").lower() or None
+        except Exception:
+            pass
+
+    return {
+        "ts": round(ts, 6),
+        "m": req.method,
+        "path": _scrub_path(req, tok),
+        "rule": req.url_rule.rule if req.url_rule is not None else None,
+        "query": tok.scrub(req.args.to_dict(flat=True)) or None,
+        "body": body,
+        "body_bytes": body_bytes,
+        "actor": actor,
+        "role": role,
+        "status": response.status_code,
+        "ms": round((time.perf_counter() - perf) * 1000, 3),
+    }
+
+
+def _scrub_path(req, tok: Tokenizer) -> str:
+    """Ruta real sin query; los parámetros de ruta que sean DNI/email se tokenizan."""
+    path = req.path
+    for name, value in (req.view_args or {}).items():
+        lk = name.lower()
+        if lk in DNI_KEYS:
+            path = path.replace(str(value), tok.token("dni", value))
+        elif lk in EMAIL_KEYS:
+            path = path.replace(str(value), tok.token("e", value))
+    return path
@@ -0,0 +1,88 @@
+# C:\Abetos_app\backend\compression.py
+"""
+Compresión negociada de respuestas (gzip / brotli) en after_request.
+
+- Solo respuestas 200 no-streaming (SSE y exports quedan afuera), de tipo
+  JSON/texto, sin Content-Encoding previo y de al menos COMPRESS_MIN_BYTES.
+- brotli si el cliente lo acepta y el paquete `brotli` está instalado
+  (opcional, requirements-extras.txt); si no, gzip.
+- Agrega Vary: Accept-Encoding.
+
+Variables: COMPRESS (on/off), COMPRESS_MIN_BYTES (default 1024),
+COMPRESS_GZIP_LEVEL (default 6), COMPRESS_BROTLI_QUALITY (default 5).
+"""
+import os
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+_COMPRESSIBLE = ("application/json", "text/", "application/x-ndjson", "application/javascript")
+
+
+def _accepted(header: str) -> set:
+    """Codificaciones aceptadas (ignora las que vienen con q=0)."""
+    out = set()
+    for part in (header or "").split(","):
+        bits = [b.strip() for b in part.split(";")]
+        enc = bits[0].lower()
+        if not enc:
+            continue
+        q = 1.0
+        for b in bits[1:]:
+            if b.startswith("q="):
+                try:
+                    q = float(b[2:])
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            out.add(enc)
+    return out
+
+
+def choose_encoding(accept_encoding: str):
+    acc = _accepted(accept_encoding)
+    if brotli is not None and "br" in acc:
+        return "br"
+    if "gzip" in acc or "*" in acc:
+        return "gzip"
+    return None
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=int(os.getenv("COMPRESS_BROTLI_QUALITY", "5")))
+    return gzip.compress(data, compresslevel=int(os.getenv("COMPRESS_GZIP_LEVEL", "6")), mtime=0)
+
+
+def init_app(app) -> None:
+    if os.getenv("COMPRESS", "on").strip().lower() in ("off", "0", "false"):
+        return
+    min_bytes = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+
+    @app.after_request
+    def _compress_response(response):
+        from flask import request
+
+        if (response.status_code != 200
+                or response.direct_passthrough
+                or response.is_streamed
+                or "Content-Encoding" in response.headers
+                or not (response.mimetype or "").startswith(_COMPRESSIBLE)):
+            return response
+
+        response.vary.add("Accept-Encoding")
+        encoding = choose_encoding(request.headers.get("Accept-Encoding", ""))
+        if not encoding:
+            return response
+
+        data = response.get_data()
+        if len(data) < min_bytes:
+            return response
+
+        response.set_data(compress(data, encoding))
+        response.headers["Content-Encoding"] = encoding
+        return response
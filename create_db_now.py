@@ -1,7 +1,7 @@
 # C:\Abetos_app\backend\create_db_now.py
 from app import app
-from db import db
+import migrations
 
 with app.app_context():
-    db.create_all()
+    migrations.upgrade()
     print("✅ Tablas creadas en mi_inventario.db")
@@ -0,0 +1,224 @@
+# C:\Abetos_app\backend\dbtuning.py
+"""
+Opciones de engine por dialecto + instrumentación del pool.
+
+Postgres (psycopg 3), perfil "tuned" (default; DB_PROFILE=legacy vuelve a
+pool_pre_ping + pool_recycle=300):
+- sin pool_pre_ping: no hay un SELECT 1 extra en cada checkout. La vida de la
+  conexión se cubre con keepalives TCP, pool_recycle largo, el manejo de
+  desconexiones de SQLAlchemy (invalida el pool ante un error de red) y un
+  ping SOLO si la conexión estuvo ociosa más de DB_IDLE_PING_SEC.
+- prepared statements del lado del servidor: psycopg prepara automáticamente
+  una sentencia a partir de su ejecución N (DB_PREPARE_THRESHOLD). Como
+  SQLAlchemy cachea el SQL compilado, las consultas calientes (saldo, cliente
+  por DNI, regla por producto, inserts del ledger) generan siempre el mismo
+  texto y quedan preparadas por conexión. Detrás de PgBouncer en modo
+  transaction usar DB_PREPARE_THRESHOLD=off.
+- pool dimensionado por variables y LIFO (las conexiones ociosas de más se
+  reciclan solas).
+
+Estadísticas (por proceso): tamaño, en uso, overflow, esperas de checkout
+(cantidad / total / máximo), timeouts, conexiones nuevas, invalidaciones.
+Ver GET /api/admin/db/pool.
+
+SQLite conserva las opciones de siempre.
+"""
+import os
+import time
+import threading
+from typing import Optional
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+LEGACY_OPTIONS = {"pool_pre_ping": True, "pool_recycle": 300}
+
+
+class PoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.idle_pings = 0
+
+    def record_wait(self, secs: float, timed_out: bool = False) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += secs
+            if secs > self.wait_max:
+                self.wait_max = secs
+            if timed_out:
+                self.timeouts += 1
+
+    def as_dict(self) -> dict:
+        return {
+            "checkouts": self.checkouts,
+            "wait_total_ms": round(self.wait_total * 1000, 3),
+            "wait_avg_ms": round(self.wait_total * 1000 / self.checkouts, 3) if self.checkouts else 0.0,
+            "wait_max_ms": round(self.wait_max * 1000, 3),
+            "timeouts": self.timeouts,
+            "connects": self.connects,
+            "invalidations": self.invalidations,
+            "idle_pings": self.idle_pings,
+        }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool que mide cuánto espera cada checkout (incluye abrir conexión nueva)."""
+
+    @property
+    def stats(self) -> PoolStats:
+        st = getattr(self, "_abetos_stats", None)
+        if st is None:
+            st = self._abetos_stats = PoolStats()
+        return st
+
+    def _do_get(self):
+        t = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record_wait(time.perf_counter() - t, timed_out=True)
+            raise
+        self.stats.record_wait(time.perf_counter() - t)
+        return conn
+
+
+def profile() -> str:
+    return os.getenv("DB_PROFILE", "tuned").strip().lower()
+
+
+def engine_options(uri: str) -> dict:
+    """Opciones de create_engine para la URI (DB principal o shard)."""
+    try:
+        backend = make_url(uri).get_backend_name()
+    except Exception:
+        backend = ""
+
+    if backend != "postgresql" or profile() == "legacy":
+        return dict(LEGACY_OPTIONS)
+
+    connect_args = {
+        "application_name": os.getenv("DB_APPLICATION_NAME", "abetos"),
+        # liveness sin ping: el kernel detecta peers caídos
+        "keepalives": 1,
+        "keepalives_idle": _env_int("DB_KEEPALIVES_IDLE", 30),
+        "keepalives_interval": _env_int("DB_KEEPALIVES_INTERVAL", 10),
+        "keepalives_count": _env_int("DB_KEEPALIVES_COUNT", 3),
+        "connect_timeout": _env_int("DB_CONNECT_TIMEOUT", 5),
+    }
+    threshold = os.getenv("DB_PREPARE_THRESHOLD", "2").strip().lower()
+    # psycopg: None = nunca preparar; 0 = preparar desde la primera ejecución
+    connect_args["prepare_threshold"] = None if threshold in ("off", "none", "") else int(threshold)
+
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": _env_int("DB_POOL_SIZE", 5),
+        "max_overflow": _env_int("DB_MAX_OVERFLOW", 10),
+        "pool_timeout": _env_int("DB_POOL_TIMEOUT", 10),
+        "pool_recycle": _env_int("DB_POOL_RECYCLE", 1800),
+        "pool_use_lifo": True,
+        "pool_pre_ping": False,
+        "connect_args": connect_args,
+    }
+
+
+# ------------------------------------------------------
+# Eventos por engine
+# ------------------------------------------------------
+def _stats_of(engine) -> Optional[PoolStats]:
+    pool = engine.pool
+    return pool.stats if isinstance(pool, InstrumentedQueuePool) else None
+
+
+def attach(engine) -> None:
+    """Registra contadores y el ping por inactividad. Idempotente."""
+    if getattr(engine, "_abetos_tuned", False):
+        return
+    engine._abetos_tuned = True
+
+    idle_ping = _env_int("DB_IDLE_PING_SEC", 60)
+    prepared_max = _env_int("DB_PREPARED_MAX", 256)
+    is_pg = engine.dialect.name == "postgresql"
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, record):
+        st = _stats_of(engine)
+        if st:
+            st.connects += 1
+        if is_pg and hasattr(dbapi_conn, "prepared_max"):
+            dbapi_conn.prepared_max = prepared_max
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_conn, record):
+        record.info["checked_in_at"] = time.monotonic()
+
+    @event.listens_for(engine, "invalidate")
+    def _on_invalidate(dbapi_conn, record, exception):
+        st = _stats_of(engine)
+        if st:
+            st.invalidations += 1
+
+    if engine.pool._pre_ping or idle_ping <= 0:
+        return
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_conn, record, proxy):
+        last = record.info.get("checked_in_at")
+        if last is None or time.monotonic() - last < idle_ping:
+            return
+        st = _stats_of(engine)
+        if st:
+            st.idle_pings += 1
+        try:
+            cur = dbapi_conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+        except Exception as e:
+            # el pool descarta esta conexión y reintenta con una nueva
+            raise exc.DisconnectionError() from e
+
+
+def init_app(app) -> None:
+    from db import db
+
+    with app.app_context():
+        for engine in db.engines.values():
+            attach(engine)
+
+
+def pool_stats() -> dict:
+    """Estado de cada pool de este proceso. Usar dentro de un app context."""
+    from db import db
+
+    out = {}
+    for key, engine in db.engines.items():
+        pool = engine.pool
+        item = {"dialect": engine.dialect.name, "pool": type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            item.update({
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": max(0, pool.overflow()),
+                "max_overflow": pool._max_overflow,
+                "timeout_sec": pool.timeout(),
+            })
+        st = _stats_of(engine)
+        if st:
+            item.update(st.as_dict())
+        out[key or "main"] = item
+    return out
@@ -5,13 +5,11 @@ import hmac
 import hashlib
 import time
 import json
-import smtplib
-from email.mime.text import MIMEText
-
-import requests
 
 SECRET = os.getenv("SECRET_KEY") or os.getenv("FLASK_SECRET") or "dev-secret-change-me"
 BACKEND_ORIGIN = os.getenv("BACKEND_ORIGIN", "http://127.0.0.1:8000")
+# pantalla (del front) donde el usuario importado define su contraseña
+PASSWORD_SETUP_URL = os.getenv("PASSWORD_SETUP_URL", f"{BACKEND_ORIGIN}/api/auth/password/setup")
 
 
 def _b64(s: bytes) -> str:
@@ -79,6 +77,8 @@ def send_verification_email(to_email: str, link: str) -> bool:
     # -----------------------------
     resend_key = os.getenv("RESEND_API_KEY")
     if resend_key:
+        import requests  # import perezoso: solo se usa al mandar mails
+
         try:
             resp = requests.post(
                 "https://api.resend.com/emails",
@@ -113,6 +113,9 @@ def send_verification_email(to_email: str, link: str) -> bool:
     if not smtp_host or not smtp_user or not smtp_pass or not smtp_from:
         return False
 
+    import smtplib
+    from email.mime.text import MIMEText
+
     msg = MIMEText(text, "plain", "utf-8")
     msg["Subject"] = subject
     msg["From"] = smtp_from
@@ -130,3 +133,51 @@ def send_verification_email(to_email: str, link: str) -> bool:
 
 
 
+
+
+# ------------------------------------------------------
+# Alta de contraseña para usuarios importados (sin password)
+#   El token queda atado al password_hash actual: deja de valer
+#   apenas el usuario define su contraseña (uso único).
+# ------------------------------------------------------
+def _hash_fingerprint(password_hash: str) -> str:
+    return hashlib.sha256((password_hash or "").encode("utf-8")).hexdigest()[:16]
+
+
+def generate_password_setup_token(uid: int, password_hash: str, ttl_sec: int = 30 * 86400) -> str:
+    payload = {"uid": uid, "ph": _hash_fingerprint(password_hash), "exp": int(time.time()) + int(ttl_sec)}
+    data = b"pwsetup:" + json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    sig = hmac.new(SECRET.encode("utf-8"), data, hashlib.sha256).digest()
+    return f"{_b64(data[8:])}.{_b64(sig)}"
+
+
+def verify_password_setup_token(token: str, password_hash_of) -> dict:
+    """
+    password_hash_of(uid) -> password_hash actual (o None si no existe).
+    Lanza ValueError si el token no sirve.
+    """
+    parts = (token or "").split(".")
+    if len(parts) != 2:
+        raise ValueError("token malformado")
+
+    data = _unb64(parts[0])
+    sig = _unb64(parts[1])
+
+    exp_sig = hmac.new(SECRET.encode("utf-8"), b"pwsetup:" + data, hashlib.sha256).digest()
+    if not hmac.compare_digest(sig, exp_sig):
+        raise ValueError("firma inválida")
+
+    payload = json.loads(data.decode("utf-8"))
+    if int(time.time()) > int(payload.get("exp", 0)):
+        raise ValueError("token expirado")
+
+    current = password_hash_of(int(payload.get("uid", 0)))
+    if current is None or _hash_fingerprint(current) != payload.get("ph"):
+        raise ValueError("token ya usado")
+
+    return payload
+
+
+def generate_password_setup_link(uid: int, password_hash: str) -> str:
+    t = generate_password_setup_token(uid, password_hash)
+    return f"{PASSWORD_SETUP_URL}?token={t}"
@@ -0,0 +1,233 @@
+# C:\Abetos_app\backend\eventlog.py
+"""
+Log de eventos append-only, segmentado, en disco local.
+
+    <EVENTLOG_DIR>/00000000000000000000.log   (segmento que arranca en offset 0)
+    <EVENTLOG_DIR>/00000000000000052113.log   (rota cada EVENTLOG_SEGMENT_BYTES)
+
+Cada línea es un JSON: {"offset", "source", "outbox_id", "topic", "ts", "payload"}.
+
+Uso:
+    python eventlog.py relay             # outbox (principal + shards) -> log, en loop
+    python eventlog.py relay --once      # una pasada
+    python eventlog.py tail 0 [--follow] # imprime desde un offset
+
+Entrega at-least-once: si el proceso cae entre escribir el log y borrar el
+outbox, esos eventos se reenvían (mismo source + outbox_id, el consumidor
+puede deduplicar). Los consumidores guardan su propio offset y retoman desde ahí.
+"""
+import os
+import sys
+import json
+import time
+from typing import Iterator, Optional
+
+
+EVENTLOG_DIR = os.getenv("EVENTLOG_DIR", "eventlog")
+SEGMENT_BYTES = int(os.getenv("EVENTLOG_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+RELAY_BATCH = int(os.getenv("EVENTLOG_RELAY_BATCH", "500"))
+RELAY_IDLE_SEC = float(os.getenv("EVENTLOG_RELAY_IDLE_SEC", "1.0"))
+
+_SUFFIX = ".log"
+
+
+def _segment_name(base_offset: int) -> str:
+    return f"{base_offset:020d}{_SUFFIX}"
+
+
+def _list_segments(path: str) -> list:
+    """Offsets base de los segmentos, ordenados."""
+    if not os.path.isdir(path):
+        return []
+    out = []
+    for name in os.listdir(path):
+        if name.endswith(_SUFFIX) and name[:-len(_SUFFIX)].isdigit():
+            out.append(int(name[:-len(_SUFFIX)]))
+    return sorted(out)
+
+
+# ------------------------------------------------------
+# Escritura
+# ------------------------------------------------------
+class SegmentedLog:
+    def __init__(self, path: str = EVENTLOG_DIR, segment_bytes: int = SEGMENT_BYTES):
+        self.path = path
+        self.segment_bytes = segment_bytes
+        os.makedirs(path, exist_ok=True)
+
+        segments = _list_segments(path)
+        self._base = segments[-1] if segments else 0
+        self.next_offset = self._recover(self._base)
+        self._fh = open(os.path.join(path, _segment_name(self._base)), "ab")
+
+    def _recover(self, base: int) -> int:
+        """Cuenta líneas completas del último segmento y corta una línea a medias."""
+        seg = os.path.join(self.path, _segment_name(base))
+        if not os.path.exists(seg):
+            return base
+
+        good_bytes, count = 0, 0
+        with open(seg, "rb") as fh:
+            for line in fh:
+                if not line.endswith(b"\n"):
+                    break
+                good_bytes += len(line)
+                count += 1
+
+        if good_bytes != os.path.getsize(seg):
+            with open(seg, "r+b") as fh:
+                fh.truncate(good_bytes)
+        return base + count
+
+    def _maybe_rotate(self) -> None:
+        if self._fh.tell() < self.segment_bytes:
+            return
+        self._fh.close()
+        self._base = self.next_offset
+        self._fh = open(os.path.join(self.path, _segment_name(self._base)), "ab")
+
+    def append_many(self, records: list) -> int:
+        """Agrega registros (dicts sin offset), fsync y devuelve el próximo offset."""
+        for rec in records:
+            self._maybe_rotate()
+            line = json.dumps({"offset": self.next_offset, **rec}, separators=(",", ":"))
+            self._fh.write(line.encode("utf-8") + b"\n")
+            self.next_offset += 1
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        return self.next_offset
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+# ------------------------------------------------------
+# Lectura
+# ------------------------------------------------------
+def end_offset(path: str = EVENTLOG_DIR) -> int:
+    """Próximo offset a escribirse (para arrancar a leer "desde ahora")."""
+    segments = _list_segments(path)
+    if not segments:
+        return 0
+    base = segments[-1]
+    count = 0
+    with open(os.path.join(path, _segment_name(base)), "rb") as fh:
+        for line in fh:
+            if line.endswith(b"\n"):
+                count += 1
+    return base + count
+
+
+def read_from(offset: int = 0, path: str = EVENTLOG_DIR, follow: bool = False,
+              poll_sec: float = 0.5) -> Iterator[dict]:
+    """
+    Genera eventos con offset >= `offset`. Con follow=True sigue esperando
+    (tail -f) y pasa a segmentos nuevos a medida que aparecen.
+    """
+    segments = _list_segments(path)
+    start = [b for b in segments if b <= offset]
+    base = start[-1] if start else (segments[0] if segments else 0)
+
+    while True:
+        seg = os.path.join(path, _segment_name(base))
+        pos = 0
+        while True:
+            if os.path.exists(seg):
+                with open(seg, "rb") as fh:
+                    fh.seek(pos)
+                    while True:
+                        line = fh.readline()
+                        if not line or not line.endswith(b"\n"):
+                            break
+                        pos += len(line)
+                        rec = json.loads(line)
+                        if rec["offset"] >= offset:
+                            yield rec
+
+            newer = [b for b in _list_segments(path) if b > base]
+            if newer:
+                base = newer[0]
+                break
+            if not follow:
+                return
+            time.sleep(poll_sec)
+
+
+# ------------------------------------------------------
+# Relay: outbox -> log
+# ------------------------------------------------------
+def relay_once(log: SegmentedLog, sources: list, batch: int = RELAY_BATCH) -> int:
+    """
+    Una pasada: por cada (source, session) lleva hasta `batch` filas del outbox
+    al log y después borra esas filas. Devuelve cuántos eventos se escribieron.
+
+    No se filtra por "id > último enviado": en Postgres un id menor puede
+    confirmarse después que uno mayor. Todo lo que queda en el outbox está
+    pendiente por definición.
+    """
+    from models import OutboxEvent
+
+    shipped = 0
+    for source, sess in sources:
+        rows = (
+            sess.query(OutboxEvent)
+            .order_by(OutboxEvent.id.asc())
+            .limit(batch)
+            .all()
+        )
+        if not rows:
+            sess.rollback()
+            continue
+
+        log.append_many([{
+            "source": source,
+            "outbox_id": r.id,
+            "topic": r.topic,
+            "ts": r.created_at.isoformat() if r.created_at else None,
+            "payload": json.loads(r.payload),
+        } for r in rows])
+
+        ids = [r.id for r in rows]
+        sess.query(OutboxEvent).filter(OutboxEvent.id.in_(ids)).delete(synchronize_session=False)
+        sess.commit()
+        shipped += len(rows)
+
+    return shipped
+
+
+def run_relay(once: bool = False, path: Optional[str] = None) -> None:
+    from app import create_app
+    from sharding import router
+
+    app = create_app()
+    log = SegmentedLog(path or EVENTLOG_DIR)
+
+    with app.app_context():
+        cfg = app.config
+        sources = [(cfg.get("DEFAULT_STATION", "main"), router.session_for(None))]
+        sources += [(st, router.session_for(st)) for st in cfg.get("STATION_SHARDS", [])]
+
+        try:
+            while True:
+                n = relay_once(log, sources)
+                if once:
+                    print(f"✅ {n} eventos -> offset {log.next_offset}")
+                    return
+                if n == 0:
+                    time.sleep(RELAY_IDLE_SEC)
+        finally:
+            log.close()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    cmd = args[0] if args else ""
+
+    if cmd == "relay":
+        run_relay(once="--once" in args)
+    elif cmd == "tail":
+        start = int(args[1]) if len(args) > 1 and args[1].isdigit() else 0
+        for rec in read_from(start, follow="--follow" in args):
+            print(json.dumps(rec, ensure_ascii=False), flush=True)
+    else:
+        print(__doc__)
@@ -0,0 +1,180 @@
+# C:\Abetos_app\backend\exports.py
+"""
+Export en streaming de transactions (CSV o NDJSON), con memoria constante.
+
+- Lee el ledger con cursor del lado del servidor (stream_results + yield_per),
+  ordenado por id, así se puede retomar con after_id=<último id recibido>.
+- Datos de cliente/operador (tablas globales) se completan por lote, con un
+  cache acotado; funciona igual si el ledger está en un shard.
+- gzip opcional, comprimiendo chunk a chunk.
+"""
+import io
+import csv
+import json
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Iterator, Optional
+
+from sqlalchemy import select, or_
+
+from db import db
+from models import Transaction, Customer, User
+
+
+CHUNK_ROWS = 2000
+LOOKUP_CACHE_SIZE = 50000
+
+COLUMNS = [
+    "id", "created_at", "station_id", "kind", "points", "product_code", "liters",
+    "amount_pesos", "unit_price", "payment_method", "ticket_number", "paid_with_app",
+    "note", "reward_id", "customer_id", "customer_doc_number", "customer_full_name",
+    "customer_member_number", "operator_user_id", "operator_email",
+]
+
+_TX_COLS = [
+    Transaction.id, Transaction.created_at, Transaction.station_id, Transaction.kind,
+    Transaction.points, Transaction.product_code, Transaction.liters, Transaction.amount_pesos,
+    Transaction.unit_price, Transaction.payment_method, Transaction.ticket_number,
+    Transaction.paid_with_app, Transaction.note, Transaction.reward_id,
+    Transaction.customer_id, Transaction.operator_user_id,
+]
+
+
+class _LRU(OrderedDict):
+    def __init__(self, maxsize: int):
+        super().__init__()
+        self.maxsize = maxsize
+
+    def put(self, key, value) -> None:
+        self[key] = value
+        self.move_to_end(key)
+        while len(self) > self.maxsize:
+            self.popitem(last=False)
+
+
+def _ledger_rows(sess, date_from: Optional[datetime], date_to: Optional[datetime],
+                 product_code: Optional[str], operator_id: Optional[int],
+                 after_id: int, station_id: Optional[str] = None,
+                 default_station: bool = False) -> Iterator[list]:
+    """Genera listas de hasta CHUNK_ROWS filas, ordenadas por id."""
+    stmt = select(*_TX_COLS).where(Transaction.id > after_id).order_by(Transaction.id.asc())
+    if date_from:
+        stmt = stmt.where(Transaction.created_at >= date_from)
+    if date_to:
+        stmt = stmt.where(Transaction.created_at < date_to)
+    if product_code:
+        stmt = stmt.where(Transaction.product_code == product_code)
+    if operator_id is not None:
+        stmt = stmt.where(Transaction.operator_user_id == operator_id)
+    if station_id:
+        # filas previas al sharding (station_id NULL) pertenecen a la estación por defecto
+        cond = Transaction.station_id == station_id
+        if default_station:
+            cond = or_(cond, Transaction.station_id.is_(None))
+        stmt = stmt.where(cond)
+
+    result = sess.execute(stmt.execution_options(stream_results=True, yield_per=CHUNK_ROWS))
+    for part in result.partitions():
+        yield part
+
+
+def _enrich(rows: list, customers: _LRU, operators: _LRU) -> Iterator[dict]:
+    missing_c = {r.customer_id for r in rows if r.customer_id not in customers}
+    if missing_c:
+        for cid, doc, name, member in db.session.execute(
+            select(Customer.id, Customer.doc_number, Customer.full_name, Customer.member_number)
+            .where(Customer.id.in_(missing_c))
+        ):
+            customers.put(cid, (doc, name, member))
+
+    missing_o = {r.operator_user_id for r in rows
+                 if r.operator_user_id is not None and r.operator_user_id not in operators}
+    if missing_o:
+        for uid, email in db.session.execute(select(User.id, User.email).where(User.id.in_(missing_o))):
+            operators.put(uid, email)
+
+    for r in rows:
+        doc, name, member = customers.get(r.customer_id, (None, None, None))
+        yield {
+            "id": r.id,
+            "created_at": r.created_at.isoformat() if r.created_at else None,
+            "station_id": r.station_id,
+            "kind": r.kind,
+            "points": r.points,
+            "product_code": r.product_code,
+            "liters": r.liters,
+            "amount_pesos": r.amount_pesos,
+            "unit_price": r.unit_price,
+            "payment_method": r.payment_method,
+            "ticket_number": r.ticket_number,
+            "paid_with_app": bool(r.paid_with_app) if r.paid_with_app is not None else None,
+            "note": r.note,
+            "reward_id": r.reward_id,
+            "customer_id": r.customer_id,
+            "customer_doc_number": doc,
+            "customer_full_name": name,
+            "customer_member_number": member,
+            "operator_user_id": r.operator_user_id,
+            "operator_email": operators.get(r.operator_user_id),
+        }
+
+
+def _encode_csv(records: Iterator[dict], header: bool) -> Iterator[bytes]:
+    buf = io.StringIO()
+    w = csv.DictWriter(buf, fieldnames=COLUMNS, extrasaction="ignore", lineterminator="\n")
+    if header:
+        w.writeheader()
+    n = 0
+    for rec in records:
+        w.writerow(rec)
+        n += 1
+        if n % 500 == 0:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+def _encode_ndjson(records: Iterator[dict]) -> Iterator[bytes]:
+    lines = []
+    for rec in records:
+        lines.append(json.dumps(rec, ensure_ascii=False, separators=(",", ":")))
+        if len(lines) >= 500:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def _gzip(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31 = formato gzip
+    for chunk in chunks:
+        out = z.compress(chunk)
+        if out:
+            yield out
+    yield z.flush()
+
+
+def stream_transactions(sess, fmt: str = "csv", compress: bool = False,
+                        date_from: Optional[datetime] = None, date_to: Optional[datetime] = None,
+                        product_code: Optional[str] = None, operator_id: Optional[int] = None,
+                        after_id: int = 0, station_id: Optional[str] = None,
+                        default_station: bool = False) -> Iterator[bytes]:
+    """Generador de bytes listo para un Response en streaming."""
+    customers = _LRU(LOOKUP_CACHE_SIZE)
+    operators = _LRU(1000)
+
+    def records():
+        for rows in _ledger_rows(sess, date_from, date_to, product_code, operator_id,
+                                after_id, station_id, default_station):
+            yield from _enrich(rows, customers, operators)
+
+    if fmt == "ndjson":
+        body = _encode_ndjson(records())
+    else:
+        # al retomar (after_id > 0) no se repite el encabezado
+        body = _encode_csv(records(), header=(after_id == 0))
+
+    return _gzip(body) if compress else body
@@ -0,0 +1,75 @@
+# C:\Abetos_app\backend\fastjson.py
+"""
+Proveedor JSON de la app (app.json: jsonify, request.get_json).
+
+- orjson si está instalado (opcional, requirements-extras.txt): serializa
+  en C y entiende datetime / date / UUID sin pasar por Python; jsonify arma
+  la respuesta directo desde los bytes (sin str intermedio).
+- Sin orjson: el json de la stdlib, como siempre.
+- En los dos casos datetime/date salen en ISO 8601 (igual que .isoformat();
+  Flask por defecto usa fecha HTTP): los listados pueden devolver las filas
+  con el datetime tal cual, sin formatear campo por campo.
+- Respeta JSON_SORT_KEYS (la app lo tiene en False) y el indentado en debug.
+
+Variables: JSON_PROVIDER = auto | orjson | stdlib (default auto).
+"""
+import os
+import decimal
+from datetime import date
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(o):
+    if isinstance(o, date):  # incluye datetime
+        return o.isoformat()
+    if isinstance(o, decimal.Decimal):
+        return float(o)
+    return DefaultJSONProvider.default(o)
+
+
+class StdlibJSONProvider(DefaultJSONProvider):
+    default = staticmethod(_default)
+
+
+class OrjsonJSONProvider(DefaultJSONProvider):
+    default = staticmethod(_default)
+
+    def _option(self, indent: bool = False) -> int:
+        opt = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            opt |= orjson.OPT_SORT_KEYS
+        if indent:
+            opt |= orjson.OPT_INDENT_2
+        return opt
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj, default=self.default,
+                            option=self._option(kwargs.get("indent") is not None)).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        body = orjson.dumps(obj, default=self.default, option=self._option(indent))
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def provider_class():
+    choice = os.getenv("JSON_PROVIDER", "auto").strip().lower()
+    if choice == "stdlib" or orjson is None:
+        return StdlibJSONProvider
+    return OrjsonJSONProvider
+
+
+def init_app(app) -> None:
+    app.json = provider_class()(app)
+    app.json.sort_keys = bool(app.config.get("JSON_SORT_KEYS", True))
+
@@ -0,0 +1,100 @@
+# C:\Abetos_app\backend\fieldsets.py
+"""
+Sparse fieldsets: ?fields=id,points,created_at
+
+Cada endpoint declara sus campos como {nombre: (columna | None, serializador)}.
+Se seleccionan solo las columnas pedidas (y las que el endpoint necesite
+internamente, p.ej. para ordenar) y se serializan solo los campos pedidos.
+Sin ?fields= se devuelven todos, como siempre.
+
+Las filas salen de select(*columns_for(...)) por Core (tuplas, sin identity
+map) y se serializan con row_serializer(), que resuelve posiciones y formatos
+una sola vez por request. iso / same no se aplican ahí: el proveedor JSON de la app
+(fastjson.py) escribe los datetime en ISO por su cuenta.
+"""
+from operator import itemgetter
+from typing import Callable, Optional
+
+from sqlalchemy import Float
+
+
+def iso(v):
+    return v.isoformat() if v is not None else None
+
+
+def as_float(v):
+    return float(v) if v is not None else None
+
+
+def same(v):
+    return v
+
+
+def parse_fields(raw: Optional[str], spec: dict) -> list:
+    """
+    Devuelve la lista ordenada de campos pedidos (todos si raw viene vacío).
+    Lanza ValueError con los nombres desconocidos.
+    """
+    raw = (raw or "").strip()
+    if not raw:
+        return list(spec)
+
+    wanted = []
+    for name in raw.split(","):
+        name = name.strip()
+        if name and name not in wanted:
+            wanted.append(name)
+
+    unknown = [n for n in wanted if n not in spec]
+    if unknown:
+        raise ValueError(", ".join(unknown))
+    return wanted or list(spec)
+
+
+def columns_for(fields: list, spec: dict, extra: tuple = ()) -> list:
+    """Columnas a seleccionar: las de los campos pedidos + `extra` (sin repetir)."""
+    cols = []
+    for name in list(fields) + list(extra):
+        col = spec[name][0] if name in spec else None
+        if col is not None and not any(col is c for c in cols):
+            cols.append(col)
+    return cols
+
+
+def _passthrough(col, fmt) -> bool:
+    if fmt in (same, iso):
+        return True
+    # as_float sobre una columna Float: el driver ya devuelve float (o None)
+    return fmt is as_float and col is not None and isinstance(col.type, Float) and not col.type.asdecimal
+
+
+def row_serializer(fields: list, spec: dict, cols: list) -> Callable:
+    """
+    fn(row, computed=None) -> dict para filas Core de select(*cols).
+    computed: valores ya calculados para campos sin columna (p.ej. saldos).
+    """
+    names = tuple(fields)
+    plan = []
+    for name in fields:
+        col, fmt = spec[name]
+        idx = None if col is None else next(i for i, c in enumerate(cols) if c is col)
+        plan.append((name, idx, None if _passthrough(col, fmt) else fmt))
+
+    if all(idx is not None and fmt is None for _, idx, fmt in plan):
+        # caso común: todo sale tal cual -> un itemgetter + zip en C
+        if len(plan) == 1:
+            i = plan[0][1]
+            return lambda row, computed=None: {names[0]: row[i]}
+        getter = itemgetter(*(idx for _, idx, _ in plan))
+        return lambda row, computed=None: dict(zip(names, getter(row)))
+
+    def fn(row, computed: Optional[dict] = None) -> dict:
+        out = {}
+        for name, idx, fmt in plan:
+            if idx is None:
+                out[name] = (computed or {}).get(name)
+            else:
+                v = row[idx]
+                out[name] = fmt(v) if fmt is not None else v
+        return out
+    return fn
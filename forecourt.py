@@ -0,0 +1,683 @@
+# C:\Abetos_app\backend\forecourt.py
+"""
+Ingesta de despachos desde el controlador de surtidores (sin re-tipear en
+/api/admin/accredit-by-dni).
+
+    python forecourt.py --file /var/feed/despachos.log [--station ID] [opciones]
+    python forecourt.py --listen 0.0.0.0:9100 [--station ID] [opciones]
+
+Opciones: --batch N (default 500), --max-wait-ms N (default 200),
+--queue N (default 20000), --rejects rechazos.ndjson, --once (archivo: termina
+al llegar al final), --reset (borra el checkpoint de la fuente).
+
+Formato: un JSON por línea, por ejemplo
+    {"seq": 1812, "ts": "2026-10-19T14:03:11", "pump": 4, "product": "INFINIA",
+     "liters": 32.5, "amount": 41275, "unit_price": 1270, "ticket": "B-0001-00012345",
+     "dni": "30111222"}
+cliente por "dni" (doc_number) o "card" (member_number); "liters" o
+"amount" (sin litros: precio vigente de prices.py).
+
+Pipeline (generadores):
+    fuente -> cola acotada -> lotes (N o max-wait) -> parseo -> cliente + regla
+    -> INSERT del lote + leaderboard/sketches/outbox/niveles + checkpoint -> commit
+
+- Back-pressure: un hilo lee la fuente y la cola es acotada; si la DB se
+  atrasa, el lector se bloquea (archivo: queda atrás; socket: se llena la
+  ventana TCP y el controlador frena). Si el commit falla se reintenta el
+  mismo lote con espera creciente.
+- Checkpoint (ingest_offsets) en la DB del ledger de la estación, en la MISMA
+  transacción que el lote: al reiniciar se sigue exactamente desde el último
+  commit. Archivo: dev:inode + offset (sigue rotaciones tipo despachos.log ->
+  despachos.log.1). Socket: último "seq" del controlador (se descartan
+  repetidos; si el controlador reinicia su numeración, usar --reset).
+- Los inserts van por Core, en lote: las actualizaciones que hacen los
+  listeners ORM (leaderboard, sketches, outbox, niveles) se aplican con sus
+  versiones por lote (sketches, como el listener, después del commit). No pasa por el detector de anomalías (no hay playero).
+- Lo que no se puede acreditar (cliente o regla inexistente, 0 puntos, JSON
+  inválido, números no finitos o fuera de rango) va al archivo de rechazos
+  con el motivo. ticket / payment_method se recortan al largo de la columna.
+- Reintentos: errores de conexión / lock se reintentan sin límite (con espera
+  creciente); cualquier otro error, WRITE_ATTEMPTS veces: después se parte el
+  lote para aislar las filas que fallan (van a rechazos con "write_failed") y
+  el resto se escribe con el checkpoint en una sola transacción.
+
+- Cache de clientes por proceso (LRU, solo encontrados): se vacía cuando el
+  cachebus avisa un cambio de DNI / tarjeta / nivel; un DNI desconocido se
+  vuelve a buscar en el próximo lote (un alta no invalida nada). Las reglas
+  usan el cache de rules.py.
+
+Variables: FORECOURT_STATION, FORECOURT_CACHE_TTL_SEC (tope de vida del cache de clientes, default 60).
+"""
+import os
+import sys
+import glob
+import json
+import time
+import queue
+import signal
+import math
+import logging
+import threading
+import socketserver
+from collections import OrderedDict
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Iterator, Optional
+
+from sqlalchemy import select, insert, update, delete, or_
+from sqlalchemy.exc import OperationalError, InterfaceError, DBAPIError
+
+from db import db
+from models import Customer, Transaction, IngestOffset, OutboxEvent
+from rules import find_rule, calculate_points
+from prices import price_book
+from cachebus import bus, CUSTOMERS
+import leaderboard
+import sketches
+import outbox
+import tiers
+
+
+log = logging.getLogger("forecourt")
+
+BATCH_SIZE = 500
+MAX_WAIT_MS = 200
+QUEUE_SIZE = 20000
+CACHE_TTL_SEC = float(os.getenv("FORECOURT_CACHE_TTL_SEC", "60"))
+CUSTOMER_CACHE_MAX = 200000
+POLL_SEC = 0.05
+LITERS_DECIMALS = 4
+WRITE_ATTEMPTS = 3
+
+# topes de un despacho (más que eso es un dato roto del controlador)
+MAX_LITERS = 100000.0
+MAX_AMOUNT = 1e8
+MAX_UNIT_PRICE = 1e7
+MAX_SEQ = 2 ** 63 - 1  # BIGINT
+MAX_POINTS = 2 ** 31 - 1  # transactions.points es INTEGER
+
+_TX = None  # columnas de transactions (largo de ticket / payment_method)
+
+_EOF = object()
+_ALIASES = {
+    "product_code": "product", "amount_pesos": "amount", "doc_number": "dni", "doc": "dni",
+    "member_number": "card", "ticket_number": "ticket", "tarjeta": "card",
+}
+
+
+# ------------------------------------------------------
+# Fuentes: generadores de (file_id, offset, línea)
+# ------------------------------------------------------
+def _file_id(st) -> str:
+    return f"{st.st_dev}:{st.st_ino}"
+
+
+def tail_file(path: str, file_id: Optional[str], offset: int, stop: threading.Event,
+              once: bool = False) -> Iterator[tuple]:
+    """
+    Sigue un archivo que crece y rota. Arranca en (file_id, offset); si ese
+    archivo ya rotó, lo busca entre path.* y lo termina antes de pasar al nuevo.
+    Solo entrega líneas completas; el offset es el del final de la línea.
+    """
+    fh, cur_id = None, None
+    if file_id:
+        for cand in [path] + sorted(glob.glob(path + ".*")):
+            try:
+                if _file_id(os.stat(cand)) == file_id:
+                    fh, cur_id = open(cand, "rb"), file_id
+                    fh.seek(offset)
+                    break
+            except OSError:
+                continue
+        if fh is None:
+            log.warning("forecourt: %s (%s) ya no está; se sigue desde el principio del actual", path, file_id)
+
+    pending = b""
+    while not stop.is_set():
+        if fh is None:
+            try:
+                fh = open(path, "rb")
+            except FileNotFoundError:
+                if once:
+                    return
+                time.sleep(POLL_SEC)
+                continue
+            cur_id, pending = _file_id(os.fstat(fh.fileno())), b""
+
+        chunk = fh.read(1 << 20)
+        if chunk:
+            data = pending + chunk
+            pos = fh.tell() - len(data)
+            start = 0
+            while True:
+                nl = data.find(b"\n", start)
+                if nl < 0:
+                    break
+                line = data[start:nl]
+                start = nl + 1
+                if line.strip():
+                    yield cur_id, pos + start, line
+            pending = data[start:]
+            continue
+
+        # fin del archivo: ¿rotó? (el path apunta a otro inode)
+        try:
+            rotated = _file_id(os.stat(path)) != cur_id
+        except FileNotFoundError:
+            rotated = False
+        if rotated:
+            fh.close()
+            fh = None
+            continue
+        if once:
+            break
+        time.sleep(POLL_SEC)
+
+    if fh is not None:
+        fh.close()
+
+
+class _FeedHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        out, stop = self.server.out, self.server.stop
+        for line in self.rfile:
+            if stop.is_set():
+                break
+            if line.strip():
+                out.put((None, None, line.rstrip(b"\r\n")))  # bloquea si la cola está llena
+
+
+class _FeedServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def listen_socket(addr: tuple, out: queue.Queue, stop: threading.Event, ready: threading.Event = None) -> None:
+    """Servidor TCP: cada conexión manda líneas; todas van a la misma cola."""
+    srv = _FeedServer(addr, _FeedHandler)
+    srv.out, srv.stop = out, stop
+    srv.timeout = 0.2
+    if ready is not None:
+        ready.address = srv.server_address
+        ready.set()
+    try:
+        while not stop.is_set():
+            srv.handle_request()
+    finally:
+        srv.server_close()
+
+
+def _pump(source: Iterator, out: queue.Queue, stop: threading.Event) -> None:
+    """Hilo lector: fuente -> cola acotada (put bloqueante = back-pressure)."""
+    try:
+        for item in source:
+            while not stop.is_set():
+                try:
+                    out.put(item, timeout=0.2)
+                    break
+                except queue.Full:
+                    continue
+            if stop.is_set():
+                break
+    finally:
+        out.put(_EOF)
+
+
+def batches(q: queue.Queue, size: int, max_wait: float) -> Iterator[list]:
+    """Lotes de hasta `size` ítems; un lote incompleto sale a los max_wait segundos."""
+    batch, deadline = [], None
+    while True:
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            item = q.get(timeout=timeout) if timeout is None or timeout > 0 else q.get_nowait()
+        except queue.Empty:
+            item = None
+        if item is _EOF:
+            if batch:
+                yield batch
+            return
+        if item is not None:
+            batch.append(item)
+            if deadline is None:
+                deadline = time.monotonic() + max_wait
+        if batch and (len(batch) >= size or time.monotonic() >= deadline):
+            yield batch
+            batch, deadline = [], None
+
+
+# ------------------------------------------------------
+# Parseo y matching
+# ------------------------------------------------------
+def parse(line: bytes):
+    """(despacho, None) o (None, motivo)."""
+    try:
+        raw = json.loads(line)
+    except ValueError:
+        return None, "invalid_json"
+    if not isinstance(raw, dict):
+        return None, "invalid_json"
+    d = {_ALIASES.get(k, k): v for k, v in raw.items()}
+
+    product = str(d.get("product") or "").strip()
+    if not product:
+        return None, "missing_product"
+    dni = "".join(ch for ch in str(d.get("dni") or "") if ch.isdigit()) or None
+    card = str(d.get("card") or "").strip() or None
+    if not dni and not card:
+        return None, "missing_customer"
+
+    try:
+        liters = _number(d.get("liters"), MAX_LITERS)
+        amount = _number(d.get("amount"), MAX_AMOUNT)
+        unit_price = _number(d.get("unit_price"), MAX_UNIT_PRICE)
+        seq = int(d["seq"]) if d.get("seq") is not None else None
+    except (TypeError, ValueError, OverflowError):
+        return None, "invalid_number"
+    if seq is not None and not 0 <= seq <= MAX_SEQ:
+        return None, "invalid_number"
+
+    created_at = None
+    if d.get("ts"):
+        try:
+            created_at = datetime.fromisoformat(str(d["ts"]).replace("Z", "+00:00"))
+        except ValueError:
+            return None, "invalid_ts"
+        if created_at.tzinfo is not None:
+            created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+
+    return {
+        "seq": seq, "product": product, "dni": dni, "card": card, "liters": liters, "amount": amount,
+        "unit_price": unit_price, "created_at": created_at,
+        "ticket": _text(d.get("ticket"), "ticket_number"),
+        "payment_method": _text(d.get("payment_method"), "payment_method"),
+    }, None
+
+
+def _number(value, top: float) -> Optional[float]:
+    """float finito en [0, top] (None si no vino); ValueError si no."""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise ValueError(value)
+    v = float(value)
+    if not math.isfinite(v) or not 0 <= v <= top:
+        raise ValueError(value)
+    return v
+
+
+def _text(value, column: str) -> Optional[str]:
+    """Texto recortado al largo de la columna de transactions (en Postgres, más largo es DataError)."""
+    global _TX
+    if value is None:
+        return None
+    v = str(value).strip()
+    if not v:
+        return None
+    if _TX is None:
+        _TX = Transaction.__table__.c
+    size = _TX[column].type.length
+    return v[:size] if size else v
+
+
+class CustomerCache:
+    """("d", dni) | ("c", tarjeta) -> (customer_id, tier) | None; LRU con TTL.
+
+    Solo guarda clientes encontrados: lo que no existe se consulta de nuevo
+    (así un alta no necesita invalidar). Atado a la versión "customers" del
+    cachebus: un cambio de DNI, tarjeta o nivel (en cualquier worker) vacía
+    el cache en el próximo lote.
+    """
+
+    def __init__(self, ttl_sec: float = CACHE_TTL_SEC, max_size: int = CUSTOMER_CACHE_MAX):
+        self.ttl_sec, self.max_size = ttl_sec, max_size
+        self._data = OrderedDict()
+        self._version = None
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def resolve(self, keys: set) -> dict:
+        version = bus.version(CUSTOMERS)
+        if version != self._version:
+            self._data.clear()
+            self._version = version
+        now = time.monotonic()
+        out, missing = {}, []
+        for k in keys:
+            hit = self._data.get(k)
+            if hit is not None and now - hit[0] <= self.ttl_sec:
+                out[k] = hit[1]
+                self._data.move_to_end(k)
+            else:
+                missing.append(k)
+
+        for i in range(0, len(missing), 500):
+            part = missing[i:i + 500]
+            dnis = [v for kind, v in part if kind == "d"]
+            cards = [v for kind, v in part if kind == "c"]
+            found = {}
+            for cid, doc, member, tier in db.session.execute(
+                select(Customer.id, Customer.doc_number, Customer.member_number, Customer.tier)
+                .where(or_(Customer.doc_number.in_(dnis), Customer.member_number.in_(cards)))
+            ):
+                found[("d", doc)] = (cid, tier)
+                if member:
+                    found[("c", member)] = (cid, tier)
+            for k in part:
+                out[k] = found.get(k)
+                if out[k] is not None:
+                    self._data[k] = (now, out[k])
+                    self._data.move_to_end(k)
+
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+        return out
+
+
+# ------------------------------------------------------
+# Escritura
+# ------------------------------------------------------
+class Ingestor:
+    def __init__(self, source: str, station_id: Optional[str] = None, rejects_path: Optional[str] = None):
+        from sharding import router
+
+        self.source = source
+        self.station_id = router.normalize(station_id)
+        self.session = router.session_for(self.station_id)
+        self.on_main = self.session is db.session
+        self.customers = CustomerCache()
+        self.rejects = open(rejects_path, "a", encoding="utf-8") if rejects_path else None
+        self.stats = {"read": 0, "written": 0, "rejected": 0, "duplicates": 0, "batches": 0, "retries": 0}
+        self.checkpoint = self._load_checkpoint()
+
+    # --- checkpoint ---
+    def _load_checkpoint(self) -> dict:
+        t = IngestOffset.__table__
+        row = self.session.execute(
+            select(t.c.file_id, t.c.offset, t.c.seq, t.c.dispatches).where(t.c.source == self.source)
+        ).first()
+        self.session.rollback()
+        if row is None:
+            return {"file_id": None, "offset": 0, "seq": None, "dispatches": 0}
+        return {"file_id": row.file_id, "offset": row.offset, "seq": row.seq, "dispatches": row.dispatches}
+
+    def reset(self) -> None:
+        t = IngestOffset.__table__
+        self.session.execute(delete(t).where(t.c.source == self.source))
+        self.session.commit()
+        self.checkpoint = {"file_id": None, "offset": 0, "seq": None, "dispatches": 0}
+
+    def _save_checkpoint(self, conn, ck: dict) -> None:
+        t = IngestOffset.__table__
+        values = {**ck, "updated_at": datetime.utcnow()}
+        if not conn.execute(update(t).where(t.c.source == self.source).values(**values)).rowcount:
+            conn.execute(insert(t).values(source=self.source, **values))
+
+    # --- lote ---
+    def _reject(self, reason: str, line: bytes) -> None:
+        self.stats["rejected"] += 1
+        if self.rejects is not None:
+            self.rejects.write(json.dumps({"reason": reason, "source": self.source,
+                                           "line": line.decode("utf-8", "replace")}) + "\n")
+
+    def build(self, items: list) -> tuple:
+        """Ítems crudos -> (filas de transactions, líneas de cada fila, checkpoint nuevo)."""
+        ck = dict(self.checkpoint)
+        parsed = []
+        for file_id, offset, line in items:
+            if file_id is not None:
+                ck["file_id"], ck["offset"] = file_id, offset
+            d, reason = parse(line)
+            if d is None:
+                self._reject(reason, line)
+                continue
+            if d["seq"] is not None:
+                if file_id is None and ck["seq"] is not None and d["seq"] <= ck["seq"]:
+                    self.stats["duplicates"] += 1  # el controlador reenvió lo ya commiteado
+                    continue
+                ck["seq"] = d["seq"] if ck["seq"] is None else max(ck["seq"], d["seq"])
+            parsed.append((d, line))
+
+        keys = {("d", d["dni"]) if d["dni"] else ("c", d["card"]) for d, _ in parsed}
+        found = self.customers.resolve(keys)
+
+        now = datetime.utcnow()
+        rows, lines = [], []
+        for d, line in parsed:
+            cust = found.get(("d", d["dni"]) if d["dni"] else ("c", d["card"]))
+            if cust is None:
+                self._reject("customer_not_found", line)
+                continue
+            rule = find_rule(d["product"], self.station_id)
+            if rule is None or (rule.unit or "").upper().strip() not in ("LITERS", "CURRENCY"):
+                self._reject("earning_rule_not_found", line)
+                continue
+
+            liters, amount, unit_price = d["liters"], d["amount"], d["unit_price"]
+            if liters is None and amount is not None:
+                if unit_price is not None and unit_price > 0:
+                    liters = round(amount / unit_price, LITERS_DECIMALS)
+                else:
+                    liters, unit_price = price_book.liters_for(d["product"], amount, self.station_id,
+                                                               d["created_at"])
+            if liters is not None and liters > MAX_LITERS:
+                self._reject("invalid_number", line)  # monto / precio absurdos
+                continue
+            points = calculate_points(rule, liters=liters, amount_pesos=amount, rounding="floor",
+                                      min_points=0, multiplier=tiers.multiplier(cust[1]))
+            if points <= 0:
+                self._reject("zero_points", line)
+                continue
+            if points > MAX_POINTS:
+                self._reject("invalid_number", line)
+                continue
+
+            rows.append({
+                "customer_id": cust[0], "kind": Transaction.KIND_EARN, "points": int(points),
+                "product_code": d["product"], "liters": liters, "amount_pesos": amount,
+                "unit_price": unit_price, "paid_with_app": False, "payment_method": d["payment_method"],
+                "ticket_number": d["ticket"], "note": None, "operator_user_id": None,
+                "purchase_id": None, "reward_id": None, "station_id": self.station_id,
+                "created_at": d["created_at"] or now,
+            })
+            lines.append(line)
+        if not self.on_main:
+            db.session.rollback()  # no dejar abierta la lectura de customers/reglas
+        return rows, lines, ck
+
+    def _write(self, rows: list, ck: dict, commit: bool = True) -> None:
+        """Lote + efectos + checkpoint en una transacción (commit=False: prueba y rollback)."""
+        conn = self.session.connection()
+        t = Transaction.__table__
+        if rows:
+            ids = conn.execute(insert(t).returning(t.c.id, sort_by_parameter_order=True), rows).scalars().all()
+            for r, tid in zip(rows, ids):
+                r["id"] = tid
+            leaderboard.add_many(conn, rows)
+            outbox.emit_many(conn, OutboxEvent.TOPIC_TRANSACTION,
+                             [(r["id"], outbox.transaction_payload(SimpleNamespace(**r))) for r in rows])
+            if self.on_main:
+                tiers.apply_many(conn, rows)  # misma transacción que el ledger
+        if not commit:
+            self.session.rollback()
+            return
+        engine = conn.engine
+        self._save_checkpoint(conn, {**ck, "dispatches": ck["dispatches"] + len(rows)})
+        self.session.commit()
+
+        if rows:
+            # sketches: después del commit, en una transacción corta (filas "*" compartidas)
+            try:
+                with engine.begin() as c:
+                    sketches.observe_many(c, rows)
+            except Exception:
+                log.exception("forecourt: sketches sin aplicar para %d despachos (sketches.py backfill)", len(rows))
+
+        if rows and not self.on_main:
+            # customers está en la DB principal: después del commit del shard
+            try:
+                with db.engine.begin() as main:
+                    tiers.apply_many(main, rows)
+            except Exception:
+                log.exception("forecourt: niveles sin aplicar para %d despachos (tiers.py rebuild)", len(rows))
+
+    def _isolate(self, rows: list, lines: list) -> tuple:
+        """Parte el lote (escrituras de prueba con rollback): (filas buenas, sus líneas, líneas malas)."""
+        try:
+            self._write(rows, None, commit=False)
+            return rows, lines, []
+        except Exception as e:
+            self.session.rollback()
+            for r in rows:
+                r.pop("id", None)
+            if _transient(e):
+                raise
+            if len(rows) == 1:
+                log.warning("forecourt: despacho rechazado al escribir (%s: %s)", type(e).__name__, e)
+                return [], [], lines
+        half = len(rows) // 2
+        rows_a, lines_a, bad_a = self._isolate(rows[:half], lines[:half])
+        rows_b, lines_b, bad_b = self._isolate(rows[half:], lines[half:])
+        return rows_a + rows_b, lines_a + lines_b, bad_a + bad_b
+
+    def ingest(self, items: list, stop: Optional[threading.Event] = None) -> int:
+        """
+        Un lote. Errores transitorios (conexión, lock): reintento sin límite
+        (o hasta stop). Otros: WRITE_ATTEMPTS intentos y después se aíslan
+        las filas que fallan (a rechazos) y se escribe el resto.
+        """
+        rows, lines, ck = self.build(items)
+        delay, failures = 0.1, 0
+        while True:
+            try:
+                self._write(rows, ck)
+                break
+            except Exception as e:
+                self.session.rollback()
+                for r in rows:
+                    r.pop("id", None)
+                if not _transient(e):
+                    failures += 1
+                if failures >= WRITE_ATTEMPTS:
+                    failures = 0
+                    log.exception("forecourt: el lote falló %d veces, se aíslan las filas malas", WRITE_ATTEMPTS)
+                    try:
+                        rows, lines, bad = self._isolate(rows, lines)
+                    except Exception:
+                        log.exception("forecourt: error transitorio aislando filas, se reintenta el lote")
+                        bad = []
+                    for line in bad:
+                        self._reject("write_failed", line)
+                    if bad:
+                        continue
+                self.stats["retries"] += 1
+                log.exception("forecourt: commit falló, reintento en %.1f s", delay)
+                if stop is not None and stop.wait(delay):
+                    raise
+                if stop is None:
+                    time.sleep(delay)
+                delay = min(delay * 2, 30.0)
+        if self.rejects is not None:
+            self.rejects.flush()
+        ck["dispatches"] += len(rows)
+        self.checkpoint = ck
+        self.stats["read"] += len(items)
+        self.stats["written"] += len(rows)
+        self.stats["batches"] += 1
+        return len(rows)
+
+    def close(self) -> None:
+        if self.rejects is not None:
+            self.rejects.close()
+
+
+def _transient(e: Exception) -> bool:
+    """Conexión caída, lock, timeout: vale la pena reintentar sin límite."""
+    if isinstance(e, DBAPIError) and e.connection_invalidated:
+        return True
+    return isinstance(e, (OperationalError, InterfaceError))
+
+
+# ------------------------------------------------------
+# Loop
+# ------------------------------------------------------
+def run(ingestor: Ingestor, q: queue.Queue, stop: threading.Event, batch_size: int = BATCH_SIZE,
+        max_wait_ms: int = MAX_WAIT_MS, report_sec: float = 10.0) -> dict:
+    """Consume la cola hasta _EOF. Dentro de un app context."""
+    t0 = last = time.monotonic()
+    last_written = 0
+    for items in batches(q, batch_size, max_wait_ms / 1000.0):
+        ingestor.ingest(items, stop)
+        now = time.monotonic()
+        if report_sec and now - last >= report_sec:
+            s = ingestor.stats
+            log.info("forecourt: %d escritos (%.0f/s), %d rechazados, cola %d",
+                     s["written"], (s["written"] - last_written) / (now - last), s["rejected"], q.qsize())
+            last, last_written = now, s["written"]
+    return {**ingestor.stats, "seconds": round(time.monotonic() - t0, 3)}
+
+
+def start_file(ingestor: Ingestor, path: str, stop: threading.Event, once: bool = False,
+               queue_size: int = QUEUE_SIZE) -> queue.Queue:
+    q = queue.Queue(maxsize=queue_size)
+    ck = ingestor.checkpoint
+    src = tail_file(path, ck["file_id"], ck["offset"], stop, once=once)
+    threading.Thread(target=_pump, args=(src, q, stop), name="forecourt-reader", daemon=True).start()
+    return q
+
+
+def start_socket(addr: tuple, stop: threading.Event, queue_size: int = QUEUE_SIZE):
+    """Devuelve (cola, dirección real) con el servidor ya escuchando."""
+    q = queue.Queue(maxsize=queue_size)
+    ready = threading.Event()
+
+    def serve():
+        try:
+            listen_socket(addr, q, stop, ready)
+        finally:
+            q.put(_EOF)
+
+    threading.Thread(target=serve, name="forecourt-listener", daemon=True).start()
+    ready.wait()
+    return q, ready.address
+
+
+def _opt(args: list, name: str, default=None):
+    return args[args.index(name) + 1] if name in args else default
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    path, listen = _opt(args, "--file"), _opt(args, "--listen")
+    if bool(path) == bool(listen):
+        print(__doc__)
+        sys.exit(2)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    station = _opt(args, "--station", os.getenv("FORECOURT_STATION"))
+    source = f"file:{os.path.abspath(path)}" if path else f"tcp:{listen}"
+
+    from app import create_app
+
+    app = create_app()
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+
+    with app.app_context():
+        ing = Ingestor(source, station, _opt(args, "--rejects"))
+        if "--reset" in args:
+            ing.reset()
+        qsize = int(_opt(args, "--queue", QUEUE_SIZE))
+        if path:
+            q = start_file(ing, path, stop, once="--once" in args, queue_size=qsize)
+        else:
+            host, _, port = listen.rpartition(":")
+            q, bound = start_socket((host or "0.0.0.0", int(port)), stop, qsize)
+            log.info("forecourt: escuchando en %s:%d", *bound)
+        log.info("forecourt: %s -> estación %s (checkpoint %s)", source, ing.station_id, ing.checkpoint)
+        try:
+            res = run(ing, q, stop, int(_opt(args, "--batch", BATCH_SIZE)), int(_opt(args, "--max-wait-ms", MAX_WAIT_MS)))
+        finally:
+            ing.close()
+    print("✅ Ingesta:", ", ".join(f"{k}={v}" for k, v in res.items()))
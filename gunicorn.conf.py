@@ -0,0 +1,27 @@
+# C:\Abetos_app\backend\gunicorn.conf.py
+# gunicorn app:app  (toma esta config automáticamente desde el directorio actual)
+#
+# Esquema: correr `python migrations.py` una vez por deploy, NO en cada worker.
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("GUNICORN_WORKERS", "4"))
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "sync")  # gevent para muchos SSE
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+
+# la app se importa una sola vez en el master y los workers la heredan (COW)
+preload_app = True
+
+
+def when_ready(server):
+    from app import app
+    import prefork
+
+    prefork.warmup(app)
+
+
+def post_fork(server, worker):
+    from app import app
+    import prefork
+
+    prefork.post_fork(app)
@@ -9,7 +9,7 @@ import os
 from urllib.parse import urlparse
 
 from app import create_app
-from db import db
+import migrations
 import models  # asegura que SQLAlchemy conozca todas las tablas
 
 
@@ -24,7 +24,7 @@ def main():
     app = create_app()
     with app.app_context():
         uri = app.config.get("SQLALCHEMY_DATABASE_URI")
-        db.create_all()
+        migrations.upgrade()
 
         print("✅ Base creada/actualizada.")
         print(f"   SQLALCHEMY_DATABASE_URI = {uri}")
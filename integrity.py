@@ -0,0 +1,282 @@
+# C:\Abetos_app\backend\integrity.py
+"""
+Chequeo de integridad del ledger, en paralelo y de solo lectura.
+
+    python integrity.py [--workers 4] [--chunk 50000] [--pause-ms 0] [--out report.ndjson]
+
+Parte customers y transactions en rangos de id y los reparte entre procesos.
+Cada proceso abre sus propias conexiones de SOLO LECTURA (Postgres:
+default_transaction_read_only + statement_timeout; SQLite: query_only) y
+hace una transacción corta por rango, así se puede correr en horario de
+atención sin tomar locks largos. --pause-ms agrega una pausa entre rangos.
+
+Invariantes:
+- saldo de cada cliente >= 0 (suma de parciales de la DB principal y los shards);
+- toda transaction apunta a un customer existente (los shards no tienen FK);
+- earn con puntos >= 0, redeem con puntos < 0;
+- todo redeem referencia una recompensa válida: product_code "REWARD:<id>"
+  con <id> existente (y reward_id, si está, coincide);
+- Reward.stock >= 0 y, por recompensa, cantidad de redeems del ledger ==
+  cantidad de redemptions. (El stock inicial no se guarda: no se puede
+  verificar stock_inicial - canjes == stock.)
+
+Las violaciones salen como NDJSON (una por línea) a medida que se encuentran;
+el resumen va a stderr. Código de salida 1 si hubo violaciones.
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import multiprocessing as mp
+from collections import Counter
+
+from sqlalchemy import create_engine, event, select, func, and_, true
+
+from models import Customer, Transaction, Reward, Redemption
+
+
+MAIN = "main"
+_REWARD_REF = re.compile(r"^REWARD:(\d+)$")
+
+tx_t = Transaction.__table__
+cust_t = Customer.__table__
+
+# estado por proceso worker
+_engines = {}
+_reward_ids = frozenset()
+_pause = 0.0
+
+
+def _readonly_engine(uri: str):
+    eng = create_engine(uri)
+    is_pg = eng.dialect.name == "postgresql"
+    timeout_ms = int(os.getenv("INTEGRITY_STATEMENT_TIMEOUT_MS", "60000"))
+
+    @event.listens_for(eng, "connect")
+    def _ro(dbapi_conn, record):
+        cur = dbapi_conn.cursor()
+        if is_pg:
+            cur.execute("SET default_transaction_read_only = on")
+            cur.execute(f"SET statement_timeout = {timeout_ms}")
+            cur.execute("SET application_name = 'abetos-integrity'")
+            dbapi_conn.commit()
+        elif eng.dialect.name == "sqlite":
+            cur.execute("PRAGMA query_only = ON")
+        cur.close()
+
+    return eng
+
+
+def _init_worker(sources: dict, reward_ids: frozenset, pause: float) -> None:
+    global _engines, _reward_ids, _pause
+    _engines = {name: _readonly_engine(uri) for name, uri in sources.items()}
+    _reward_ids = reward_ids
+    _pause = pause
+
+
+# ------------------------------------------------------
+# Tareas (corren en los workers)
+# ------------------------------------------------------
+def _check_customers(lo: int, hi: int) -> dict:
+    """Saldos >= 0 y transactions huérfanas para customer_id en [lo, hi)."""
+    with _engines[MAIN].connect() as conn:
+        known = {cid for (cid,) in conn.execute(
+            select(cust_t.c.id).where(_between(cust_t.c.id, lo, hi))
+        )}
+
+    balances = Counter()
+    orphans = []
+    for name, eng in _engines.items():
+        with eng.connect() as conn:
+            rows = conn.execute(
+                select(tx_t.c.customer_id, func.sum(tx_t.c.points), func.count())
+                .where(_between(tx_t.c.customer_id, lo, hi))
+                .group_by(tx_t.c.customer_id)
+            ).all()
+        for cid, total, n in rows:
+            balances[cid] += int(total or 0)
+            if cid not in known:
+                orphans.append({"check": "orphan_transactions", "source": name,
+                                "customer_id": cid, "rows": n})
+
+    violations = orphans + [
+        {"check": "negative_balance", "customer_id": cid, "balance": bal}
+        for cid, bal in sorted(balances.items()) if bal < 0
+    ]
+    if _pause:
+        time.sleep(_pause)
+    return {"task": "customers", "range": [lo, hi], "violations": violations,
+            "customers": len(known), "redeems": {}}
+
+
+def _check_transactions(source: str, lo: int, hi: int) -> dict:
+    """Signo de puntos y referencia de recompensa para transactions.id en [lo, hi)."""
+    violations = []
+    redeems = Counter()
+    with _engines[source].connect() as conn:
+        rows = conn.execute(
+            select(tx_t.c.id, tx_t.c.customer_id, tx_t.c.kind, tx_t.c.points,
+                   tx_t.c.product_code, tx_t.c.reward_id)
+            .where(_between(tx_t.c.id, lo, hi))
+        )
+        n = 0
+        for tid, cid, kind, points, product_code, reward_id in rows:
+            n += 1
+            points = points or 0
+            base = {"source": source, "transaction_id": tid, "customer_id": cid}
+            if kind == Transaction.KIND_EARN:
+                if points < 0:
+                    violations.append({"check": "earn_negative_points", "points": points, **base})
+                continue
+
+            if points >= 0:
+                violations.append({"check": "redeem_non_negative_points", "points": points, **base})
+            m = _REWARD_REF.match(product_code or "")
+            if not m:
+                violations.append({"check": "redeem_bad_reference", "product_code": product_code, **base})
+                continue
+            rid = int(m.group(1))
+            if rid not in _reward_ids:
+                violations.append({"check": "redeem_unknown_reward", "reward_id": rid, **base})
+            elif reward_id is not None and reward_id != rid:
+                violations.append({"check": "redeem_reward_mismatch", "reward_id": reward_id,
+                                   "product_code": product_code, **base})
+            redeems[rid] += 1
+
+    if _pause:
+        time.sleep(_pause)
+    return {"task": "transactions", "source": source, "range": [lo, hi], "violations": violations,
+            "rows": n, "redeems": dict(redeems)}
+
+
+def _run_task(task: tuple) -> dict:
+    kind, *args = task
+    if kind == "customers":
+        return _check_customers(*args)
+    return _check_transactions(*args)
+
+
+# ------------------------------------------------------
+# Coordinador
+# ------------------------------------------------------
+def _ranges(conn, col, chunk: int) -> list:
+    """
+    Rangos [lo, hi) de ~chunk filas cada uno, con cortes tomados del índice
+    (keyset: cada paso recorre `chunk` entradas, sin OFFSET acumulado).
+    Los extremos quedan abiertos (None) para no perder ids fuera de la tabla.
+    """
+    cuts, last = [], None
+    while True:
+        stmt = select(col).order_by(col).offset(chunk).limit(1)
+        if last is not None:
+            stmt = stmt.where(col > last)
+        nxt = conn.execute(stmt).scalar()
+        if nxt is None:
+            break
+        cuts.append(nxt)
+        last = nxt
+    bounds = [None] + cuts + [None]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _between(col, lo, hi):
+    cond = []
+    if lo is not None:
+        cond.append(col >= lo)
+    if hi is not None:
+        cond.append(col < hi)
+    return and_(true(), *cond)
+
+
+def sources_from_app() -> dict:
+    """URIs ya resueltas por la app (rutas SQLite relativas incluidas): principal + shards."""
+    from app import create_app
+    from db import db
+    from sharding import BIND_PREFIX
+
+    app = create_app()
+    out = {}
+    with app.app_context():
+        for key, engine in db.engines.items():
+            if key is None:
+                out[MAIN] = engine.url.render_as_string(hide_password=False)
+            elif key.startswith(BIND_PREFIX):
+                out[key[len(BIND_PREFIX):]] = engine.url.render_as_string(hide_password=False)
+            engine.dispose()
+    return out
+
+
+def run(sources: dict, workers: int, chunk: int, pause_ms: int, out) -> int:
+    t0 = time.perf_counter()
+    main = _readonly_engine(sources[MAIN])
+
+    with main.connect() as conn:
+        rewards = {rid: stock for rid, stock in conn.execute(select(Reward.id, Reward.stock))}
+        redemptions = dict(conn.execute(
+            select(Redemption.reward_id, func.count()).group_by(Redemption.reward_id)
+        ).all())
+        tasks = [("customers", lo, hi) for lo, hi in _ranges(conn, cust_t.c.id, chunk)]
+
+    for name, uri in sources.items():
+        eng = main if name == MAIN else _readonly_engine(uri)
+        with eng.connect() as conn:
+            tasks += [("transactions", name, lo, hi) for lo, hi in _ranges(conn, tx_t.c.id, chunk)]
+        if eng is not main:
+            eng.dispose()
+    main.dispose()
+
+    total = Counter()
+    redeems = Counter()
+    scanned = Counter()
+
+    def emit(v):
+        total[v["check"]] += 1
+        out.write(json.dumps(v, ensure_ascii=False, default=str) + "\n")
+        out.flush()
+
+    ctx = mp.get_context("spawn")
+    with ctx.Pool(workers, initializer=_init_worker,
+                  initargs=(sources, frozenset(rewards), pause_ms / 1000.0)) as pool:
+        for done, res in enumerate(pool.imap_unordered(_run_task, tasks), 1):
+            for v in res["violations"]:
+                emit(v)
+            redeems.update(res["redeems"])
+            scanned["customers"] += res.get("customers", 0)
+            scanned["transactions"] += res.get("rows", 0)
+            if done % 50 == 0:
+                print(f"  {done}/{len(tasks)} rangos", file=sys.stderr)
+
+    for rid, stock in sorted(rewards.items()):
+        if stock is not None and stock < 0:
+            emit({"check": "negative_stock", "reward_id": rid, "stock": stock})
+        if redeems.get(rid, 0) != redemptions.get(rid, 0):
+            emit({"check": "redeem_count_mismatch", "reward_id": rid,
+                  "ledger_redeems": redeems.get(rid, 0), "redemptions": redemptions.get(rid, 0)})
+
+    secs = time.perf_counter() - t0
+    print(f"clientes {scanned['customers']}, transactions {scanned['transactions']}, "
+          f"{len(tasks)} rangos, {workers} procesos, {secs:.1f}s", file=sys.stderr)
+    if total:
+        print("violaciones: " + ", ".join(f"{k}={v}" for k, v in sorted(total.items())), file=sys.stderr)
+    else:
+        print("✅ sin violaciones", file=sys.stderr)
+    return 1 if total else 0
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Chequeo de integridad del ledger (solo lectura)")
+    ap.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    ap.add_argument("--chunk", type=int, default=50000, help="ids por rango")
+    ap.add_argument("--pause-ms", type=int, default=0, help="pausa entre rangos por worker")
+    ap.add_argument("--out", default=None, help="archivo NDJSON (default: stdout)")
+    args = ap.parse_args()
+
+    out = open(args.out, "w", encoding="utf-8") if args.out else sys.stdout
+    try:
+        code = run(sources_from_app(), max(1, args.workers), max(1, args.chunk), args.pause_ms, out)
+    finally:
+        if args.out:
+            out.close()
+    sys.exit(code)
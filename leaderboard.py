@@ -0,0 +1,322 @@
+# C:\Abetos_app\backend\leaderboard.py
+"""
+Leaderboard de clientes por período (mes) y por producto.
+
+- Cada Transaction "earn" que se inserta suma sus puntos en leaderboard_scores
+  dentro del MISMO flush/commit (listener after_insert, registrado por
+  create_app vía register()), así nunca hay que
+  agregar toda la tabla transactions para mostrar un ranking.
+- rebuild_period() recalcula un período completo desde transactions
+  (reconciliación periódica: `python leaderboard.py 2026-10`).
+- Con sharding por estación, cada shard tiene su propio leaderboard.
+"""
+import sys
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import event, func, select, delete, insert, update, literal
+
+from db import db
+from models import Transaction, LeaderboardScore, Customer
+
+
+ALL = LeaderboardScore.ALL_PRODUCTS
+
+
+def period_of(dt: Optional[datetime]) -> str:
+    return (dt or datetime.utcnow()).strftime("%Y-%m")
+
+
+def current_period() -> str:
+    return period_of(None)
+
+
+# ------------------------------------------------------
+# Upsert (sqlite / postgres soportan ON CONFLICT)
+# ------------------------------------------------------
+def _upsert_stmt(connection):
+    """INSERT ... ON CONFLICT que suma (sqlite / postgres) o None."""
+    dialect = connection.dialect.name
+    if dialect not in ("sqlite", "postgresql"):
+        return None
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as d_insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert as d_insert
+
+    tbl = LeaderboardScore.__table__
+    stmt = d_insert(tbl)
+    return stmt.on_conflict_do_update(
+        index_elements=[tbl.c.period, tbl.c.product_code, tbl.c.customer_id],
+        set_={
+            "points": tbl.c.points + stmt.excluded.points,
+            "liters": tbl.c.liters + stmt.excluded.liters,
+            "dispatches": tbl.c.dispatches + stmt.excluded.dispatches,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+
+
+def _upsert_score(connection, period: str, product_code: str, customer_id: int,
+                  points: int, liters: float, dispatches: int = 1) -> None:
+    tbl = LeaderboardScore.__table__
+    now = datetime.utcnow()
+    values = {
+        "period": period,
+        "product_code": product_code,
+        "customer_id": customer_id,
+        "points": points,
+        "liters": liters,
+        "dispatches": dispatches,
+        "updated_at": now,
+    }
+
+    stmt = _upsert_stmt(connection)
+    if stmt is not None:
+        connection.execute(stmt, values)
+        return
+
+    # fallback genérico: UPDATE y si no había fila, INSERT
+    res = connection.execute(
+        update(tbl)
+        .where(
+            tbl.c.period == period,
+            tbl.c.product_code == product_code,
+            tbl.c.customer_id == customer_id,
+        )
+        .values(
+            points=tbl.c.points + points,
+            liters=tbl.c.liters + liters,
+            dispatches=tbl.c.dispatches + dispatches,
+            updated_at=now,
+        )
+    )
+    if not res.rowcount:
+        connection.execute(insert(tbl).values(**values))
+
+
+def _on_transaction_insert(_mapper, connection, target):
+    if target.kind != Transaction.KIND_EARN:
+        return
+    points = int(target.points or 0)
+    if points <= 0:
+        return
+
+    period = period_of(target.created_at)
+    liters = float(target.liters or 0.0)
+
+    _upsert_score(connection, period, ALL, target.customer_id, points, liters)
+    pc = (target.product_code or "").strip()
+    if pc and pc != ALL:
+        _upsert_score(connection, period, pc, target.customer_id, points, liters)
+
+
+def add_many(connection, txs: list) -> None:
+    """
+    Equivalente al listener para inserts hechos por Core (ingesta de
+    despachos): agrega el lote por (período, producto, cliente) y hace un
+    solo executemany. txs: dicts con las columnas de transactions.
+    """
+    acc = {}
+    for t in txs:
+        points = int(t.get("points") or 0)
+        if t.get("kind") != Transaction.KIND_EARN or points <= 0:
+            continue
+        period = period_of(t.get("created_at"))
+        liters = float(t.get("liters") or 0.0)
+        pc = (t.get("product_code") or "").strip()
+        for product in ((ALL, pc) if pc and pc != ALL else (ALL,)):
+            key = (period, product, t["customer_id"])
+            a = acc.get(key)
+            acc[key] = (points, liters, 1) if a is None else (a[0] + points, a[1] + liters, a[2] + 1)
+    if not acc:
+        return
+
+    stmt = _upsert_stmt(connection)
+    if stmt is None:
+        for (period, product, cid), (points, liters, n) in acc.items():
+            _upsert_score(connection, period, product, cid, points, liters, n)
+        return
+
+    now = datetime.utcnow()
+    connection.execute(stmt, [
+        {"period": period, "product_code": product, "customer_id": cid, "points": points,
+         "liters": liters, "dispatches": n, "updated_at": now}
+        for (period, product, cid), (points, liters, n) in acc.items()
+    ])
+
+
+def register() -> None:
+    """Engancha el listener (idempotente; lo llama create_app)."""
+    if not event.contains(Transaction, "after_insert", _on_transaction_insert):
+        event.listen(Transaction, "after_insert", _on_transaction_insert)
+
+
+# ------------------------------------------------------
+# Consultas
+# ------------------------------------------------------
+def _session(station_id: Optional[str]):
+    # los puntajes viven junto al ledger de la estación (ver sharding.py)
+    from sharding import router
+    return router.session_for(station_id)
+
+
+def top_n(period: str, product_code: str = ALL, limit: int = 10,
+          station_id: Optional[str] = None) -> list:
+    """Top-N del período (usa ix_leaderboard_rank, no toca transactions)."""
+    rows = _session(station_id).execute(
+        select(
+            LeaderboardScore.customer_id,
+            LeaderboardScore.points,
+            LeaderboardScore.liters,
+            LeaderboardScore.dispatches,
+        )
+        .where(
+            LeaderboardScore.period == period,
+            LeaderboardScore.product_code == product_code,
+        )
+        .order_by(LeaderboardScore.points.desc(), LeaderboardScore.customer_id.asc())
+        .limit(limit)
+    ).all()
+
+    # nombres desde la DB principal (customers es global)
+    names = {}
+    if rows:
+        names = {
+            cid: (full_name, member_number)
+            for cid, full_name, member_number in db.session.execute(
+                select(Customer.id, Customer.full_name, Customer.member_number)
+                .where(Customer.id.in_([r.customer_id for r in rows]))
+            ).all()
+        }
+
+    return [{
+        "rank": i + 1,
+        "customer_id": r.customer_id,
+        "full_name": names.get(r.customer_id, (None, None))[0],
+        "member_number": names.get(r.customer_id, (None, None))[1],
+        "points": int(r.points or 0),
+        "liters": float(r.liters or 0.0),
+        "dispatches": int(r.dispatches or 0),
+    } for i, r in enumerate(rows)]
+
+
+def rank_of(customer_id: int, period: str, product_code: str = ALL,
+            station_id: Optional[str] = None) -> dict:
+    """
+    Posición de un cliente: 1 + cantidad de clientes con más puntos.
+    Empates comparten posición.
+    """
+    sess = _session(station_id)
+    score = sess.execute(
+        select(LeaderboardScore.points).where(
+            LeaderboardScore.period == period,
+            LeaderboardScore.product_code == product_code,
+            LeaderboardScore.customer_id == customer_id,
+        )
+    ).scalar()
+
+    total = sess.execute(
+        select(func.count()).select_from(LeaderboardScore).where(
+            LeaderboardScore.period == period,
+            LeaderboardScore.product_code == product_code,
+        )
+    ).scalar() or 0
+
+    if score is None:
+        return {"rank": None, "points": 0, "participants": int(total)}
+
+    ahead = sess.execute(
+        select(func.count()).select_from(LeaderboardScore).where(
+            LeaderboardScore.period == period,
+            LeaderboardScore.product_code == product_code,
+            LeaderboardScore.points > score,
+        )
+    ).scalar() or 0
+
+    return {"rank": int(ahead) + 1, "points": int(score), "participants": int(total)}
+
+
+# ------------------------------------------------------
+# Reconciliación
+# ------------------------------------------------------
+def _period_bounds(period: str):
+    start = datetime.strptime(period, "%Y-%m")
+    if start.month == 12:
+        end = start.replace(year=start.year + 1, month=1)
+    else:
+        end = start.replace(month=start.month + 1)
+    return start, end
+
+
+def rebuild_period(period: str, station_id: Optional[str] = None) -> int:
+    """
+    Recalcula el período desde transactions (INSERT ... SELECT ... GROUP BY)
+    en el shard de la estación. Devuelve la cantidad de filas escritas. Hace commit.
+    """
+    start, end = _period_bounds(period)
+    sess = _session(station_id)
+    tbl = LeaderboardScore.__table__
+    now = datetime.utcnow()
+
+    base_filter = (
+        # ni reintegros de canjes ni saldos iniciales: solo despachos
+        Transaction.dispatch_clause(),
+        Transaction.points > 0,
+        Transaction.created_at >= start,
+        Transaction.created_at < end,
+    )
+
+    cols = ["period", "product_code", "customer_id", "points", "liters", "dispatches", "updated_at"]
+
+    total_sel = (
+        select(
+            literal(period),
+            literal(ALL),
+            Transaction.customer_id,
+            func.sum(Transaction.points),
+            func.coalesce(func.sum(Transaction.liters), 0.0),
+            func.count(Transaction.id),
+            literal(now),
+        )
+        .where(*base_filter)
+        .group_by(Transaction.customer_id)
+    )
+    per_product_sel = (
+        select(
+            literal(period),
+            Transaction.product_code,
+            Transaction.customer_id,
+            func.sum(Transaction.points),
+            func.coalesce(func.sum(Transaction.liters), 0.0),
+            func.count(Transaction.id),
+            literal(now),
+        )
+        .where(*base_filter, Transaction.product_code.isnot(None), Transaction.product_code != "",
+               Transaction.product_code != ALL)
+        .group_by(Transaction.product_code, Transaction.customer_id)
+    )
+
+    try:
+        sess.execute(delete(tbl).where(tbl.c.period == period))
+        r1 = sess.execute(insert(tbl).from_select(cols, total_sel))
+        r2 = sess.execute(insert(tbl).from_select(cols, per_product_sel))
+        sess.commit()
+    except Exception:
+        sess.rollback()
+        raise
+    return int((r1.rowcount or 0) + (r2.rowcount or 0))
+
+
+if __name__ == "__main__":
+    from app import create_app
+
+    from sharding import router
+
+    periods = sys.argv[1:] or [current_period()]
+    app = create_app()
+    with app.app_context():
+        for st in router.stations():
+            for p in periods:
+                n = rebuild_period(p, st)
+                print(f"✅ Leaderboard {st} {p}: {n} filas")
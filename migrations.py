@@ -0,0 +1,199 @@
+# C:\Abetos_app\backend\migrations.py
+"""
+Migraciones versionadas (se corren UNA vez, fuera del arranque de workers).
+
+    python migrations.py            # aplica lo pendiente (principal + shards)
+    python migrations.py status     # versión actual de cada DB
+
+Cada DB (principal y cada shard de estación) guarda su versión en
+schema_migrations. Las migraciones son idempotentes: una DB creada antes de
+este esquema arranca en 0 y las corre todas sin romper nada.
+
+Para agregar una migración: sumar una tupla al final de MIGRATIONS.
+"""
+import sys
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import Table, Column, Integer, String, DateTime, MetaData, select, insert, func
+
+from db import db
+import sharding
+
+
+_md = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _md,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(100), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+# ------------------------------------------------------
+# Migraciones: fn(engine, is_shard)
+# ------------------------------------------------------
+def _m001_baseline(engine, is_shard):
+    import models  # noqa: F401  (registra todas las tablas)
+    if is_shard:
+        sharding.shard_metadata().create_all(engine)
+    else:
+        db.metadata.create_all(engine)
+
+
+def _m002_station_columns(engine, is_shard):
+    sharding.ensure_station_columns(engine)
+
+
+def _m003_customers_created_at_index(engine, is_shard):
+    if is_shard:
+        return
+    from models import Customer
+    ix = next(i for i in Customer.__table__.indexes if i.name == "ix_customers_created_at")
+    ix.create(engine, checkfirst=True)
+
+
+def _m004_customer_segments(engine, is_shard):
+    if is_shard:
+        return
+    from models import CustomerSegment
+    CustomerSegment.__table__.create(engine, checkfirst=True)
+
+
+def _m005_customer_tiers(engine, is_shard):
+    if is_shard:
+        return
+    from sqlalchemy import inspect, text
+    from models import CustomerTierBucket
+
+    cols = {c["name"] for c in inspect(engine).get_columns("customers")}
+    with engine.begin() as conn:
+        for name, ddl in (
+            ("tier", "VARCHAR(10) NOT NULL DEFAULT 'base'"),
+            ("tier_liters_90d", "FLOAT NOT NULL DEFAULT 0"),
+            ("tier_spend_90d", "FLOAT NOT NULL DEFAULT 0"),
+            ("tier_since", "TIMESTAMP"),
+        ):
+            if name not in cols:
+                conn.execute(text(f"ALTER TABLE customers ADD COLUMN {name} {ddl}"))
+    CustomerTierBucket.__table__.create(engine, checkfirst=True)
+
+
+def _m006_product_prices(engine, is_shard):
+    if is_shard:
+        return
+    from models import ProductPrice
+    ProductPrice.__table__.create(engine, checkfirst=True)
+
+
+def _m007_ingest_offsets(engine, is_shard):
+    import models  # noqa: F401
+    if is_shard:
+        sharding.shard_metadata().tables["ingest_offsets"].create(engine, checkfirst=True)
+    else:
+        models.IngestOffset.__table__.create(engine, checkfirst=True)
+
+
+def _m008_cache_versions(engine, is_shard):
+    if is_shard:
+        return
+    from models import CacheVersion
+    CacheVersion.__table__.create(engine, checkfirst=True)
+
+
+def _m009_opening_balance_marker(engine, is_shard):
+    # saldos iniciales importados antes del marcador: earn sin producto con la nota de bulk_import
+    from sqlalchemy import update
+    from models import Transaction
+    from bulk_import import OPENING_NOTE
+
+    t = Transaction.__table__
+    with engine.begin() as conn:
+        conn.execute(
+            update(t)
+            .where(t.c.kind == Transaction.KIND_EARN, t.c.product_code.is_(None), t.c.note == OPENING_NOTE)
+            .values(product_code=Transaction.OPENING_CODE)
+        )
+
+
+def _m010_cache_version_keys(engine, is_shard):
+    # una fila por clave desde el arranque: touch() nunca compite por el primer INSERT
+    if is_shard:
+        return
+    from models import CacheVersion
+    from cachebus import KEYS
+
+    t = CacheVersion.__table__
+    with engine.begin() as conn:
+        have = set(conn.execute(select(t.c.key)).scalars())
+        missing = [{"key": k, "version": 0, "updated_at": datetime.utcnow()} for k in KEYS if k not in have]
+        if missing:
+            conn.execute(insert(t), missing)
+
+
+MIGRATIONS = [
+    (1, "baseline", _m001_baseline),
+    (2, "station_id columns", _m002_station_columns),
+    (3, "ix_customers_created_at", _m003_customers_created_at_index),
+    (4, "customer_segments", _m004_customer_segments),
+    (5, "customer tiers", _m005_customer_tiers),
+    (6, "product_prices", _m006_product_prices),
+    (7, "ingest_offsets", _m007_ingest_offsets),
+    (8, "cache_versions", _m008_cache_versions),
+    (9, "opening balance marker", _m009_opening_balance_marker),
+    (10, "cache_versions keys", _m010_cache_version_keys),
+]
+
+
+# ------------------------------------------------------
+# Runner
+# ------------------------------------------------------
+def _targets():
+    """[(nombre, engine, is_shard)] para la app actual."""
+    out = [("main", db.engine, False)]
+    for st in current_app.config.get("STATION_SHARDS", []):
+        out.append((st, db.engines[sharding.BIND_PREFIX + st], True))
+    return out
+
+
+def current_version(engine) -> int:
+    _md.create_all(engine)
+    with engine.connect() as conn:
+        return int(conn.execute(select(func.coalesce(func.max(schema_migrations.c.version), 0))).scalar())
+
+
+def upgrade(verbose: bool = False) -> dict:
+    """Aplica migraciones pendientes en cada DB. Devuelve {db: versión final}."""
+    out = {}
+    for name, engine, is_shard in _targets():
+        version = current_version(engine)
+        for num, title, fn in MIGRATIONS:
+            if num <= version:
+                continue
+            fn(engine, is_shard)
+            with engine.begin() as conn:
+                conn.execute(insert(schema_migrations).values(
+                    version=num, name=title, applied_at=datetime.utcnow(),
+                ))
+            version = num
+            if verbose:
+                print(f"   {name}: {num:03d} {title}")
+        out[name] = version
+    return out
+
+
+def status() -> dict:
+    return {name: current_version(engine) for name, engine, _ in _targets()}
+
+
+if __name__ == "__main__":
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        if sys.argv[1:] == ["status"]:
+            for name, v in status().items():
+                print(f"   {name}: versión {v} (última {MIGRATIONS[-1][0]})")
+        else:
+            res = upgrade(verbose=True)
+            print("✅ Migraciones aplicadas:", ", ".join(f"{k}={v}" for k, v in res.items()))
@@ -2,7 +2,7 @@
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 from sqlalchemy.ext.hybrid import hybrid_property
-from sqlalchemy import CheckConstraint, UniqueConstraint, func, select
+from sqlalchemy import CheckConstraint, UniqueConstraint, func, select, and_, or_
 from db import db
 
 
@@ -16,6 +16,9 @@ class User(db.Model):
     ROLE_CLERK = "clerk"
     ROLE_CUSTOMER = "customer"
 
+    # usuarios importados en bloque: sin contraseña hasta el primer ingreso
+    UNUSABLE_PASSWORD = "!"
+
     id = db.Column(db.Integer, primary_key=True)
 
     full_name = db.Column(db.String(120))
@@ -48,8 +51,14 @@ class User(db.Model):
         self.password_hash = generate_password_hash(raw)
 
     def check_password(self, raw: str) -> bool:
+        if not self.has_usable_password:
+            return False
         return check_password_hash(self.password_hash, raw)
 
+    @property
+    def has_usable_password(self) -> bool:
+        return bool(self.password_hash) and self.password_hash != self.UNUSABLE_PASSWORD
+
 
 # ------------------------------------------------------
 # Customers
@@ -66,7 +75,15 @@ class Customer(db.Model):
     phone = db.Column(db.String(40))
     member_number = db.Column(db.String(30), unique=True)
 
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # indexado: /admin/customers/summary ordena por created_at
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    # nivel por litros de los últimos 90 días (lo mantiene tiers.py)
+    TIER_BASE = "base"
+    tier = db.Column(db.String(10), nullable=False, default=TIER_BASE, server_default=TIER_BASE)
+    tier_liters_90d = db.Column(db.Float, nullable=False, default=0.0, server_default="0")
+    tier_spend_90d = db.Column(db.Float, nullable=False, default=0.0, server_default="0")
+    tier_since = db.Column(db.DateTime)
 
     user = db.relationship("User", back_populates="customer", lazy=True)
 
@@ -107,10 +124,27 @@ class Transaction(db.Model):
     KIND_EARN = "earn"
     KIND_REDEEM = "redeem"
 
+    # earn que NO son despachos (marcados en product_code)
+    REFUND_PREFIX = "REFUND:"   # reintegro de canje rechazado: "REFUND:<redemption_id>" (redemptions.py)
+    OPENING_CODE = "OPENING"    # saldo inicial migrado (bulk_import.py)
+
     __table_args__ = (
         CheckConstraint("kind IN ('earn','redeem')", name="ck_transactions_kind"),
     )
 
+    @classmethod
+    def dispatch_clause(cls, table=None):
+        """
+        WHERE de "es un despacho": earn que no es reintegro ni saldo inicial.
+        Lo usan los recálculos desde el ledger (leaderboard, sketches, segments, tiers).
+        """
+        c = (cls.__table__ if table is None else table).c
+        return and_(
+            c.kind == cls.KIND_EARN,
+            or_(c.product_code.is_(None),
+                and_(~c.product_code.startswith(cls.REFUND_PREFIX), c.product_code != cls.OPENING_CODE)),
+        )
+
     id = db.Column(db.Integer, primary_key=True)
 
     customer_id = db.Column(db.Integer, db.ForeignKey("customers.id"), nullable=False, index=True)
@@ -142,6 +176,9 @@ class Transaction(db.Model):
     reward_id = db.Column(db.Integer, db.ForeignKey("rewards.id"), nullable=True, index=True)
     reward = db.relationship("Reward", lazy=True)
 
+    # estación donde se operó (define el shard donde vive la fila)
+    station_id = db.Column(db.String(20), nullable=True, index=True)
+
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
 
@@ -165,9 +202,31 @@ class EarningRule(db.Model):
     unit = db.Column(db.String(20), nullable=False)  # LITERS | CURRENCY
     points_per_unit = db.Column(db.Float, nullable=False, default=0.0)
     is_active = db.Column(db.Boolean, default=True, index=True)
+    # NULL = regla general; con valor = regla propia de esa estación (tiene prioridad)
+    station_id = db.Column(db.String(20), nullable=True, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
 
+# ------------------------------------------------------
+# Precios por producto con vigencia (prices.py)
+# ------------------------------------------------------
+class ProductPrice(db.Model):
+    __tablename__ = "product_prices"
+
+    __table_args__ = (
+        UniqueConstraint("product_code", "station_id", "effective_from", name="uq_product_price_from"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    product_code = db.Column(db.String(50), nullable=False, index=True)
+    # NULL = precio general; con valor = precio propio de esa estación (tiene prioridad)
+    station_id = db.Column(db.String(20), nullable=True)
+    unit_price = db.Column(db.Float, nullable=False)          # $ por litro / m3
+    effective_from = db.Column(db.DateTime, nullable=False)   # vigente desde (UTC)
+    created_by_user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
 # ------------------------------------------------------
 # Rewards
 # ------------------------------------------------------
@@ -221,4 +280,148 @@ class Redemption(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
     customer = db.relationship("Customer", back_populates="redemptions", lazy=True)
-    reward = db.relationship("Reward", back_populates="redemptions", lazy=True)
\ No newline at end of file
+    reward = db.relationship("Reward", back_populates="redemptions", lazy=True)
+
+# ------------------------------------------------------
+# Leaderboard (puntajes por período, mantenidos incrementalmente)
+# ------------------------------------------------------
+class LeaderboardScore(db.Model):
+    __tablename__ = "leaderboard_scores"
+
+    # product_code = "*" acumula todos los productos del período
+    ALL_PRODUCTS = "*"
+
+    period = db.Column(db.String(7), primary_key=True)         # "YYYY-MM"
+    product_code = db.Column(db.String(50), primary_key=True)
+    customer_id = db.Column(db.Integer, db.ForeignKey("customers.id"), primary_key=True)
+
+    points = db.Column(db.Integer, nullable=False, default=0)
+    liters = db.Column(db.Float, nullable=False, default=0.0)
+    dispatches = db.Column(db.Integer, nullable=False, default=0)
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # índice "covering" para top-N y para contar cuántos tienen más puntos (rank)
+    __table_args__ = (
+        db.Index("ix_leaderboard_rank", "period", "product_code", "points", "customer_id"),
+    )
+
+
+# ------------------------------------------------------
+# Tokens revocados (JWT)
+# ------------------------------------------------------
+class RevokedToken(db.Model):
+    __tablename__ = "revoked_tokens"
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    # jti = NULL -> revoca TODOS los tokens del usuario emitidos antes de revoked_at
+    jti = db.Column(db.String(64), unique=True, nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True, index=True)
+
+    reason = db.Column(db.String(200))
+    revoked_by_user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=True)
+
+    revoked_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # a partir de acá el registro ya no hace falta (el token venció solo)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+# ------------------------------------------------------
+# Outbox (eventos a publicar, escritos en la misma transacción)
+# ------------------------------------------------------
+class OutboxEvent(db.Model):
+    __tablename__ = "outbox_events"
+
+    TOPIC_TRANSACTION = "transaction.created"
+    TOPIC_REDEMPTION = "redemption.changed"
+    TOPIC_TIER = "customer.tier_changed"
+
+    # el relay borra filas ya enviadas: en SQLite los ids no se reutilizan así
+    # (outbox_id sirve para deduplicar del lado del consumidor)
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = db.Column(db.Integer, primary_key=True)
+    topic = db.Column(db.String(50), nullable=False)
+    aggregate_id = db.Column(db.Integer)          # id de la fila de origen
+    payload = db.Column(db.Text, nullable=False)  # JSON
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# ------------------------------------------------------
+# Sketches diarios (HLL de clientes, cuantiles de litros/$) por producto
+# ------------------------------------------------------
+class DailySketch(db.Model):
+    __tablename__ = "daily_sketches"
+
+    METRIC_CUSTOMERS = "customers"        # HyperLogLog
+    METRIC_LITERS = "liters"              # DDSketch (cuantiles)
+    METRIC_AMOUNT = "amount_pesos"        # DDSketch (cuantiles)
+
+    day = db.Column(db.Date, primary_key=True)
+    product_code = db.Column(db.String(50), primary_key=True)   # "*" = todos
+    metric = db.Column(db.String(20), primary_key=True)
+
+    data = db.Column(db.LargeBinary, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+# ------------------------------------------------------
+# Segmentos RFM (los recalcula el job segments.py)
+# ------------------------------------------------------
+class CustomerSegment(db.Model):
+    __tablename__ = "customer_segments"
+
+    customer_id = db.Column(db.Integer, db.ForeignKey("customers.id"), primary_key=True)
+
+    recency_days = db.Column(db.Integer, nullable=False)    # días desde el último despacho
+    frequency = db.Column(db.Integer, nullable=False)       # cantidad de despachos
+    monetary = db.Column(db.Float, nullable=False)          # $ total
+    liters = db.Column(db.Float, nullable=False)
+
+    # puntajes por quintil (5 = mejor)
+    r_score = db.Column(db.SmallInteger, nullable=False)
+    f_score = db.Column(db.SmallInteger, nullable=False)
+    m_score = db.Column(db.SmallInteger, nullable=False)
+
+    segment = db.Column(db.String(20), nullable=False, index=True)
+    computed_at = db.Column(db.DateTime, nullable=False)
+
+
+# ------------------------------------------------------
+# Litros / $ por cliente y día dentro de la ventana de niveles (tiers.py)
+# ------------------------------------------------------
+class CustomerTierBucket(db.Model):
+    __tablename__ = "customer_tier_buckets"
+
+    customer_id = db.Column(db.Integer, db.ForeignKey("customers.id"), primary_key=True)
+    day = db.Column(db.Date, primary_key=True, index=True)
+
+    liters = db.Column(db.Float, nullable=False, default=0.0)
+    spend = db.Column(db.Float, nullable=False, default=0.0)
+
+
+# ------------------------------------------------------
+# Checkpoints de la ingesta de surtidores (forecourt.py); vive junto al
+# ledger de la estación: se commitea en la misma transacción que el lote
+# ------------------------------------------------------
+class IngestOffset(db.Model):
+    __tablename__ = "ingest_offsets"
+
+    source = db.Column(db.String(200), primary_key=True)   # "file:/var/feed/disp.log" | "tcp:0.0.0.0:9100"
+    file_id = db.Column(db.String(64))                      # dev:inode del archivo (detecta rotación)
+    offset = db.Column(db.BigInteger, nullable=False, default=0)
+    seq = db.Column(db.BigInteger)                          # último seq del controlador (si lo manda)
+    dispatches = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# ------------------------------------------------------
+# Versiones de caches en memoria (cachebus.py): una fila por clave
+# ------------------------------------------------------
+class CacheVersion(db.Model):
+    __tablename__ = "cache_versions"
+
+    key = db.Column(db.String(50), primary_key=True)        # rules | rewards | customers | prices
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
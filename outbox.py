@@ -0,0 +1,110 @@
+# C:\Abetos_app\backend\outbox.py
+"""
+Outbox transaccional: cada Transaction insertada y cada cambio de estado de
+una Redemption deja una fila en outbox_events en el MISMO commit.
+
+- ORM: listeners after_insert/after_update (registrados por create_app).
+- UPDATEs hechos con Core (ej. redeem_codes.mark_used) llaman emit() a mano;
+  los masivos (redemptions.transition) usan emit_many().
+
+El relay (eventlog.py) mueve esas filas a un log append-only en disco y las
+borra; los consumidores leen el log, no la DB.
+"""
+import json
+from datetime import datetime
+
+from sqlalchemy import event, insert, inspect
+
+from models import Transaction, Redemption, OutboxEvent
+
+
+def _iso(dt):
+    return dt.isoformat() if dt else None
+
+
+def transaction_payload(t) -> dict:
+    return {
+        "id": t.id,
+        "station_id": t.station_id,
+        "customer_id": t.customer_id,
+        "kind": t.kind,
+        "points": t.points,
+        "product_code": t.product_code,
+        "liters": t.liters,
+        "amount_pesos": t.amount_pesos,
+        "operator_user_id": t.operator_user_id,
+        "reward_id": t.reward_id,
+        "ticket_number": t.ticket_number,
+        "created_at": _iso(t.created_at),
+    }
+
+
+def redemption_payload(r) -> dict:
+    return {
+        "id": r.id,
+        "customer_id": r.customer_id,
+        "reward_id": r.reward_id,
+        "points_spent": r.points_spent,
+        "status": r.status,
+        "created_at": _iso(r.created_at),
+    }
+
+
+def emit(conn, topic: str, aggregate_id, payload: dict) -> None:
+    """
+    Encola un evento. `conn` puede ser una Connection (listeners) o una
+    Session: lo importante es que sea la misma transacción que el cambio.
+    """
+    conn.execute(
+        insert(OutboxEvent.__table__).values(
+            topic=topic,
+            aggregate_id=aggregate_id,
+            payload=json.dumps(payload, separators=(",", ":"), default=str),
+            created_at=datetime.utcnow(),
+        )
+    )
+
+
+def emit_many(conn, topic: str, events: list) -> None:
+    """Como emit() para muchos eventos [(aggregate_id, payload)] en un executemany."""
+    if not events:
+        return
+    now = datetime.utcnow()
+    conn.execute(insert(OutboxEvent.__table__), [{
+        "topic": topic,
+        "aggregate_id": aggregate_id,
+        "payload": json.dumps(payload, separators=(",", ":"), default=str),
+        "created_at": now,
+    } for aggregate_id, payload in events])
+
+
+# ------------------------------------------------------
+# Listeners ORM
+# ------------------------------------------------------
+def _on_transaction_insert(_mapper, connection, target):
+    emit(connection, OutboxEvent.TOPIC_TRANSACTION, target.id, transaction_payload(target))
+
+
+def _on_redemption_insert(_mapper, connection, target):
+    emit(connection, OutboxEvent.TOPIC_REDEMPTION, target.id, redemption_payload(target))
+
+
+def _on_redemption_update(_mapper, connection, target):
+    # solo cambios de estado (no cuando se completa el code, por ejemplo)
+    if not inspect(target).attrs.status.history.has_changes():
+        return
+    emit(connection, OutboxEvent.TOPIC_REDEMPTION, target.id, redemption_payload(target))
+
+
+_LISTENERS = [
+    (Transaction, "after_insert", _on_transaction_insert),
+    (Redemption, "after_insert", _on_redemption_insert),
+    (Redemption, "after_update", _on_redemption_update),
+]
+
+
+def register() -> None:
+    """Engancha los listeners (idempotente; lo llama create_app)."""
+    for target, name, fn in _LISTENERS:
+        if not event.contains(target, name, fn):
+            event.listen(target, name, fn)
@@ -0,0 +1,65 @@
+# C:\Abetos_app\backend\prefork.py
+"""
+Pre-calentamiento en el master de gunicorn (--preload), ANTES del fork.
+
+- configura los mappers de SQLAlchemy y ejecuta una vez las consultas calientes
+  (regla por producto, cliente por DNI, saldo, catálogo, usuario por email) para
+  que el cache de SQL compilado quede armado en el master;
+- cierra las conexiones del pool (los hijos no deben heredar sockets);
+- gc.freeze(): los objetos creados hasta acá no vuelven a ser recorridos por el
+  GC, así las páginas quedan compartidas copy-on-write entre workers.
+
+Se llama desde gunicorn.conf.py; post_fork() descarta el pool heredado.
+"""
+import gc
+
+from sqlalchemy import func
+from sqlalchemy.orm import configure_mappers
+
+from db import db
+
+
+def _hot_queries() -> None:
+    from models import User, Customer, Reward, EarningRule
+    from rules import find_rule
+    from sharding import router
+
+    product_codes = [
+        pc for (pc,) in db.session.query(EarningRule.product_code)
+        .filter(EarningRule.is_active.is_(True)).distinct().all()
+    ]
+    for pc in product_codes or ["-"]:
+        find_rule(pc)
+        for st in router.stations():
+            find_rule(pc, st)
+
+    Customer.query.filter_by(doc_number="").first()
+    Customer.query.filter_by(user_id=0).first()
+    User.query.filter(func.lower(User.email) == "").first()
+    db.session.get(User, 0)
+    Reward.query.order_by(Reward.required_points.asc()).limit(1).all()
+    router.balance(0)
+    router.balances([0])
+
+
+def warmup(app) -> None:
+    with app.app_context():
+        configure_mappers()
+        try:
+            _hot_queries()
+        finally:
+            db.session.remove()
+
+        # el master no debe quedarse con conexiones abiertas
+        for engine in db.engines.values():
+            engine.dispose()
+
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(app) -> None:
+    """En el worker: pool nuevo, sin cerrar los sockets del padre."""
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
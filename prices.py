@@ -0,0 +1,200 @@
+# C:\Abetos_app\backend\prices.py
+"""
+Precios por producto con vigencia (product_prices) y derivación de litros.
+
+- Cada fila: product_code, station_id (NULL = general), unit_price y
+  effective_from. El precio vigente en un instante es el de la fila con
+  mayor effective_from <= instante; si la estación tiene precios propios,
+  tienen prioridad sobre los generales.
+- PriceBook: por proceso, una línea de tiempo por (producto, estación) con
+  los effective_from ordenados (búsqueda con bisect). Además guarda el último
+  tramo [desde, hasta) encontrado en cada línea: una acreditación en vivo cae
+  casi siempre en ese tramo y se resuelve en O(1) sin bisect.
+- Se recarga completa cada PRICE_CACHE_TTL_SEC (default 60) o cuando el
+  cachebus avisa un cambio en product_prices (desde cualquier worker).
+
+Backfill de transacciones viejas sin litros (earn con amount_pesos):
+
+    python prices.py backfill [--batch 5000] [--dry-run]
+"""
+import os
+import sys
+import time
+import threading
+from bisect import bisect_right
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select, update, bindparam
+
+from db import db
+from models import ProductPrice, Transaction
+from cachebus import bus, PRICES
+
+
+TTL_SEC = float(os.getenv("PRICE_CACHE_TTL_SEC", "60"))
+BACKFILL_BATCH = 5000
+LITERS_DECIMALS = 4  # igual que accredit-by-dni
+
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _epoch(dt: datetime) -> float:
+    return (dt - _EPOCH).total_seconds()  # naive UTC, como el resto de la DB
+
+
+class _Timeline:
+    __slots__ = ("starts", "prices", "cur")
+
+    def __init__(self, points: list):
+        points.sort()
+        self.starts = [p[0] for p in points]
+        self.prices = [p[1] for p in points]
+        self.cur = None  # (desde, hasta | None, precio); una tupla: se reemplaza atómicamente
+
+    def at(self, ts: float) -> Optional[float]:
+        cur = self.cur
+        if cur is not None and cur[0] <= ts and (cur[1] is None or ts < cur[1]):
+            return cur[2]
+
+        i = bisect_right(self.starts, ts) - 1
+        if i < 0:
+            return None
+        # el tramo encontrado queda cacheado: en vivo casi siempre es el mismo
+        # (también si hay un precio futuro ya cargado: el tramo termina ahí)
+        until = self.starts[i + 1] if i + 1 < len(self.starts) else None
+        self.cur = (self.starts[i], until, self.prices[i])
+        return self.prices[i]
+
+
+class PriceBook:
+    def __init__(self, ttl_sec: float = TTL_SEC):
+        self.ttl_sec = ttl_sec
+        self._lines = {}          # (product_code, station_id | None) -> _Timeline
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        rows = db.session.execute(
+            select(ProductPrice.product_code, ProductPrice.station_id,
+                   ProductPrice.effective_from, ProductPrice.unit_price)
+        ).all()
+        points = {}
+        for pc, st, eff, price in rows:
+            points.setdefault((pc, st), []).append((_epoch(eff), float(price)))
+        lines = {key: _Timeline(p) for key, p in points.items()}
+        with self._lock:
+            self._lines = lines
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self) -> None:
+        self._loaded_at = None
+
+    def _ensure(self) -> None:
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl_sec:
+            self.load()
+
+    def price_at(self, product_code: str, station_id: Optional[str] = None,
+                 at: Optional[datetime] = None, _loaded: bool = False) -> Optional[float]:
+        """$ por unidad vigente (None si no hay precio cargado para ese momento)."""
+        if not _loaded:
+            self._ensure()
+        ts = time.time() if at is None else _epoch(at)
+        pc = (product_code or "").strip()
+        st = (station_id or "").strip() or None
+
+        lines = self._lines
+        if st is not None:
+            own = lines.get((pc, st))
+            price = own.at(ts) if own is not None else None
+            if price is not None:
+                return price
+        general = lines.get((pc, None))
+        return general.at(ts) if general is not None else None
+
+    def liters_for(self, product_code: str, amount_pesos, station_id: Optional[str] = None,
+                   at: Optional[datetime] = None, _loaded: bool = False):
+        """(litros, precio) derivados de un monto, o (None, None) sin precio."""
+        if amount_pesos is None or amount_pesos <= 0:
+            return None, None
+        price = self.price_at(product_code, station_id, at, _loaded=_loaded)
+        if not price or price <= 0:
+            return None, None
+        return round(float(amount_pesos) / price, LITERS_DECIMALS), price
+
+
+# Instancia única por proceso
+price_book = PriceBook()
+bus.subscribe(PRICES, lambda _key: price_book.invalidate())
+
+
+# ------------------------------------------------------
+# Backfill de transactions sin litros
+# ------------------------------------------------------
+def backfill(batch: int = BACKFILL_BATCH, dry_run: bool = False) -> dict:
+    """
+    Recorre cada DB de ledger por id (keyset) y completa liters/unit_price de
+    los earn con amount_pesos y sin litros. Un commit por lote.
+    """
+    from sharding import router
+
+    price_book.load()
+    t = Transaction.__table__
+    stmt = (
+        update(t)
+        .where(t.c.id == bindparam("tid"), t.c.liters.is_(None))
+        .values(liters=bindparam("liters"), unit_price=bindparam("price"))
+    )
+    stats = {"scanned": 0, "updated": 0, "no_price": 0}
+
+    for sess in router.ledger_sessions():
+        last_id = 0
+        while True:
+            rows = sess.execute(
+                select(t.c.id, t.c.product_code, t.c.station_id, t.c.amount_pesos, t.c.created_at)
+                .where(t.c.id > last_id, t.c.kind == Transaction.KIND_EARN,
+                       t.c.liters.is_(None), t.c.amount_pesos.isnot(None))
+                .order_by(t.c.id)
+                .limit(batch)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            params = []
+            for r in rows:
+                liters, price = price_book.liters_for(r.product_code, r.amount_pesos, r.station_id,
+                                                      r.created_at, _loaded=True)
+                if liters is None:
+                    stats["no_price"] += 1
+                    continue
+                params.append({"tid": r.id, "liters": liters, "price": price})
+
+            stats["scanned"] += len(rows)
+            if params and not dry_run:
+                sess.execute(stmt, params)
+                sess.commit()
+            else:
+                sess.rollback()
+            stats["updated"] += len(params)
+    return stats
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if not args or args[0] != "backfill":
+        print("uso: python prices.py backfill [--batch N] [--dry-run]")
+        sys.exit(2)
+
+    size = int(args[args.index("--batch") + 1]) if "--batch" in args else BACKFILL_BATCH
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        t0 = time.perf_counter()
+        res = backfill(batch=size, dry_run="--dry-run" in args)
+    print(f"✅ Backfill de litros en {time.perf_counter() - t0:.1f} s:",
+          ", ".join(f"{k}={v}" for k, v in res.items()))
+    if res["updated"] and "--dry-run" not in args:
+        print("   (los niveles no se enteran de litros retroactivos: correr `python tiers.py rebuild`)")
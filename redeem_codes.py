@@ -0,0 +1,113 @@
+# C:\Abetos_app\backend\redeem_codes.py
+"""
+Códigos de canje firmados (HMAC), validables en caja sin consultar la DB.
+
+Formato (27 chars base64url, entra en Redemption.code String(30)):
+    payload = redemption_id (u32) | reward_id (u32) | exp (u32, epoch seg)
+    sig     = HMAC-SHA256(SECRET, "redeem:" + payload)[:8]
+    code    = b64(payload + sig)
+
+La firma prueba autenticidad (el contenido lo generó el backend); que el canje
+no se haya usado lo resuelve un único UPDATE condicional (ver mark_used).
+"""
+import os
+import sys
+import hmac
+import time
+import struct
+import hashlib
+from typing import Optional
+
+from email_utils import SECRET, _b64, _unb64
+
+
+_PAYLOAD = struct.Struct(">III")
+_SIG_LEN = 8
+_DOMAIN = b"redeem:"
+_KEY = SECRET.encode("utf-8")
+
+CODE_TTL_SEC = int(os.getenv("REDEEM_CODE_TTL_SEC", str(7 * 24 * 3600)))
+
+
+def _sign(data: bytes) -> bytes:
+    return hmac.new(_KEY, _DOMAIN + data, hashlib.sha256).digest()[:_SIG_LEN]
+
+
+def generate_code(redemption_id: int, reward_id: int, ttl_sec: int = CODE_TTL_SEC) -> str:
+    exp = int(time.time()) + int(ttl_sec)
+    data = _PAYLOAD.pack(int(redemption_id), int(reward_id), exp)
+    return _b64(data + _sign(data))
+
+
+def verify_code(code: str, now: Optional[int] = None) -> dict:
+    """
+    Valida firma y vencimiento (solo CPU, sin DB).
+    Devuelve {"redemption_id", "reward_id", "exp"} o lanza ValueError.
+    """
+    code = (code or "").strip()
+    try:
+        raw = _unb64(code)
+    except Exception:
+        raise ValueError("código malformado")
+
+    if len(raw) != _PAYLOAD.size + _SIG_LEN:
+        raise ValueError("código malformado")
+
+    data, sig = raw[:_PAYLOAD.size], raw[_PAYLOAD.size:]
+    if not hmac.compare_digest(sig, _sign(data)):
+        raise ValueError("firma inválida")
+
+    redemption_id, reward_id, exp = _PAYLOAD.unpack(data)
+    now = int(time.time()) if now is None else int(now)
+    if now > exp:
+        raise ValueError("código expirado")
+
+    return {"redemption_id": redemption_id, "reward_id": reward_id, "exp": exp}
+
+
+def mark_used(session, code: str) -> Optional[dict]:
+    """
+    Valida el código y lo consume con un solo UPDATE ... WHERE status='pending'.
+    Devuelve el payload, o None si ya se usó / no existe. Lanza ValueError si
+    el código es inválido. No hace commit.
+    """
+    from models import Redemption
+
+    payload = verify_code(code)
+    res = session.execute(
+        Redemption.__table__.update()
+        .where(
+            Redemption.id == payload["redemption_id"],
+            Redemption.reward_id == payload["reward_id"],
+            Redemption.code == code.strip(),
+            Redemption.status == Redemption.STATUS_PENDING,
+        )
+        .values(status=Redemption.STATUS_APPROVED)
+    )
+    if res.rowcount != 1:
+        return None
+
+    # el UPDATE es Core (no dispara listeners ORM): evento al outbox a mano
+    from models import OutboxEvent
+    import outbox
+
+    outbox.emit(session, OutboxEvent.TOPIC_REDEMPTION, payload["redemption_id"], {
+        "id": payload["redemption_id"],
+        "reward_id": payload["reward_id"],
+        "status": Redemption.STATUS_APPROVED,
+    })
+    return payload
+
+
+if __name__ == "__main__":
+    # Benchmark: validaciones por segundo (solo CPU)
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    codes = [generate_code(i + 1, (i % 50) + 1) for i in range(1000)]
+
+    t0 = time.perf_counter()
+    for i in range(n):
+        verify_code(codes[i % 1000])
+    dt = time.perf_counter() - t0
+
+    print(f"✅ {n} validaciones en {dt:.3f}s -> {n / dt:,.0f} validaciones/s")
+    print(f"   largo del código: {len(codes[0])} chars (ej: {codes[0]})")
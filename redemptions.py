@@ -0,0 +1,175 @@
+# C:\Abetos_app\backend\redemptions.py
+"""
+Aprobación / rechazo masivo de canjes pendientes.
+
+- Listado de pendientes con paginación keyset (id > after_id), sin OFFSET.
+- Transición pending -> approved | rejected con UPDATE ... WHERE status='pending'
+  ... RETURNING: la condición de estado hace que dos operadores (o el mismo
+  canje usado en caja con redeem_codes.mark_used) no puedan pasarlo dos veces.
+- Rechazo: en la MISMA transacción, un reintegro por canje en el ledger
+  (earn +points_spent, product_code "REFUND:<redemption_id>") y el stock
+  devuelto con un UPDATE por recompensa.
+- Todo es Core (no dispara listeners ORM): los eventos al outbox se emiten a
+  mano en bloque. El reintegro no suma al leaderboard ni a los sketches.
+
+Los canjes y su ledger (station_id NULL) viven en la DB principal.
+
+Variables: REDEMPTION_BULK_MAX (default 10000) tope de canjes por llamada.
+"""
+import os
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select, update, insert, bindparam
+
+from models import Redemption, Reward, Transaction, OutboxEvent
+import outbox
+import cachebus
+
+
+BULK_MAX = int(os.getenv("REDEMPTION_BULK_MAX", "10000"))
+ID_CHUNK = 5000  # ids por UPDATE (límite de parámetros de SQLite)
+REFUND_PREFIX = Transaction.REFUND_PREFIX
+
+_ACTIONS = {"approve": Redemption.STATUS_APPROVED, "reject": Redemption.STATUS_REJECTED}
+
+
+def _filters(reward_id=None, customer_id=None, created_from=None, created_to=None) -> list:
+    t = Redemption.__table__
+    out = [t.c.status == Redemption.STATUS_PENDING]
+    if reward_id is not None:
+        out.append(t.c.reward_id == reward_id)
+    if customer_id is not None:
+        out.append(t.c.customer_id == customer_id)
+    if created_from is not None:
+        out.append(t.c.created_at >= created_from)
+    if created_to is not None:
+        out.append(t.c.created_at < created_to)
+    return out
+
+
+def list_pending(session, after_id: int = 0, limit: int = 100, **filters) -> dict:
+    """Página de pendientes ordenada por id; next_after_id = None si no hay más."""
+    t = Redemption.__table__
+    rows = session.execute(
+        select(t.c.id, t.c.customer_id, t.c.reward_id, t.c.points_spent, t.c.code, t.c.created_at)
+        .where(t.c.id > after_id, *_filters(**filters))
+        .order_by(t.c.id)
+        .limit(limit + 1)
+    ).all()
+
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "items": [{
+            "id": r.id,
+            "customer_id": r.customer_id,
+            "reward_id": r.reward_id,
+            "points_spent": r.points_spent,
+            "code": r.code,
+            "created_at": r.created_at.isoformat() if r.created_at else None,
+        } for r in rows],
+        "next_after_id": rows[-1].id if more else None,
+    }
+
+
+def _update_returning(session, where: list, status: str) -> list:
+    t = Redemption.__table__
+    cols = (t.c.id, t.c.customer_id, t.c.reward_id, t.c.points_spent)
+    stmt = update(t).where(*where).values(status=status)
+
+    if session.get_bind().dialect.update_returning:
+        return session.execute(stmt.returning(*cols)).all()
+
+    # sin RETURNING (p.ej. MySQL): leer con lock y actualizar esos ids
+    rows = session.execute(select(*cols).where(*where).with_for_update()).all()
+    if rows:
+        session.execute(update(t).where(t.c.id.in_([r.id for r in rows]),
+                                        t.c.status == Redemption.STATUS_PENDING).values(status=status))
+    return rows
+
+
+def transition(session, action: str, ids=None, limit: Optional[int] = None,
+               operator_id: Optional[int] = None, **filters) -> dict:
+    """
+    Pasa a approved/rejected los pendientes de `ids` (lista) o, si ids es None,
+    los que cumplan los filtros (como mucho `limit`, en orden de id).
+    Los que ya no estaban pendientes se ignoran. No hace commit.
+    """
+    status = _ACTIONS[action]
+    t = Redemption.__table__
+    limit = min(limit or BULK_MAX, BULK_MAX)
+
+    rows = []
+    if ids is not None:
+        ids = sorted({int(i) for i in ids})
+        if len(ids) > BULK_MAX:
+            raise ValueError(f"máximo {BULK_MAX} ids por llamada")
+        for i in range(0, len(ids), ID_CHUNK):
+            rows += _update_returning(session, [t.c.id.in_(ids[i:i + ID_CHUNK]), *_filters(**filters)], status)
+    else:
+        picked = select(t.c.id).where(*_filters(**filters)).order_by(t.c.id).limit(limit).scalar_subquery()
+        rows += _update_returning(session, [t.c.id.in_(picked), t.c.status == Redemption.STATUS_PENDING], status)
+
+    rows.sort(key=lambda r: r.id)
+    outbox.emit_many(session, OutboxEvent.TOPIC_REDEMPTION, [
+        (r.id, {"id": r.id, "customer_id": r.customer_id, "reward_id": r.reward_id,
+                "points_spent": r.points_spent, "status": status})
+        for r in rows
+    ])
+
+    refunded = 0
+    if status == Redemption.STATUS_REJECTED and rows:
+        refunded = _compensate(session, rows, operator_id)
+
+    return {
+        "status": status,
+        "updated": len(rows),
+        "ids": [r.id for r in rows],
+        "refunded_points": refunded,
+    }
+
+
+def _compensate(session, rows: list, operator_id: Optional[int]) -> int:
+    """Reintegro de puntos y stock para canjes rechazados (mismo commit)."""
+    now = datetime.utcnow()
+    tx_t = Transaction.__table__
+    refunds = [{
+        "customer_id": r.customer_id,
+        "kind": Transaction.KIND_EARN,
+        "points": int(r.points_spent),
+        "product_code": f"{REFUND_PREFIX}{r.id}",
+        "reward_id": r.reward_id,
+        "note": f"Reintegro canje #{r.id} rechazado",
+        "operator_user_id": operator_id,
+        "paid_with_app": False,
+        "created_at": now,
+    } for r in rows]
+
+    if session.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order:
+        tx_ids = list(session.execute(
+            insert(tx_t).returning(tx_t.c.id, sort_by_parameter_order=True), refunds
+        ).scalars())
+    else:
+        tx_ids = [session.execute(insert(tx_t).values(**row)).inserted_primary_key[0] for row in refunds]
+
+    outbox.emit_many(session, OutboxEvent.TOPIC_TRANSACTION, [
+        (tid, {"id": tid, "station_id": None, "customer_id": row["customer_id"], "kind": row["kind"],
+               "points": row["points"], "product_code": row["product_code"], "liters": None,
+               "amount_pesos": None, "operator_user_id": operator_id, "reward_id": row["reward_id"],
+               "ticket_number": None, "created_at": now.isoformat()})
+        for tid, row in zip(tx_ids, refunds)
+    ])
+
+    per_reward = {}
+    for r in rows:
+        per_reward[r.reward_id] = per_reward.get(r.reward_id, 0) + 1
+    rw = Reward.__table__
+    session.execute(
+        update(rw)
+        .where(rw.c.id == bindparam("rid"), rw.c.stock.isnot(None))
+        .values(stock=rw.c.stock + bindparam("n")),
+        [{"rid": rid, "n": n} for rid, n in per_reward.items()],
+    )
+    cachebus.mark(session, cachebus.REWARDS)
+    return sum(row["points"] for row in refunds)
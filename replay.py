@@ -0,0 +1,538 @@
+# C:\Abetos_app\backend\replay.py
+"""
+Re-ejecuta tráfico capturado (capture.py) contra una instancia de staging y
+compara latencias entre dos builds.
+
+    # 1) contra un build levantado acá mismo (SQLite temporal + seed + fixtures)
+    python replay.py run instance/capture --serve ../build_a --out a.ndjson [--speedup 10]
+    python replay.py run instance/capture --serve ../build_b --out b.ndjson [--speedup 10]
+    python replay.py compare a.ndjson b.ndjson
+
+    # 2) contra un staging ya levantado (mismo SECRET_KEY/JWT que el que prepara)
+    python replay.py prepare instance/capture --out fixtures.json      # con la DB de staging en el env
+    python replay.py run instance/capture --target http://staging:5000 --fixtures fixtures.json --out a.ndjson
+
+Opciones de run: --day YYYY-MM-DD (un día de la captura), --speedup N
+(default 1), --threads N (default 32), --workers N (procesos con --serve,
+default 4), --limit N.
+
+- Tiempos: cada request sale en (ts - ts_inicial) / speedup desde el arranque;
+  el atraso respecto de ese horario queda en "lag_ms".
+- Orden por cliente: los requests de un mismo actor (usuario del JWT) o, sin
+  JWT, del mismo DNI van siempre al mismo hilo y en orden de captura.
+- Fixtures: cada token de la captura (actor, DNI, email) se mapea a un usuario
+  o cliente sintético de staging, todos con la misma contraseña; los actores
+  llevan un JWT emitido al preparar, que se reemplaza con el de cada login
+  reproducido. Los actores que se registran durante la captura no se crean
+  de antemano: su alta y su login se reproducen en orden en su misma fila.
+  Los ids numéricos en rutas se envían tal cual.
+"""
+import os
+import sys
+import glob
+import gzip
+import json
+import time
+import zlib
+import socket
+import signal
+import tempfile
+import threading
+import subprocess
+import http.client
+from datetime import datetime
+from urllib.parse import urlsplit, urlencode
+
+
+REPLAY_PASSWORD = "Replay123"
+DNI_BASE = 90000000
+DEFAULT_THREADS = 32
+TOKEN_KINDS = ("dni:", "e:", "x:", "u:")
+
+
+# ------------------------------------------------------
+# Lectura de capturas
+# ------------------------------------------------------
+def _files(paths: list) -> list:
+    out = []
+    for p in paths:
+        if os.path.isdir(p):
+            out.extend(sorted(glob.glob(os.path.join(p, "capture-*.ndjson*"))))
+        else:
+            out.append(p)
+    return out
+
+
+def _lines(path: str):
+    """Tolera el final truncado de un gzip que se sigue escribiendo."""
+    if not path.endswith(".gz"):
+        with open(path, "rb") as fh:
+            yield from fh
+        return
+    d, buf = zlib.decompressobj(16 + zlib.MAX_WBITS), b""
+    with open(path, "rb") as fh:
+        while True:
+            chunk = fh.read(1 << 16)
+            if not chunk:
+                break
+            try:
+                buf += d.decompress(chunk)
+            except zlib.error:
+                break
+            if d.eof:  # miembros concatenados (archivo reabierto en modo "ab")
+                rest, d = d.unused_data, zlib.decompressobj(16 + zlib.MAX_WBITS)
+                buf += d.decompress(rest) if rest else b""
+            *full, buf = buf.split(b"\n")
+            yield from full
+
+
+def load(paths: list, day: str = None, limit: int = None) -> list:
+    records = []
+    for path in _files(paths):
+        for line in _lines(path):
+            if not line.strip():
+                continue
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue  # última línea a medio escribir
+            if day and datetime.utcfromtimestamp(rec["ts"]).date().isoformat() != day:
+                continue
+            records.append(rec)
+    records.sort(key=lambda r: r["ts"])
+    return records[:limit] if limit else records
+
+
+# ------------------------------------------------------
+# Fixtures
+# ------------------------------------------------------
+def _tokens(obj, out: set) -> None:
+    if isinstance(obj, dict):
+        for v in obj.values():
+            _tokens(v, out)
+    elif isinstance(obj, list):
+        for v in obj:
+            _tokens(v, out)
+    elif isinstance(obj, str) and obj.startswith(TOKEN_KINDS):
+        out.add(obj)
+
+
+def plan(records: list) -> dict:
+    """Qué identidades necesita staging: {"actors": {tok: {...}}, "dnis": [...], "emails": [...]}."""
+    actors, seen, registered = {}, set(), set()
+    for r in records:
+        _tokens(r.get("body"), seen)
+        _tokens(r.get("query"), seen)
+        for part in r["path"].split("/"):
+            if part.startswith(TOKEN_KINDS):
+                seen.add(part)
+
+        body = r.get("body") or {}
+        if r.get("rule") == "/api/auth/register":
+            registered.update(v for v in (body.get("doc_number"), body.get("email")) if v)
+        actor = r.get("actor")
+        if actor and actor.startswith("u:"):
+            a = actors.setdefault(actor, {"role": r.get("role") or "customer", "dni": None, "email": None})
+            if r.get("role"):
+                a["role"] = r["role"]
+            # un login exitoso dice qué DNI / email es de este actor
+            if r.get("rule") == "/api/auth/login" and r.get("status") == 200:
+                a["dni"] = a["dni"] or body.get("doc_number")
+                a["email"] = a["email"] or body.get("email")
+
+    # actores que se dan de alta durante la captura: no se crean de antemano
+    # (su register tiene que funcionar); el JWT sale de su login en el replay
+    for a in actors.values():
+        a["deferred"] = bool({a["dni"], a["email"]} & registered)
+
+    owned = {a["dni"] for a in actors.values()} | {a["email"] for a in actors.values()}
+    return {
+        "actors": actors,
+        "dnis": sorted(t for t in seen if t.startswith("dni:") and t not in owned and t not in registered),
+        "emails_registered": sorted(t for t in registered if t.startswith("e:")),
+        "dnis_registered": sorted(t for t in registered if t.startswith("dni:")),
+    }
+
+
+def prepare(records: list) -> dict:
+    """Crea usuarios/clientes sintéticos (app context) y devuelve los mapeos + JWTs."""
+    from flask_jwt_extended import create_access_token
+    from werkzeug.security import generate_password_hash
+    from db import db
+    from models import User, Customer
+
+    p = plan(records)
+    pw_hash = generate_password_hash(REPLAY_PASSWORD)  # un solo hash para todos
+    next_dni = [DNI_BASE + (db.session.query(db.func.count(Customer.id)).scalar() or 0)]
+
+    def new_dni() -> str:
+        next_dni[0] += 1
+        return str(next_dni[0])
+
+    values, actors, lanes = {}, {}, {}
+    for tok, a in sorted(p["actors"].items()):
+        for t in (a["dni"], a["email"]):
+            if t:
+                lanes[t] = tok  # su alta/login va en la misma fila que el resto del actor
+        if a["deferred"]:
+            actors[tok] = {"role": a["role"], "jwt": None}
+            continue
+
+        email = f"{tok[2:]}@replay.local"
+        u = User(email=email, role=a["role"], is_verified=True, full_name=f"Replay {tok[2:8]}",
+                 password_hash=pw_hash)
+        db.session.add(u)
+        db.session.flush()
+        dni = new_dni()
+        db.session.add(Customer(user_id=u.id, full_name=u.full_name, doc_number=dni, member_number=f"R{dni}"))
+        for t, v in ((a["dni"], dni), (a["email"], email)):
+            if t:
+                values[t] = v
+        actors[tok] = {"role": a["role"],
+                       "jwt": create_access_token(identity=str(u.id),
+                                                  additional_claims={"role": a["role"], "email": email})}
+
+    for i, tok in enumerate(p["dnis"]):
+        u = User(email=None, role=User.ROLE_CUSTOMER, is_verified=False, full_name=f"Replay {tok[4:10]}",
+                 password_hash=pw_hash)
+        db.session.add(u)
+        db.session.flush()
+        dni = new_dni()
+        db.session.add(Customer(user_id=u.id, full_name=u.full_name, doc_number=dni, member_number=f"R{dni}"))
+        values[tok] = dni
+
+    # altas de la captura: valores libres para que el register de staging funcione
+    for tok in p["dnis_registered"]:
+        values.setdefault(tok, new_dni())
+    for tok in p["emails_registered"]:
+        values.setdefault(tok, f"{tok[2:]}@replay.local")
+
+    db.session.commit()
+    return {"actors": actors, "values": values, "lanes": lanes, "password": REPLAY_PASSWORD}
+
+
+# ------------------------------------------------------
+# Reescritura de requests
+# ------------------------------------------------------
+def _value(v, fx: dict):
+    if isinstance(v, dict):
+        return {k: _value(x, fx) for k, x in v.items()}
+    if isinstance(v, list):
+        return [_value(x, fx) for x in v]
+    if v == "***":
+        return fx["password"]
+    if isinstance(v, str) and v.startswith(TOKEN_KINDS):
+        got = fx["values"].get(v)
+        if got is not None:
+            return got
+        kind, _, digest = v.partition(":")
+        if kind == "dni":
+            return str(DNI_BASE - 1 - int(digest[:7], 16) % 1000000)  # inexistente, estable
+        if kind == "e":
+            return f"{digest}@unknown.replay.local"
+        return digest
+    return v
+
+
+def build_request(rec: dict, fx: dict, jwts: dict):
+    """(método, url relativa, body bytes | None, headers)."""
+    # el login queda con la identidad de staging del actor (email/DNI mapeados)
+    body = _value(rec.get("body"), fx) if rec.get("body") is not None else None
+    jwt = jwts.get(rec.get("actor") or "")
+
+    path = "/".join(_value(part, fx) if part.startswith(TOKEN_KINDS) else part for part in rec["path"].split("/"))
+    if rec.get("query"):
+        path += "?" + urlencode(_value(rec["query"], fx))
+
+    headers = {"Accept-Encoding": "gzip"}
+    if jwt and rec.get("rule") != "/api/auth/login":
+        headers["Authorization"] = "Bearer " + jwt
+    data = None
+    if body is not None:
+        data = json.dumps(body).encode("utf-8")
+        headers["Content-Type"] = "application/json"
+    elif rec.get("body_bytes"):
+        data = b"\0" * rec["body_bytes"]  # body no capturado: mismo tamaño
+        headers["Content-Type"] = "application/octet-stream"
+    return rec["m"], path, data, headers
+
+
+def lane(rec: dict, lanes: dict) -> str:
+    """Clave de orden: actor o, sin JWT, el DNI/email del request (o el actor dueño)."""
+    if rec.get("actor"):
+        return rec["actor"]
+    for src in (rec.get("body"), rec.get("query")):
+        if isinstance(src, dict):
+            for k in ("doc_number", "dni", "doc", "email"):
+                if src.get(k):
+                    return lanes.get(src[k], src[k])
+    return "anon:%d" % (hash(rec["path"]) % DEFAULT_THREADS)
+
+
+def _login_jwt(resp_body: bytes, encoding: str):
+    try:
+        if encoding == "gzip":
+            resp_body = gzip.decompress(resp_body)
+        return json.loads(resp_body).get("access_token")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+# ------------------------------------------------------
+# Ejecución
+# ------------------------------------------------------
+def run(records: list, fx: dict, base_url: str, speedup: float = 1.0, threads: int = DEFAULT_THREADS) -> list:
+    url = urlsplit(base_url)
+    queues = [[] for _ in range(threads)]
+    lanes = fx.get("lanes") or {}
+    for i, rec in enumerate(records):
+        queues[hash(lane(rec, lanes)) % threads].append((i, rec))
+
+    # JWT vigente por actor: el de fixtures, reemplazado por cada login del replay
+    jwts = {tok: a["jwt"] for tok, a in fx["actors"].items() if a.get("jwt")}
+
+    t0_cap = records[0]["ts"] if records else 0.0
+    results = [None] * len(records)
+    start = time.perf_counter() + 0.5  # margen para que arranquen todos los hilos
+
+    def worker(items):
+        conn = None
+        for i, rec in items:
+            due = start + (rec["ts"] - t0_cap) / speedup
+            wait = due - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            method, path, data, headers = build_request(rec, fx, jwts)
+            sent = time.perf_counter()
+            try:
+                if conn is None:
+                    conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=60)
+                conn.request(method, path, body=data, headers=headers)
+                resp = conn.getresponse()
+                payload = resp.read()
+                status = resp.status
+                if status == 200 and rec.get("actor") and rec.get("rule") == "/api/auth/login":
+                    jwts[rec["actor"]] = _login_jwt(payload, resp.getheader("Content-Encoding", "")) \
+                        or jwts.get(rec["actor"])
+                if resp.getheader("Connection", "").lower() == "close":
+                    conn.close()
+                    conn = None
+            except (OSError, http.client.HTTPException):
+                status = 0
+                if conn is not None:
+                    conn.close()
+                conn = None
+            done = time.perf_counter()
+            results[i] = {"i": i, "rule": rec.get("rule") or rec["path"], "m": method, "status": status,
+                          "cap_status": rec.get("status"), "ms": round((done - sent) * 1000, 3),
+                          "cap_ms": rec.get("ms"), "lag_ms": round(max(0.0, sent - due) * 1000, 3)}
+        if conn is not None:
+            conn.close()
+
+    ths = [threading.Thread(target=worker, args=(q,), daemon=True) for q in queues if q]
+    for th in ths:
+        th.start()
+    for th in ths:
+        th.join()
+    return results
+
+
+# ------------------------------------------------------
+# Staging local (--serve): subprocess con el código del build
+# ------------------------------------------------------
+def _serve_main(src: str, db_uri: str, workers: int, captures: list, day: str, limit: int, fx_out: str) -> None:
+    """Corre con cwd=src: seed + fixtures y luego N workers forkeados sobre un socket."""
+    sys.path.insert(0, src)
+    os.environ["SQLALCHEMY_DATABASE_URI"] = db_uri
+    os.environ.setdefault("LOGIN_THROTTLE", "off")  # todo el tráfico viene de 127.0.0.1
+    os.environ.setdefault("CAPTURE", "off")
+
+    import seed
+    seed.main()
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        fx = prepare(load(captures, day, limit))
+    with open(fx_out, "w") as fh:
+        json.dump(fx, fh)
+
+    from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+    class Quiet(WSGIRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive: los hilos de replay reusan conexión
+
+        def log(self, *a, **k):
+            pass
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(512)
+    port = sock.getsockname()[1]
+
+    from db import db
+    with app.app_context():
+        db.engine.dispose()  # cada worker abre sus conexiones
+
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            srv = BaseWSGIServer("127.0.0.1", 0, app, handler=Quiet, fd=sock.fileno())
+            srv.serve_forever()
+            os._exit(0)
+        children.append(pid)
+
+    print(f"PORT {port}", flush=True)
+
+    def stop(*_):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+        os._exit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    for pid in children:
+        os.waitpid(pid, 0)
+
+
+def _serve(src: str, workers: int, captures: list, day: str, limit: int):
+    tmp = tempfile.mkdtemp(prefix="replay-")
+    fx_path = os.path.join(tmp, "fixtures.json")
+    cmd = [sys.executable, os.path.abspath(__file__), "_serve", os.path.abspath(src),
+           f"sqlite:///{os.path.join(tmp, 'staging.db')}", str(workers), fx_path,
+           day or "-", str(limit or 0), *[os.path.abspath(c) for c in captures]]
+    proc = subprocess.Popen(cmd, cwd=src, stdout=subprocess.PIPE, text=True)
+    port = None
+    for line in proc.stdout:
+        if line.startswith("PORT "):
+            port = int(line.split()[1])
+            break
+    if port is None:
+        proc.wait()
+        raise SystemExit(f"❌ no arrancó el build de {src} (exit {proc.returncode})")
+    with open(fx_path) as fh:
+        fx = json.load(fh)
+    return proc, f"http://127.0.0.1:{port}", fx
+
+
+# ------------------------------------------------------
+# Comparación
+# ------------------------------------------------------
+def _pct(xs: list, p: float) -> float:
+    return xs[min(len(xs) - 1, int(len(xs) * p))] if xs else float("nan")
+
+
+def summarize(results: list) -> dict:
+    by_rule = {}
+    for r in results:
+        by_rule.setdefault(f'{r["m"]} {r["rule"]}', []).append(r["ms"])
+    by_rule["TOTAL"] = [r["ms"] for r in results]
+    out = {}
+    for k, xs in by_rule.items():
+        xs.sort()
+        out[k] = {"n": len(xs), "p50": _pct(xs, .50), "p95": _pct(xs, .95), "p99": _pct(xs, .99)}
+    return out
+
+
+def compare(a: list, b: list, out=sys.stdout) -> None:
+    sa, sb = summarize(a), summarize(b)
+    print(f"{'ruta':<48}{'n':>7}  {'p50 A':>8} {'p50 B':>8} {'Δ':>7}  {'p95 A':>8} {'p95 B':>8} {'Δ':>7}"
+          f"  {'p99 A':>8} {'p99 B':>8} {'Δ':>7}", file=out)
+    keys = sorted((k for k in sa if k in sb and k != "TOTAL"), key=lambda k: -sa[k]["n"]) + ["TOTAL"]
+    for k in keys:
+        x, y = sa[k], sb[k]
+        cells = []
+        for p in ("p50", "p95", "p99"):
+            delta = (y[p] - x[p]) / x[p] * 100 if x[p] else float("nan")
+            cells.append(f"{x[p]:8.1f} {y[p]:8.1f} {delta:+6.0f}%")
+        print(f"{k[:47]:<48}{x['n']:>7}  " + "  ".join(cells), file=out)
+
+    diff = sum(1 for x, y in zip(a, b) if x["status"] != y["status"])
+    for label, res in (("A", a), ("B", b)):
+        lag = sorted(r["lag_ms"] for r in res)
+        errs = sum(1 for r in res if r["status"] == 0 or r["status"] >= 500)
+        print(f"{label}: {len(res)} requests, 5xx/errores {errs}, lag p99 {_pct(lag, .99):.1f} ms", file=out)
+    print(f"status distinto entre A y B: {diff}", file=out)
+
+
+def _read_results(path: str) -> list:
+    with open(path) as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+def _opt(args: list, name: str, default=None):
+    if name in args:
+        i = args.index(name)
+        val = args[i + 1]
+        del args[i:i + 2]
+        return val
+    return default
+
+
+if __name__ == "__main__":
+    argv = sys.argv[1:]
+    cmd = argv.pop(0) if argv else ""
+
+    if cmd == "_serve":
+        src, db_uri, workers, fx_out, day, limit, *caps = argv
+        _serve_main(src, db_uri, int(workers), caps, None if day == "-" else day, int(limit) or None, fx_out)
+
+    elif cmd == "compare" and len(argv) == 2:
+        compare(_read_results(argv[0]), _read_results(argv[1]))
+
+    elif cmd == "prepare" and argv:
+        out = _opt(argv, "--out", "fixtures.json")
+        day = _opt(argv, "--day")
+        from app import create_app
+
+        app = create_app()
+        with app.app_context():
+            fx = prepare(load(argv, day))
+        with open(out, "w") as fh:
+            json.dump(fx, fh)
+        print(f"✅ Fixtures: {len(fx['actors'])} actores, {len(fx['values'])} valores -> {out}")
+
+    elif cmd == "run" and argv:
+        out = _opt(argv, "--out", "replay.ndjson")
+        target, src = _opt(argv, "--target"), _opt(argv, "--serve")
+        fx_path, day = _opt(argv, "--fixtures"), _opt(argv, "--day")
+        speedup = float(_opt(argv, "--speedup", "1"))
+        threads = int(_opt(argv, "--threads", str(DEFAULT_THREADS)))
+        workers = int(_opt(argv, "--workers", "4"))
+        limit = int(_opt(argv, "--limit", "0")) or None
+        if bool(target) == bool(src) or (target and not fx_path):
+            raise SystemExit("uso: replay.py run CAPTURAS (--target URL --fixtures F | --serve DIR) [opciones]")
+
+        records = load(argv, day, limit)
+        if not records:
+            raise SystemExit("❌ captura vacía")
+        proc = None
+        if src:
+            proc, target, fx = _serve(src, workers, argv, day, limit)
+        else:
+            with open(fx_path) as fh:
+                fx = json.load(fh)
+        try:
+            span = (records[-1]["ts"] - records[0]["ts"]) / speedup
+            print(f"▶ {len(records)} requests, {span:.1f} s a x{speedup:g} contra {target}")
+            t = time.perf_counter()
+            results = run(records, fx, target, speedup, threads)
+            wall = time.perf_counter() - t
+        finally:
+            if proc is not None:
+                proc.terminate()
+                proc.wait(10)
+        with open(out, "w") as fh:
+            for r in results:
+                fh.write(json.dumps(r) + "\n")
+        s = summarize(results)["TOTAL"]
+        print(f"✅ {len(results)} requests en {wall:.1f} s: p50 {s['p50']:.1f} ms  p95 {s['p95']:.1f} ms  "
+              f"p99 {s['p99']:.1f} ms -> {out}")
+
+    else:
+        print(__doc__)
+        sys.exit(2)
@@ -0,0 +1,241 @@
+# C:\Abetos_app\backend\revocation.py
+"""
+Revocación de JWT por jti (o de todos los tokens de un usuario).
+
+- Persistencia: tabla revoked_tokens.
+- Cada worker mantiene en memoria un set de jti revocados y un dict
+  user_id -> corte (tokens con iat anterior quedan revocados). Los dos se
+  reemplazan juntos, ya armados: un request nunca ve un estado a medio cargar.
+- El chequeo por request (token_in_blocklist_loader) NO consulta la DB:
+  solo compara contra memoria y hace un os.stat() del archivo "stamp".
+  (Excepción: el primer request del proceso hace la carga inicial si no la
+  heredó del master.)
+- Las recargas las hace un hilo vigía por proceso (como cachebus.py):
+  * cuando un worker revoca, toca el stamp; el vigía de los demás lo ve (el
+    request que nota el cambio lo despierta; si no hay requests, cada
+    REVOCATION_STAMP_POLL_SEC) y carga solo las filas nuevas (id > último visto);
+  * cada REVOCATION_POLL_SEC segundos recarga la tabla completa (solo filas
+    no vencidas; cubre varios hosts contra la misma DB). 0 = desactivado.
+- El worker que revoca carga su propia revocación en el acto.
+"""
+import os
+import time
+import logging
+import calendar
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select
+
+from db import db
+from models import RevokedToken
+
+
+log = logging.getLogger("revocation")
+
+
+def _epoch(dt: datetime) -> float:
+    return calendar.timegm(dt.utctimetuple()) + dt.microsecond / 1e6
+
+
+class Denylist:
+    def __init__(self, stamp_path: Optional[str] = None, poll_sec: Optional[float] = None,
+                 stamp_poll_sec: Optional[float] = None):
+        self.stamp_path = stamp_path if stamp_path is not None else os.getenv(
+            "REVOCATION_STAMP_FILE",
+            os.path.join(tempfile.gettempdir(), "abetos_revocation.stamp"),
+        )
+        self.poll_sec = float(os.getenv("REVOCATION_POLL_SEC", "30") if poll_sec is None else poll_sec)
+        self.stamp_poll_sec = float(os.getenv("REVOCATION_STAMP_POLL_SEC", "0.5")
+                                    if stamp_poll_sec is None else stamp_poll_sec)
+
+        # (jti -> expires_at, user_id -> (corte, expires_at)) en epoch; se reemplaza entero
+        self._state = ({}, {})
+        self._last_id = 0
+        self._stamp = None
+        self._loaded_at = None
+        self._thread = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()        # una carga a la vez (vigía / revocación local)
+        self._start_lock = threading.Lock()
+
+    # ---------- stamp (versión compartida entre workers) ----------
+    def _read_stamp(self):
+        if not self.stamp_path:
+            return None
+        try:
+            return os.stat(self.stamp_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _touch_stamp(self) -> None:
+        if not self.stamp_path:
+            return
+        try:
+            with open(self.stamp_path, "a"):
+                pass
+            now_ns = time.time_ns()
+            os.utime(self.stamp_path, ns=(now_ns, now_ns))
+        except OSError:
+            pass
+
+    # ---------- carga ----------
+    def _load(self, conn, full: bool = False) -> None:
+        """Arma el estado nuevo aparte y lo publica de una vez."""
+        now = datetime.utcnow()
+        with self._lock:
+            if full:
+                # recarga completa: cubre ids confirmados fuera de orden entre workers
+                jtis, user_cutoff, last_id = {}, {}, 0
+            else:
+                jtis, user_cutoff = dict(self._state[0]), dict(self._state[1])
+                last_id = self._last_id
+
+            t = RevokedToken.__table__
+            rows = conn.execute(
+                select(t.c.id, t.c.jti, t.c.user_id, t.c.revoked_at, t.c.expires_at)
+                .where(t.c.id > last_id, t.c.expires_at > now)
+                .order_by(t.c.id.asc())
+            ).all()
+            for rid, jti, user_id, revoked_at, expires_at in rows:
+                exp = _epoch(expires_at)
+                if jti:
+                    jtis[jti] = exp
+                elif user_id is not None:
+                    cutoff = _epoch(revoked_at)
+                    prev = user_cutoff.get(user_id)
+                    if not prev or cutoff > prev[0]:
+                        user_cutoff[user_id] = (cutoff, exp)
+                last_id = max(last_id, rid)
+
+            # limpia lo vencido (el token ya no es válido de todas formas)
+            now_e = _epoch(now)
+            self._state = (
+                {j: e for j, e in jtis.items() if e > now_e},
+                {u: v for u, v in user_cutoff.items() if v[1] > now_e},
+            )
+            self._last_id = last_id
+
+    def _reload(self, engine, full: bool) -> None:
+        stamp = self._read_stamp()  # antes de leer: un cambio posterior se vuelve a ver
+        with engine.connect() as conn:
+            self._load(conn, full=full)
+        self._stamp = stamp
+        if full:
+            self._loaded_at = time.monotonic()
+
+    # ---------- hilo vigía ----------
+    def _start(self) -> None:
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            engine = db.engine
+            if self._loaded_at is None:
+                self._reload(engine, full=True)  # una vez por proceso
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, args=(engine,),
+                                            name="revocation", daemon=True)
+            self._thread.start()
+
+    def _watch(self, engine) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.stamp_poll_sec)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            full = self._loaded_at is None or (
+                self.poll_sec > 0 and time.monotonic() - self._loaded_at >= self.poll_sec
+            )
+            if full or self._read_stamp() != self._stamp:
+                try:
+                    self._reload(engine, full=full)
+                except Exception:
+                    log.exception("revocation: no se pudo recargar revoked_tokens")
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._thread = None
+
+    def _after_fork(self) -> None:
+        # el hilo no sobrevive al fork (gunicorn --preload): el estado sí
+        self._thread = None
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._wake = threading.Event()
+
+    # ---------- API ----------
+    def is_revoked(self, jwt_payload: dict) -> bool:
+        if self._thread is None:
+            self._start()
+        elif self._read_stamp() != self._stamp:
+            self._wake.set()  # otro worker revocó: el vigía recarga ya
+
+        jtis, user_cutoff = self._state
+
+        jti = jwt_payload.get("jti")
+        if jti and jti in jtis:
+            return True
+
+        if user_cutoff:
+            try:
+                uid = int(jwt_payload.get("sub"))
+            except (TypeError, ValueError):
+                return False
+            cut = user_cutoff.get(uid)
+            if cut and float(jwt_payload.get("iat") or 0) < cut[0]:
+                return True
+
+        return False
+
+    def revoke_jti(self, jti: str, expires_at: datetime, user_id: Optional[int] = None,
+                   reason: Optional[str] = None, revoked_by: Optional[int] = None) -> RevokedToken:
+        """Revoca un token puntual. Hace commit y avisa a los demás workers."""
+        row = RevokedToken.query.filter_by(jti=jti).first()
+        if not row:
+            row = RevokedToken(
+                jti=jti, user_id=user_id, reason=reason,
+                revoked_by_user_id=revoked_by, expires_at=expires_at,
+            )
+            db.session.add(row)
+            db.session.commit()
+        self._after_revoke()
+        return row
+
+    def revoke_user(self, user_id: int, token_ttl: timedelta, reason: Optional[str] = None,
+                    revoked_by: Optional[int] = None) -> RevokedToken:
+        """Revoca todos los tokens del usuario emitidos hasta ahora."""
+        now = datetime.utcnow()
+        row = RevokedToken(
+            jti=None, user_id=user_id, reason=reason, revoked_by_user_id=revoked_by,
+            revoked_at=now, expires_at=now + token_ttl,
+        )
+        db.session.add(row)
+        db.session.commit()
+        self._after_revoke()
+        return row
+
+    def _after_revoke(self) -> None:
+        self._touch_stamp()
+        # este worker no espera al vigía (el stamp no se marca como visto: el
+        # vigía igual relee, por si otro worker revocó a la vez)
+        with db.engine.connect() as conn:
+            self._load(conn)
+
+    def stats(self) -> dict:
+        jtis, user_cutoff = self._state
+        return {
+            "revoked_jtis": len(jtis),
+            "revoked_users": len(user_cutoff),
+            "last_id": self._last_id,
+        }
+
+
+# Instancia única por proceso (cada worker de gunicorn tiene la suya)
+denylist = Denylist()
+os.register_at_fork(after_in_child=denylist._after_fork)
@@ -1,21 +1,64 @@
 # C:\Abetos_app\backend\rules.py
 from math import floor, ceil
-from typing import Optional
+from typing import NamedTuple, Optional
+
+from sqlalchemy import or_
 
 from models import EarningRule
+from cachebus import bus, RULES
+
+
+class Rule(NamedTuple):
+    """Copia inmutable de una EarningRule (sirve entre requests, sin sesión)."""
+    id: int
+    product_code: str
+    station_id: Optional[str]
+    unit: str
+    points_per_unit: float
 
 
-def find_rule(product_code: str) -> Optional[EarningRule]:
+# (product_code, station_id) -> (versión de "rules", Rule | None)
+_cache = {}
+
+
+def find_rule(product_code: str, station_id: Optional[str] = None) -> Optional[Rule]:
     """
     Devuelve la regla activa más reciente para un product_code.
+    Si se indica station_id, prioriza la regla propia de la estación
+    y si no hay, usa la general (station_id NULL).
+
+    Cacheada por proceso: se vuelve a leer cuando cambia la versión "rules"
+    del cachebus (cualquier commit que toque earning_rules, en cualquier worker).
     """
     pc = (product_code or "").strip()
     if not pc:
         return None
 
+    st = (station_id or "").strip()
+    key = (pc, st)
+    version = bus.version(RULES)
+    hit = _cache.get(key)
+    if hit is not None and hit[0] == version:
+        return hit[1]
+
+    r = _query_rule(pc, st)
+    rule = Rule(r.id, r.product_code, r.station_id, r.unit, r.points_per_unit) if r is not None else None
+    _cache[key] = (version, rule)
+    return rule
+
+
+def _query_rule(pc: str, st: str) -> Optional[EarningRule]:
+    qry = EarningRule.query.filter_by(product_code=pc, is_active=True)
+
+    if st:
+        return (
+            qry.filter(or_(EarningRule.station_id == st, EarningRule.station_id.is_(None)))
+            .order_by(EarningRule.station_id.is_(None), EarningRule.id.desc())
+            .first()
+        )
+
     return (
-        EarningRule.query
-        .filter_by(product_code=pc, is_active=True)
+        qry.filter(EarningRule.station_id.is_(None))
         .order_by(EarningRule.id.desc())
         .first()
     )
@@ -35,7 +78,8 @@ def calculate_points(
     liters=None,
     amount_pesos=None,
     rounding: str = "floor",      # "floor" | "round" | "ceil"
-    min_points: int = 0           # 0 = sin mínimo; 1 = al menos 1 punto si genera
+    min_points: int = 0,          # 0 = sin mínimo; 1 = al menos 1 punto si genera
+    multiplier: float = 1.0       # bonus por nivel del cliente (tiers.multiplier)
 ) -> int:
     """
     Calcula puntos según la regla.
@@ -49,6 +93,9 @@ def calculate_points(
 
     min_points:
       - si > 0, aplica mínimo cuando el cálculo da > 0 pero menor al mínimo
+
+    multiplier:
+      - bonus por nivel (ver tiers.py), se aplica antes de redondear
     """
     if not rule:
         return 0
@@ -70,7 +117,7 @@ def calculate_points(
     if base is None or base <= 0:
         return 0
 
-    raw = base * ppu
+    raw = base * ppu * (multiplier or 1.0)
 
     if rounding == "ceil":
         points = int(ceil(raw))
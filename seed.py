@@ -1,6 +1,7 @@
 # C:\Abetos_app\backend\seed.py
 from app import create_app
 from db import db
+import migrations
 from models import User, Customer, EarningRule, Reward
 
 
@@ -74,7 +75,7 @@ def ensure_rewards():
 def main():
     app = create_app()
     with app.app_context():
-        db.create_all()
+        migrations.upgrade()
 
         upsert_user(
             email=ADMIN_EMAIL,
@@ -0,0 +1,265 @@
+# C:\Abetos_app\backend\segments.py
+"""
+Segmentación RFM (recency / frequency / monetary) de clientes.
+
+    python segments.py              # recalcula customer_segments
+    python segments.py --dry-run    # calcula y muestra conteos, no escribe
+
+1) Por cada DB de ledger (principal + shards) un GROUP BY customer_id de los
+   despachos (earn con litros o $; quedan afuera saldos iniciales y
+   reintegros), leído en streaming a arrays.
+2) Merge de shards y puntajes 1..5 por quintil sobre el rango medio de cada
+   valor (empates: mismo puntaje). Recency: menos días = mejor.
+3) Segmento según (R, F, M) y reemplazo completo de customer_segments en una
+   sola transacción (COPY en Postgres, executemany en el resto).
+
+Con NumPy (opcional, requirements-extras.txt) los pasos 2 y 3 son vectorizados;
+sin NumPy se usa el mismo algoritmo en Python puro (más lento).
+Se corre como cron nocturno, fuera de los workers.
+"""
+import sys
+import time
+import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+from sqlalchemy import select, func, delete, insert, or_
+
+from db import db
+from models import Transaction, CustomerSegment
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+YIELD_PER = 50000
+WRITE_CHUNK = 50000
+QUANTILES = 5
+
+SEGMENTS = ("champions", "loyal", "new", "potential", "need_attention", "at_risk", "hibernating")
+
+
+# ------------------------------------------------------
+# 1) lectura
+# ------------------------------------------------------
+def _dispatch_aggregates():
+    t = Transaction.__table__
+    return (
+        select(
+            t.c.customer_id,
+            func.max(t.c.created_at),
+            func.count(t.c.id),
+            func.coalesce(func.sum(t.c.amount_pesos), 0.0),
+            func.coalesce(func.sum(t.c.liters), 0.0),
+        )
+        .where(
+            Transaction.dispatch_clause(t),
+            or_(t.c.liters.isnot(None), t.c.amount_pesos.isnot(None)),
+        )
+        .group_by(t.c.customer_id)
+    )
+
+
+def collect(sessions) -> dict:
+    """{"ids", "last", "freq", "money", "liters"} como array.array (sin repetir ids)."""
+    cols = {"ids": array.array("q"), "last": array.array("d"), "freq": array.array("q"),
+            "money": array.array("d"), "liters": array.array("d")}
+    for sess in sessions:
+        res = sess.connection().execution_options(stream_results=True, yield_per=YIELD_PER) \
+            .execute(_dispatch_aggregates())
+        for part in res.partitions():
+            for cid, last, n, money, liters in part:
+                cols["ids"].append(cid)
+                cols["last"].append(last.timestamp() if last else 0.0)
+                cols["freq"].append(n)
+                cols["money"].append(money)
+                cols["liters"].append(liters)
+
+    if len(sessions) > 1:
+        cols = _merge(cols)
+    return cols
+
+
+def _merge(cols: dict) -> dict:
+    """Un mismo cliente puede tener despachos en varios shards."""
+    if np is not None:
+        ids, inv = np.unique(np.frombuffer(cols["ids"], dtype=np.int64), return_inverse=True)
+        out = {"ids": ids, "last": np.zeros(len(ids)), "freq": np.zeros(len(ids), dtype=np.int64),
+               "money": np.zeros(len(ids)), "liters": np.zeros(len(ids))}
+        np.maximum.at(out["last"], inv, np.frombuffer(cols["last"]))
+        for k in ("freq", "money", "liters"):
+            np.add.at(out[k], inv, np.frombuffer(cols[k], dtype=out[k].dtype))
+        return out
+
+    acc = {}
+    for cid, last, n, money, liters in zip(*(cols[k] for k in ("ids", "last", "freq", "money", "liters"))):
+        a = acc.get(cid)
+        if a is None:
+            acc[cid] = [last, n, money, liters]
+        else:
+            a[0] = max(a[0], last)
+            a[1] += n
+            a[2] += money
+            a[3] += liters
+    ids = sorted(acc)
+    return {"ids": ids, "last": [acc[i][0] for i in ids], "freq": [acc[i][1] for i in ids],
+            "money": [acc[i][2] for i in ids], "liters": [acc[i][3] for i in ids]}
+
+
+# ------------------------------------------------------
+# 2) puntajes y segmentos
+# ------------------------------------------------------
+def _quantile_scores(values):
+    """1..QUANTILES según el rango medio del valor (empates -> mismo puntaje)."""
+    if np is not None:
+        v = np.asarray(values)
+        if not len(v):
+            return np.zeros(0, dtype=np.int8)
+        ordered = np.sort(v)
+        # rango medio x2 (entero): left + right - 1
+        rank2 = np.searchsorted(ordered, v, side="left") + np.searchsorted(ordered, v, side="right") - 1
+        return (1 + rank2 * QUANTILES // (2 * len(v))).astype(np.int8)
+
+    ordered, n = sorted(values), len(values)
+    return [1 + (bisect_left(ordered, x) + bisect_right(ordered, x) - 1) * QUANTILES // (2 * n) for x in values]
+
+
+def _label(r: int, f: int, m: int) -> str:
+    if r >= 4 and f >= 4 and m >= 4:
+        return "champions"
+    if r >= 3 and f >= 4:
+        return "loyal"
+    if r >= 4 and f <= 1:
+        return "new"
+    if r >= 3 and f >= 2:
+        return "potential"
+    if r >= 3:
+        return "need_attention"
+    if f >= 3:
+        return "at_risk"
+    return "hibernating"
+
+
+def score(cols: dict, as_of: datetime) -> dict:
+    """Agrega recency_days, r/f/m y segment (arrays NumPy o listas)."""
+    now = as_of.timestamp()
+    if np is not None:
+        last = np.asarray(cols["last"], dtype=np.float64)
+        days = np.maximum(0, (now - last) // 86400).astype(np.int64)
+        r = _quantile_scores(-days)
+        f = _quantile_scores(np.asarray(cols["freq"], dtype=np.int64))
+        m = _quantile_scores(np.asarray(cols["money"], dtype=np.float64))
+        # mismo orden que _label
+        seg = np.select(
+            [(r >= 4) & (f >= 4) & (m >= 4), (r >= 3) & (f >= 4), (r >= 4) & (f <= 1),
+             (r >= 3) & (f >= 2), r >= 3, f >= 3],
+            list(SEGMENTS[:-1]),
+            default=SEGMENTS[-1],
+        )
+    else:
+        days = [max(0, int((now - x) // 86400)) for x in cols["last"]]
+        r = _quantile_scores([-d for d in days])
+        f = _quantile_scores(list(cols["freq"]))
+        m = _quantile_scores(list(cols["money"]))
+        seg = [_label(*t) for t in zip(r, f, m)]
+
+    return {**cols, "days": days, "r": r, "f": f, "m": m, "segment": seg}
+
+
+# ------------------------------------------------------
+# 3) escritura
+# ------------------------------------------------------
+def _tolist(v):
+    return v.tolist() if hasattr(v, "tolist") else list(v)
+
+
+def write(session, scored: dict, as_of: datetime) -> int:
+    """Reemplaza customer_segments (delete + insert en la misma transacción). No hace commit."""
+    from bulk_import import _copy
+
+    keys = ("ids", "days", "freq", "money", "liters", "r", "f", "m", "segment")
+    names = ("customer_id", "recency_days", "frequency", "monetary", "liters",
+             "r_score", "f_score", "m_score", "segment")
+    rows = zip(*(_tolist(scored[k]) for k in keys))
+
+    tbl = CustomerSegment.__table__
+    conn = session.connection()
+    conn.execute(delete(tbl))
+    pg = conn.dialect.name == "postgresql"
+
+    n, chunk = 0, []
+    for row in rows:
+        chunk.append({**dict(zip(names, row)), "computed_at": as_of})
+        if len(chunk) >= WRITE_CHUNK:
+            n += _write_chunk(conn, tbl, chunk, pg, _copy)
+            chunk = []
+    if chunk:
+        n += _write_chunk(conn, tbl, chunk, pg, _copy)
+    return n
+
+
+def _write_chunk(conn, tbl, chunk: list, pg: bool, copy) -> int:
+    if pg:
+        copy(conn, tbl.name, list(chunk[0]), chunk)
+    else:
+        conn.execute(insert(tbl), chunk)
+    return len(chunk)
+
+
+# ------------------------------------------------------
+# Job
+# ------------------------------------------------------
+def rebuild(as_of: datetime = None, dry_run: bool = False) -> dict:
+    """Corre el job dentro de un app context. Hace commit salvo dry_run."""
+    from sharding import router
+
+    as_of = as_of or datetime.utcnow()
+    t0 = time.perf_counter()
+    cols = collect(router.ledger_sessions())
+    t1 = time.perf_counter()
+    scored = score(cols, as_of)
+    t2 = time.perf_counter()
+
+    written = 0
+    if not dry_run:
+        written = write(db.session, scored, as_of)
+        db.session.commit()
+    t3 = time.perf_counter()
+
+    counts = {s: 0 for s in SEGMENTS}
+    for s in _tolist(scored["segment"]):
+        counts[s] += 1
+    return {
+        "customers": len(scored["ids"]),
+        "written": written,
+        "segments": counts,
+        "numpy": np is not None,
+        "seconds": {"read": round(t1 - t0, 2), "score": round(t2 - t1, 2), "write": round(t3 - t2, 2)},
+    }
+
+
+def segment_counts(session) -> dict:
+    """Conteo por segmento de la última corrida + cuándo se calculó."""
+    rows = session.execute(
+        select(CustomerSegment.segment, func.count(), func.max(CustomerSegment.computed_at))
+        .group_by(CustomerSegment.segment)
+    ).all()
+    computed = max((r[2] for r in rows if r[2]), default=None)
+    return {
+        "computed_at": computed.isoformat() if computed else None,
+        "segments": {s: next((r[1] for r in rows if r[0] == s), 0) for s in SEGMENTS},
+    }
+
+
+if __name__ == "__main__":
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        stats = rebuild(dry_run="--dry-run" in sys.argv[1:])
+    print(f"✅ Segmentos: {stats['customers']} clientes, {stats['written']} escritos "
+          f"(numpy={'sí' if stats['numpy'] else 'no'}) {stats['seconds']}")
+    for name, n in stats["segments"].items():
+        print(f"   {name:<15}{n:>10}")
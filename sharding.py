@@ -0,0 +1,182 @@
+# C:\Abetos_app\backend\sharding.py
+"""
+Sharding del ledger por estación.
+
+- Global (DB principal, SQLALCHEMY_DATABASE_URI): users, customers, rules,
+  rewards, redemptions... y el ledger de la estación por defecto y de toda
+  estación que no tenga shard propio.
+- Shards: STATION_SHARDS="norte=sqlite:///norte.db,sur=postgresql+psycopg://..."
+  Cada estación listada guarda sus transactions (y tablas derivadas como
+  leaderboard_scores) en su propia DB, registrada como bind "station:<id>".
+
+Los saldos se calculan como suma de sumas parciales por shard.
+Sin STATION_SHARDS todo queda en la DB principal (comportamiento de siempre).
+"""
+import os
+from typing import Optional
+
+from flask import current_app
+from sqlalchemy import MetaData, Table, Column, Index, func, inspect, text
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from db import db
+import dbtuning
+
+
+BIND_PREFIX = "station:"
+DEFAULT_STATION = "main"
+
+# tablas que viven en cada shard (el resto queda en la DB principal)
+SHARD_TABLES = [
+    "purchases", "transactions", "leaderboard_scores", "outbox_events", "daily_sketches",
+    "ingest_offsets",
+]
+
+
+def parse_shards(raw: str) -> dict:
+    """'norte=sqlite:///n.db,sur=sqlite:///s.db' -> {'norte': 'sqlite:///n.db', ...}"""
+    out = {}
+    for part in (raw or "").split(","):
+        part = part.strip()
+        if not part or "=" not in part:
+            continue
+        st, uri = part.split("=", 1)
+        st, uri = st.strip(), uri.strip()
+        if st and uri:
+            out[st] = uri
+    return out
+
+
+def configure(app) -> None:
+    """Registra los shards como binds. Llamar ANTES de db.init_app(app)."""
+    shards = parse_shards(os.getenv("STATION_SHARDS", ""))
+    binds = dict(app.config.get("SQLALCHEMY_BINDS") or {})
+    for st, uri in shards.items():
+        # los binds no heredan SQLALCHEMY_ENGINE_OPTIONS: van con sus propias opciones
+        binds[BIND_PREFIX + st] = {"url": uri, **dbtuning.engine_options(uri)}
+
+    app.config["SQLALCHEMY_BINDS"] = binds
+    app.config["STATION_SHARDS"] = sorted(shards)
+    app.config["DEFAULT_STATION"] = os.getenv("DEFAULT_STATION", DEFAULT_STATION)
+
+
+def shard_metadata() -> MetaData:
+    """
+    Copia de las tablas del ledger SIN foreign keys hacia tablas globales
+    (customers/users/rewards no existen en el shard). Solo se usa para DDL.
+    """
+    md = MetaData(naming_convention=db.metadata.naming_convention)
+    for name in SHARD_TABLES:
+        src = db.metadata.tables.get(name)
+        if src is None:
+            continue
+        cols = [
+            Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable, unique=c.unique)
+            for c in src.columns
+        ]
+        t = Table(name, md, *cols, **src.dialect_kwargs)
+        for ix in src.indexes:
+            Index(ix.name, *[t.c[c.name] for c in ix.columns], unique=ix.unique)
+    return md
+
+
+def ensure_station_columns(engine) -> None:
+    """
+    create_all no agrega columnas a tablas existentes: agrega station_id
+    en DBs creadas antes del sharding.
+    """
+    insp = inspect(engine)
+    with engine.begin() as conn:
+        for table in ("transactions", "earning_rules"):
+            if not insp.has_table(table):
+                continue
+            cols = {c["name"] for c in insp.get_columns(table)}
+            if "station_id" not in cols:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN station_id VARCHAR(20)"))
+                conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_station_id ON {table} (station_id)"))
+
+
+class ShardRouter:
+    """Resuelve estación -> sesión. Usar dentro de un app context."""
+
+    def stations(self) -> list:
+        cfg = current_app.config
+        default = cfg.get("DEFAULT_STATION", DEFAULT_STATION)
+        return [default] + [s for s in cfg.get("STATION_SHARDS", []) if s != default]
+
+    def normalize(self, station_id: Optional[str]) -> str:
+        st = (station_id or "").strip()
+        return st or current_app.config.get("DEFAULT_STATION", DEFAULT_STATION)
+
+    def has_shard(self, station_id: Optional[str]) -> bool:
+        return self.normalize(station_id) in current_app.config.get("STATION_SHARDS", [])
+
+    def _registry(self) -> dict:
+        return current_app.extensions.setdefault("station_sessions", {})
+
+    def session_for(self, station_id: Optional[str]):
+        """Sesión donde se escribe el ledger de la estación."""
+        st = self.normalize(station_id)
+        if not self.has_shard(st):
+            return db.session
+
+        reg = self._registry()
+        sess = reg.get(st)
+        if sess is None:
+            engine = db.engines[BIND_PREFIX + st]
+            sess = scoped_session(sessionmaker(bind=engine, expire_on_commit=False))
+            reg[st] = sess
+        return sess
+
+    def ledger_sessions(self) -> list:
+        """Una sesión por DB de ledger distinta (principal + shards)."""
+        out = [db.session]
+        for st in current_app.config.get("STATION_SHARDS", []):
+            out.append(self.session_for(st))
+        return out
+
+    def remove_sessions(self) -> None:
+        for sess in self._registry().values():
+            sess.remove()
+
+    # ---------- saldos (suma de parciales por shard) ----------
+    def balance(self, customer_id: int) -> int:
+        from models import Transaction
+
+        total = 0
+        for sess in self.ledger_sessions():
+            total += int(
+                sess.query(func.coalesce(func.sum(Transaction.points), 0))
+                .filter(Transaction.customer_id == customer_id)
+                .scalar() or 0
+            )
+        return total
+
+    def balances(self, customer_ids) -> dict:
+        """{customer_id: saldo} con una consulta agrupada por shard."""
+        from models import Transaction
+
+        ids = list({int(i) for i in customer_ids})
+        out = {i: 0 for i in ids}
+        if not ids:
+            return out
+
+        for sess in self.ledger_sessions():
+            rows = (
+                sess.query(Transaction.customer_id, func.coalesce(func.sum(Transaction.points), 0))
+                .filter(Transaction.customer_id.in_(ids))
+                .group_by(Transaction.customer_id)
+                .all()
+            )
+            for cid, pts in rows:
+                out[cid] += int(pts or 0)
+        return out
+
+
+router = ShardRouter()
+
+
+def init_app(app) -> None:
+    @app.teardown_appcontext
+    def _remove_station_sessions(_exc):
+        router.remove_sessions()
@@ -0,0 +1,435 @@
+# C:\Abetos_app\backend\sketches.py
+"""
+Analítica aproximada y mergeable, por día y producto.
+
+- HyperLogLog (p=12, 4 KB, ~1.6% de error) para clientes distintos.
+- DDSketch (error relativo ~1%) para cuantiles de litros y $ por despacho.
+
+Cada earn que se inserta actualiza sus sketches del día (producto y "*"):
+el listener (registrado por create_app) los anota y se mergean después del
+commit del ledger, en una transacción corta aparte, para no tener tomadas las
+filas "*" (compartidas por todas las acreditaciones) durante la acreditación.
+Si el proceso muere entre los dos commits, `backfill` los recalcula. Para rangos arbitrarios se
+mergean los sketches diarios (y los de cada shard) sin tocar transactions.
+
+Backfill de datos históricos:
+    python sketches.py backfill 2026-01-01 2026-10-31
+"""
+import sys
+import json
+import math
+import logging
+import struct
+import hashlib
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import event, select, delete, insert, update, bindparam, tuple_
+from sqlalchemy.orm import Session, object_session
+
+from models import Transaction, DailySketch
+
+
+log = logging.getLogger("sketches")
+
+ALL = "*"
+
+
+# ------------------------------------------------------
+# HyperLogLog
+# ------------------------------------------------------
+class HyperLogLog:
+    P = 12
+    M = 1 << P
+    _ALPHA = 0.7213 / (1 + 1.079 / M)
+
+    def __init__(self, registers: Optional[bytes] = None):
+        self.registers = bytearray(registers) if registers else bytearray(self.M)
+
+    @staticmethod
+    def _hash(value) -> int:
+        h = hashlib.blake2b(str(value).encode("utf-8"), digest_size=8).digest()
+        return struct.unpack(">Q", h)[0]
+
+    def add(self, value) -> None:
+        h = self._hash(value)
+        idx = h >> (64 - self.P)
+        rest = (h << self.P) & ((1 << 64) - 1)
+        rank = (64 - self.P + 1) if rest == 0 else (64 - rest.bit_length() + 1)
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+        return self
+
+    def count(self) -> int:
+        inv = sum(2.0 ** -r for r in self.registers)
+        est = self._ALPHA * self.M * self.M / inv
+        zeros = self.registers.count(0)
+        if est <= 2.5 * self.M and zeros:
+            est = self.M * math.log(self.M / zeros)  # linear counting (rango chico)
+        return int(round(est))
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        return cls(data)
+
+
+# ------------------------------------------------------
+# DDSketch (buckets logarítmicos -> cuantiles con error relativo acotado)
+# ------------------------------------------------------
+class DDSketch:
+    ALPHA = 0.01
+    _GAMMA = (1 + ALPHA) / (1 - ALPHA)
+    _LOG_GAMMA = math.log(_GAMMA)
+
+    def __init__(self, bins: Optional[dict] = None, zero: int = 0, n: int = 0,
+                 total: float = 0.0, vmin: Optional[float] = None, vmax: Optional[float] = None):
+        self.bins = bins or {}
+        self.zero = zero
+        self.n = n
+        self.total = total
+        self.vmin = vmin
+        self.vmax = vmax
+
+    def add(self, x) -> None:
+        if x is None:
+            return
+        x = float(x)
+        if x <= 0:
+            self.zero += 1
+        else:
+            k = int(math.ceil(math.log(x) / self._LOG_GAMMA))
+            self.bins[k] = self.bins.get(k, 0) + 1
+        self.n += 1
+        self.total += x
+        self.vmin = x if self.vmin is None else min(self.vmin, x)
+        self.vmax = x if self.vmax is None else max(self.vmax, x)
+
+    def merge(self, other: "DDSketch") -> "DDSketch":
+        for k, c in other.bins.items():
+            self.bins[k] = self.bins.get(k, 0) + c
+        self.zero += other.zero
+        self.n += other.n
+        self.total += other.total
+        if other.vmin is not None:
+            self.vmin = other.vmin if self.vmin is None else min(self.vmin, other.vmin)
+        if other.vmax is not None:
+            self.vmax = other.vmax if self.vmax is None else max(self.vmax, other.vmax)
+        return self
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.n == 0:
+            return None
+        rank = q * (self.n - 1)
+        seen = self.zero
+        if rank < seen:
+            return 0.0
+        for k in sorted(self.bins):
+            seen += self.bins[k]
+            if seen > rank:
+                val = 2 * self._GAMMA ** k / (self._GAMMA + 1)
+                return min(max(val, self.vmin), self.vmax)
+        return self.vmax
+
+    def summary(self) -> dict:
+        return {
+            "count": self.n,
+            "sum": round(self.total, 4),
+            "mean": round(self.total / self.n, 4) if self.n else None,
+            "min": self.vmin,
+            "max": self.vmax,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+        }
+
+    def to_bytes(self) -> bytes:
+        return json.dumps({
+            "b": self.bins, "z": self.zero, "n": self.n,
+            "s": self.total, "lo": self.vmin, "hi": self.vmax,
+        }, separators=(",", ":")).encode("utf-8")
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "DDSketch":
+        d = json.loads(data)
+        return cls(
+            bins={int(k): v for k, v in d.get("b", {}).items()},
+            zero=d.get("z", 0), n=d.get("n", 0), total=d.get("s", 0.0),
+            vmin=d.get("lo"), vmax=d.get("hi"),
+        )
+
+
+_KINDS = {
+    DailySketch.METRIC_CUSTOMERS: HyperLogLog,
+    DailySketch.METRIC_LITERS: DDSketch,
+    DailySketch.METRIC_AMOUNT: DDSketch,
+}
+
+
+# ------------------------------------------------------
+# Actualización incremental (listener)
+# ------------------------------------------------------
+_PENDING = "sketches_pending"
+
+
+def _key_tuple(tbl):
+    return tuple_(tbl.c.day, tbl.c.product_code, tbl.c.metric)
+
+
+def _merge(connection, groups: dict) -> None:
+    """
+    Suma valores a los sketches: groups {(día, producto, métrica): [valores]}.
+    Tres sentencias por llamada: alta vacía de las filas que falten
+    (ON CONFLICT DO NOTHING: dos altas concurrentes del mismo día no chocan),
+    lectura con lock (en orden, sin deadlocks entre workers) y UPDATE por lote.
+    """
+    if not groups:
+        return
+    tbl = DailySketch.__table__
+    keys = sorted(groups)
+    now = datetime.utcnow()
+    dialect = connection.dialect.name
+
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as d_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as d_insert
+        connection.execute(
+            d_insert(tbl).on_conflict_do_nothing(index_elements=[tbl.c.day, tbl.c.product_code, tbl.c.metric]),
+            [{"day": d, "product_code": p, "metric": m, "data": _KINDS[m]().to_bytes(), "updated_at": now}
+             for d, p, m in keys],
+        )
+
+    sel = (
+        select(tbl.c.day, tbl.c.product_code, tbl.c.metric, tbl.c.data)
+        .where(_key_tuple(tbl).in_(keys))
+        .order_by(tbl.c.day, tbl.c.product_code, tbl.c.metric)
+    )
+    if dialect == "postgresql":
+        sel = sel.with_for_update()
+    current = {(d, p, m): data for d, p, m, data in connection.execute(sel)}
+
+    updates, inserts = [], []
+    for key in keys:
+        cls = _KINDS[key[2]]
+        data = current.get(key)
+        sk = cls.from_bytes(data) if data is not None else cls()
+        for v in groups[key]:
+            sk.add(v)
+        row = {"k_day": key[0], "k_pc": key[1], "k_metric": key[2], "data": sk.to_bytes(), "updated_at": now}
+        (updates if data is not None else inserts).append(row)
+
+    if updates:
+        connection.execute(
+            update(tbl)
+            .where(tbl.c.day == bindparam("k_day"), tbl.c.product_code == bindparam("k_pc"),
+                   tbl.c.metric == bindparam("k_metric"))
+            .values(data=bindparam("data"), updated_at=bindparam("updated_at")),
+            updates,
+        )
+    if inserts:  # solo en dialectos sin ON CONFLICT
+        connection.execute(insert(tbl), [
+            {"day": r["k_day"], "product_code": r["k_pc"], "metric": r["k_metric"],
+             "data": r["data"], "updated_at": now} for r in inserts
+        ])
+
+
+def _group(txs) -> dict:
+    groups = {}
+    for t in txs:
+        if t.get("kind") != Transaction.KIND_EARN:
+            continue
+        day = (t.get("created_at") or datetime.utcnow()).date()
+        pc = (t.get("product_code") or "").strip()
+        for p in ((ALL, pc) if pc and pc != ALL else (ALL,)):
+            groups.setdefault((day, p, DailySketch.METRIC_CUSTOMERS), []).append(t["customer_id"])
+            if t.get("liters") is not None:
+                groups.setdefault((day, p, DailySketch.METRIC_LITERS), []).append(t["liters"])
+            if t.get("amount_pesos") is not None:
+                groups.setdefault((day, p, DailySketch.METRIC_AMOUNT), []).append(t["amount_pesos"])
+    return groups
+
+
+def _on_transaction_insert(_mapper, connection, target):
+    """
+    No toca daily_sketches dentro de la transacción del ledger (las filas "*"
+    del día son compartidas por todas las acreditaciones): anota el earn y se
+    mergea al commit, en una transacción corta aparte (_on_after_commit).
+    """
+    if target.kind != Transaction.KIND_EARN:
+        return
+    row = {
+        "kind": target.kind, "created_at": target.created_at, "product_code": target.product_code,
+        "customer_id": target.customer_id, "liters": target.liters, "amount_pesos": target.amount_pesos,
+    }
+    session = object_session(target)
+    if session is None:
+        _merge(connection, _group([row]))
+        return
+    session.info.setdefault(_PENDING, {}).setdefault(connection.engine, []).append(row)
+
+
+def _on_after_commit(session) -> None:
+    pending = session.info.pop(_PENDING, None)
+    for engine, rows in (pending or {}).items():
+        try:
+            with engine.begin() as conn:
+                _merge(conn, _group(rows))
+        except Exception:
+            # analítica aproximada: se recupera con `python sketches.py backfill`
+            log.exception("sketches: no se pudieron mergear %d earns", len(rows))
+
+
+def _on_after_rollback(session) -> None:
+    session.info.pop(_PENDING, None)
+
+
+def observe_many(connection, txs: list) -> None:
+    """
+    Equivalente al listener para inserts hechos por Core (ingesta de
+    despachos): una lectura/escritura por lote, no por fila. txs: dicts con
+    las columnas de transactions. Conviene llamarlo después del commit del
+    ledger, en su propia transacción (como el listener).
+    """
+    _merge(connection, _group(txs))
+
+
+def register() -> None:
+    """Engancha el listener (idempotente; lo llama create_app)."""
+    for target, name, fn in (
+        (Transaction, "after_insert", _on_transaction_insert),
+        (Session, "after_commit", _on_after_commit),
+        (Session, "after_rollback", _on_after_rollback),
+    ):
+        if not event.contains(target, name, fn):
+            event.listen(target, name, fn)
+
+
+# ------------------------------------------------------
+# Consultas (merge de rangos y shards)
+# ------------------------------------------------------
+def _week_start(d: date) -> date:
+    return d - timedelta(days=d.weekday())
+
+
+def query(sessions: list, day_from: date, day_to: date, product_code: str = ALL,
+          group: str = "range") -> list:
+    """
+    Mergea sketches diarios de [day_from, day_to] en todas las sesiones (shards).
+    group: "range" (un solo resultado), "day" o "week".
+    """
+    buckets = {}
+    for sess in sessions:
+        rows = sess.execute(
+            select(DailySketch.day, DailySketch.metric, DailySketch.data).where(
+                DailySketch.day >= day_from,
+                DailySketch.day <= day_to,
+                DailySketch.product_code == product_code,
+            )
+        ).all()
+        for day, metric, data in rows:
+            if group == "day":
+                key = day
+            elif group == "week":
+                key = _week_start(day)
+            else:
+                key = day_from
+            sk = _KINDS[metric].from_bytes(data)
+            slot = buckets.setdefault(key, {})
+            if metric in slot:
+                slot[metric].merge(sk)
+            else:
+                slot[metric] = sk
+
+    out = []
+    for key in sorted(buckets):
+        slot = buckets[key]
+        hll = slot.get(DailySketch.METRIC_CUSTOMERS)
+        liters = slot.get(DailySketch.METRIC_LITERS) or DDSketch()
+        amount = slot.get(DailySketch.METRIC_AMOUNT) or DDSketch()
+        out.append({
+            "from": key.isoformat() if group != "range" else day_from.isoformat(),
+            "to": day_to.isoformat() if group == "range" else None,
+            "distinct_customers": hll.count() if hll else 0,
+            "liters": liters.summary(),
+            "amount_pesos": amount.summary(),
+        })
+    return out
+
+
+# ------------------------------------------------------
+# Backfill desde transactions (por shard, en streaming)
+# ------------------------------------------------------
+def backfill(sess, day_from: date, day_to: date) -> int:
+    """Recalcula los sketches del rango desde transactions. Hace commit."""
+    tbl = DailySketch.__table__
+    start = datetime.combine(day_from, datetime.min.time())
+    end = datetime.combine(day_to + timedelta(days=1), datetime.min.time())
+
+    acc = {}
+    stmt = (
+        select(Transaction.customer_id, Transaction.product_code, Transaction.liters,
+               Transaction.amount_pesos, Transaction.created_at)
+        # solo despachos: sin reintegros de canjes (REFUND:<id>) ni saldos iniciales
+        .where(Transaction.dispatch_clause(),
+               Transaction.created_at >= start, Transaction.created_at < end)
+        .execution_options(yield_per=5000)
+    )
+    n = 0
+    for cid, pc, liters, amount, created_at in sess.execute(stmt):
+        day = created_at.date()
+        pcs = [ALL]
+        pc = (pc or "").strip()
+        if pc and pc != ALL:
+            pcs.append(pc)
+        for p in pcs:
+            slot = acc.setdefault((day, p), {
+                DailySketch.METRIC_CUSTOMERS: HyperLogLog(),
+                DailySketch.METRIC_LITERS: DDSketch(),
+                DailySketch.METRIC_AMOUNT: DDSketch(),
+            })
+            slot[DailySketch.METRIC_CUSTOMERS].add(cid)
+            slot[DailySketch.METRIC_LITERS].add(liters)
+            slot[DailySketch.METRIC_AMOUNT].add(amount)
+        n += 1
+
+    now = datetime.utcnow()
+    rows = [
+        {"day": day, "product_code": p, "metric": m, "data": sk.to_bytes(), "updated_at": now}
+        for (day, p), slot in acc.items()
+        for m, sk in slot.items()
+        if not (isinstance(sk, DDSketch) and sk.n == 0)
+    ]
+    try:
+        sess.execute(delete(tbl).where(tbl.c.day >= day_from, tbl.c.day <= day_to))
+        if rows:
+            sess.execute(insert(tbl), rows)
+        sess.commit()
+    except Exception:
+        sess.rollback()
+        raise
+    return n
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if len(args) != 3 or args[0] != "backfill":
+        print(__doc__)
+        sys.exit(1)
+
+    from app import create_app
+    from sharding import router
+
+    d1 = date.fromisoformat(args[1])
+    d2 = date.fromisoformat(args[2])
+    app = create_app()
+    with app.app_context():
+        for sess in router.ledger_sessions():
+            n = backfill(sess, d1, d2)
+            print(f"✅ {n} transacciones procesadas")
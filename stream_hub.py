@@ -0,0 +1,116 @@
+# C:\Abetos_app\backend\stream_hub.py
+"""
+Hub de Server-Sent Events por proceso (worker).
+
+- Un único hilo lector por worker sigue el log de eventos (eventlog.py) desde
+  el final y reparte cada "transaction.created" a las colas de los clientes
+  suscriptos. El log es el broker local compartido entre workers de gunicorn:
+  no hay polling a la DB (el relay es quien lee el outbox).
+- Cada conexión SSE es una cola chica + un generador que espera en ella.
+  Para miles de conexiones ociosas usar un worker cooperativo
+  (gunicorn -k gevent): cada stream es una greenlet, no un hilo.
+
+Requiere `python eventlog.py relay` corriendo.
+"""
+import os
+import json
+import queue
+import threading
+from typing import Iterator
+
+import eventlog
+
+
+HEARTBEAT_SEC = float(os.getenv("SSE_HEARTBEAT_SEC", "15"))
+QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", "50"))
+POLL_SEC = float(os.getenv("SSE_LOG_POLL_SEC", "0.2"))
+
+
+def _compact(payload: dict) -> dict:
+    return {
+        "id": payload.get("id"),
+        "kind": payload.get("kind"),
+        "points": payload.get("points"),
+        "product_code": payload.get("product_code"),
+        "station_id": payload.get("station_id"),
+        "created_at": payload.get("created_at"),
+    }
+
+
+class StreamHub:
+    def __init__(self, log_path: str = eventlog.EVENTLOG_DIR):
+        self.log_path = log_path
+        self._subs = {}  # customer_id -> set(Queue)
+        self._lock = threading.Lock()
+        self._reader_pid = None
+
+    # ---------- hilo lector (uno por proceso; se relanza tras fork) ----------
+    def _ensure_reader(self) -> None:
+        if self._reader_pid == os.getpid():
+            return
+        with self._lock:
+            if self._reader_pid == os.getpid():
+                return
+            self._reader_pid = os.getpid()
+            t = threading.Thread(target=self._run, name="sse-hub", daemon=True)
+            t.start()
+
+    def _run(self) -> None:
+        start = eventlog.end_offset(self.log_path)
+        for rec in eventlog.read_from(start, self.log_path, follow=True, poll_sec=POLL_SEC):
+            if rec.get("topic") != "transaction.created":
+                continue
+            payload = rec.get("payload") or {}
+            self.publish(payload.get("customer_id"), rec["offset"], "transaction", _compact(payload))
+
+    # ---------- pub/sub ----------
+    def publish(self, customer_id, offset: int, event: str, data: dict) -> None:
+        with self._lock:
+            targets = list(self._subs.get(customer_id, ()))
+        for q in targets:
+            try:
+                q.put_nowait((offset, event, data))
+            except queue.Full:
+                # cliente lento: se descarta; al reconectar vuelve a pedir /api/me
+                pass
+
+    def subscribe(self, customer_id) -> queue.Queue:
+        self._ensure_reader()
+        q = queue.Queue(maxsize=QUEUE_SIZE)
+        with self._lock:
+            self._subs.setdefault(customer_id, set()).add(q)
+        return q
+
+    def unsubscribe(self, customer_id, q: queue.Queue) -> None:
+        with self._lock:
+            subs = self._subs.get(customer_id)
+            if subs:
+                subs.discard(q)
+                if not subs:
+                    self._subs.pop(customer_id, None)
+
+    def stream(self, customer_id) -> Iterator[str]:
+        """Generador SSE para una conexión (no usa app/request context)."""
+        q = self.subscribe(customer_id)
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    offset, event, data = q.get(timeout=HEARTBEAT_SEC)
+                except queue.Empty:
+                    yield ": ping\n\n"
+                    continue
+                body = json.dumps(data, separators=(",", ":"))
+                yield f"id: {offset}\nevent: {event}\ndata: {body}\n\n"
+        finally:
+            self.unsubscribe(customer_id, q)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "customers": len(self._subs),
+                "connections": sum(len(s) for s in self._subs.values()),
+            }
+
+
+hub = StreamHub()
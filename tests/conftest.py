@@ -0,0 +1,49 @@
+# C:\Abetos_app\backend\tests\conftest.py
+"""
+Fixtures de pytest: la app contra una SQLite temporal con el seed aplicado.
+
+    python -m pytest -q tests
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# antes de importar la app: nada de estado compartido con otros procesos del host
+_TMP = tempfile.mkdtemp(prefix="abetos_tests_")
+os.environ["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{os.path.join(_TMP, 'test.db')}"
+os.environ["CACHE_BUS_STAMP_FILE"] = os.path.join(_TMP, "cache.stamp")
+os.environ["REVOCATION_STAMP_FILE"] = os.path.join(_TMP, "revocation.stamp")
+os.environ["ANOMALY_FILE"] = os.path.join(_TMP, "anomaly.bin")
+os.environ.setdefault("LOGIN_THROTTLE", "off")
+os.environ.setdefault("ANOMALY_MODE", "off")
+
+
+@pytest.fixture(scope="session")
+def app():
+    import seed
+    from app import create_app
+
+    seed.main()  # migraciones + usuarios, reglas y recompensas de ejemplo
+    application = create_app()
+    application.config["TESTING"] = True
+    return application
+
+
+@pytest.fixture
+def app_ctx(app):
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def admin_headers(app):
+    from seed import ADMIN_EMAIL, ADMIN_PASS
+
+    r = app.test_client().post("/api/auth/login", json={"email": ADMIN_EMAIL, "password": ADMIN_PASS})
+    return {"Authorization": "Bearer " + r.get_json()["access_token"]}
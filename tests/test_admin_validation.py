@@ -0,0 +1,46 @@
+# C:\Abetos_app\backend\tests\test_admin_validation.py
+import pytest
+
+
+@pytest.mark.parametrize("body", [
+    {"effective_from": 123},
+    {"effective_from": ["2026-01-01"]},
+    {"effective_from": "no-es-fecha"},
+    {"unit_price": "inf"},
+    {"unit_price": "-inf"},
+    {"unit_price": "nan"},
+    {"unit_price": 1e400},
+    {"unit_price": 0},
+    {"unit_price": None},
+])
+def test_prices_create_rejects_bad_input(app, admin_headers, body):
+    payload = {"product_code": "NAFTA_SUPER", "unit_price": 1000.0, **body}
+    r = app.test_client().post("/api/admin/prices", headers=admin_headers, json=payload)
+    assert r.status_code == 400
+    assert r.get_json()["error"] == "bad_request"
+
+
+def test_prices_create_accepts_valid_price(app, admin_headers):
+    r = app.test_client().post("/api/admin/prices", headers=admin_headers, json={
+        "product_code": "VALIDACION", "unit_price": "1234.5", "effective_from": "2026-01-01"})
+    assert r.status_code == 201
+
+
+@pytest.mark.parametrize("action", ["approve", "reject"])
+@pytest.mark.parametrize("body", [
+    {"from": 5},
+    {"to": {"d": 1}},
+    {"from": "ayer"},
+    {"reward_id": "uno"},
+    {"reward_id": 1.5},
+    {"customer_id": True},
+])
+def test_bulk_redemptions_reject_bad_filters(app, admin_headers, action, body):
+    r = app.test_client().post(f"/api/admin/redemptions/{action}", headers=admin_headers, json=body)
+    assert r.status_code == 400
+    assert r.get_json()["error"] == "bad_request"
+
+
+def test_pending_redemptions_reject_bad_dates(app, admin_headers):
+    r = app.test_client().get("/api/admin/redemptions/pending?from=ayer", headers=admin_headers)
+    assert r.status_code == 400
@@ -0,0 +1,162 @@
+# C:\Abetos_app\backend\tests\test_anomaly.py
+import os
+import time
+import multiprocessing
+
+import pytest
+
+from anomaly import AnomalyDetector
+
+
+@pytest.fixture
+def make(tmp_path, monkeypatch):
+    """Detectores que comparten archivo, como los workers de gunicorn de un host."""
+    monkeypatch.setenv("ANOMALY_FILE", str(tmp_path / "anomaly.bin"))
+    monkeypatch.setenv("ANOMALY_CUSTOMER_MAX", "6")
+    monkeypatch.setenv("ANOMALY_OPERATOR_MAX", "120")
+
+    def _make(mode="flag"):
+        monkeypatch.setenv("ANOMALY_MODE", mode)
+        return AnomalyDetector()
+    return _make
+
+
+NOW = float(int(time.time()) // 60 * 60)
+
+
+def test_workers_count_together(make):
+    workers = [make() for _ in range(4)]
+    alerts = []
+    for i in range(20):  # 20 despachos al mismo DNI repartidos entre 4 workers
+        alerts += workers[i % 4].observe(1, 555, 100, now=NOW + i)
+
+    counts = [a["value"] for a in alerts if a["rule"] == "window_count"]
+    assert counts == list(range(7, 21))
+    assert all(a["scope"] == "customer" and a["customer_id"] == 555 for a in alerts)
+
+
+def test_every_worker_sees_every_alert(make):
+    a, b = make(), make()
+    for i in range(7):
+        a.observe(1, 10, 100, now=NOW + i)
+    for i in range(7):
+        b.observe(2, 20, 100, now=NOW + i)
+
+    for w in (a, b):
+        items = w.active_alerts(since_sec=10 ** 10)
+        assert [(x["customer_id"], x["operator_user_id"]) for x in items] == [(20, 2), (10, 1)]
+        assert w.stats()["tracked_customers"] == 2
+        assert w.stats()["tracked_operators"] == 2
+
+
+def _observe_in_child(path, customer, n, q):
+    os.environ["ANOMALY_FILE"] = path
+    os.environ["ANOMALY_MODE"] = "flag"
+    det = AnomalyDetector()
+    q.put(sum(len(det.observe(None, customer, 100, now=NOW)) for _ in range(n)))
+
+
+def test_processes_share_the_file(make, tmp_path):
+    parent = make()
+    ctx = multiprocessing.get_context("fork")
+    q = ctx.Queue()
+    procs = [ctx.Process(target=_observe_in_child, args=(str(tmp_path / "anomaly.bin"), 77, 5, q))
+             for _ in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(10)
+    assert sum(q.get(timeout=5) for _ in procs) == 20 - 6
+    assert len(parent.active_alerts(since_sec=10 ** 10)) == 14
+
+
+def test_window_slides(make):
+    det = make()
+    for i in range(6):
+        assert det.observe(None, 1, 100, now=NOW + i) == []
+    assert det.observe(None, 1, 100, now=NOW + 10)[0]["value"] == 7
+    # una hora después los buckets viejos ya no cuentan
+    assert det.observe(None, 1, 100, now=NOW + 3600 + 60) == []
+
+
+def test_rejected_attempts_do_not_feed_the_window(make):
+    det = make("reject")
+    for i in range(6):
+        assert det.observe(3, 1, 100, now=NOW + i) == []
+
+    for i in range(5):  # reintentos rechazados: no suman
+        alerts = det.observe(3, 1, 100, now=NOW + 10 + i)
+        assert [(a["rule"], a["value"], a["rejected"]) for a in alerts] == [("window_count", 7, True)]
+
+    # al salir de la ventana el primer evento, vuelve a pasar
+    assert det.observe(3, 1, 100, now=NOW + 3600 + 60) == []
+    assert len(det.active_alerts(since_sec=10 ** 10)) == 5
+
+
+def test_rejected_outlier_does_not_move_the_ewma(make):
+    det = make("reject")
+    for i in range(12):  # clientes distintos: solo la EWMA del operador se calienta
+        det.observe(9, 2000 + i, 100 + i % 3, now=NOW + i * 60)
+
+    outlier = det.observe(9, 3000, 100_000, now=NOW + 800)
+    assert [a["rule"] for a in outlier] == ["points_zscore"]
+    # la EWMA del operador quedó igual: el mismo outlier sigue alertando con el mismo z
+    again = det.observe(9, 3001, 100_000, now=NOW + 801)
+    assert again[0]["value"] == outlier[0]["value"]
+
+
+def test_flag_mode_counts_flagged_operations(make):
+    det = make("flag")
+    for i in range(8):
+        det.observe(None, 1, 100, now=NOW + i)
+    alerts = det.observe(None, 1, 100, now=NOW + 9)
+    assert alerts[0]["value"] == 9 and alerts[0]["rejected"] is False
+
+
+def test_off_mode_does_nothing(make):
+    det = make("off")
+    assert all(det.observe(1, 1, 100, now=NOW + i) == [] for i in range(20))
+
+
+@pytest.fixture
+def rejecting(app, make, monkeypatch):
+    """El detector de la app en modo reject, sobre un archivo propio."""
+    import anomaly
+    det = make("reject")
+    monkeypatch.setattr(anomaly.detector, "mode", det.mode)
+    monkeypatch.setattr(anomaly.detector, "_shared", det._shared)
+    return det
+
+
+def test_endpoints_reject_with_the_same_body(app, rejecting):
+    from seed import ADMIN_EMAIL, ADMIN_PASS
+    from db import db
+    from models import User, Customer
+
+    with app.app_context():
+        u = User(email="anomalia@test.local", role="customer", password_hash=User.UNUSABLE_PASSWORD)
+        db.session.add(u)
+        db.session.flush()
+        c = Customer(user_id=u.id, full_name="Anomalía", doc_number="66000001", member_number="T600001")
+        db.session.add(c)
+        db.session.commit()
+        customer_id = c.id
+
+    cl = app.test_client()
+    token = cl.post("/api/auth/login", json={"email": ADMIN_EMAIL, "password": ADMIN_PASS}).get_json()["access_token"]
+    auth = {"Authorization": f"Bearer {token}"}
+    purchase = lambda: cl.post("/api/purchases", headers=auth, json={
+        "customer_id": customer_id, "product_code": "NAFTA_SUPER", "liters": 10})
+    accredit = lambda: cl.post("/api/admin/accredit-by-dni", headers=auth, json={
+        "doc_number": "66000001", "product_code": "NAFTA_SUPER", "liters": 10})
+
+    for i in range(6):
+        assert (purchase if i % 2 else accredit)().status_code in (200, 201)
+
+    r_purchase, r_accredit = purchase(), accredit()
+    assert r_purchase.status_code == r_accredit.status_code == 409
+    body_p, body_a = r_purchase.get_json(), r_accredit.get_json()
+    assert set(body_p) == set(body_a) == {"ok", "error", "detail", "alerts"}
+    assert body_p["error"] == body_a["error"] == "anomaly_rejected"
+    # los rechazos no suman: los dos vieron 7 en la ventana
+    assert [a["value"] for a in body_p["alerts"] + body_a["alerts"] if a["scope"] == "customer"] == [7, 7]
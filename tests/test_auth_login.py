@@ -0,0 +1,41 @@
+# C:\Abetos_app\backend\tests\test_auth_login.py
+import pytest
+
+from db import db
+from models import User, Customer
+
+
+@pytest.fixture
+def imported_customer(app_ctx):
+    """Socio como lo deja bulk_import: sin contraseña utilizable."""
+    u = User(email="importado@test.local", role="customer", password_hash=User.UNUSABLE_PASSWORD)
+    db.session.add(u)
+    db.session.flush()
+    db.session.add(Customer(user_id=u.id, full_name="Importado", doc_number="77000001", member_number="T000001"))
+    db.session.commit()
+    yield u
+    Customer.query.filter_by(user_id=u.id).delete()
+    db.session.delete(u)
+    db.session.commit()
+
+
+@pytest.mark.parametrize("body", [
+    {"email": "importado@test.local", "password": "cualquiera"},
+    {"doc_number": "77.000.001", "password": "cualquiera"},
+])
+def test_imported_account_is_indistinguishable_from_unknown(app, imported_customer, body):
+    cl = app.test_client()
+    unknown = {k: ("nadie@test.local" if k == "email" else "77999999") if k != "password" else v
+               for k, v in body.items()}
+
+    r_imported = cl.post("/api/auth/login", json=body)
+    r_unknown = cl.post("/api/auth/login", json=unknown)
+
+    assert r_imported.status_code == r_unknown.status_code == 401
+    assert r_imported.get_json() == r_unknown.get_json() == {"error": "invalid_credentials"}
+
+
+def test_wrong_password_is_invalid_credentials(app):
+    r = app.test_client().post("/api/auth/login", json={"email": "clerk@abetos.local", "password": "mal"})
+    assert r.status_code == 401
+    assert r.get_json() == {"error": "invalid_credentials"}
@@ -0,0 +1,17 @@
+# C:\Abetos_app\backend\tests\test_bulk_import.py
+import pytest
+
+import bulk_import
+
+
+@pytest.mark.parametrize("saldo", ["inf", "-inf", "nan", "1e400", "1e12", "muchos"])
+def test_bad_points_are_rejected_without_aborting(app_ctx, saldo):
+    st = bulk_import.import_text(
+        "dni,nombre,saldo\n"
+        f"41000001,Malo,{saldo}\n"
+        "41000002,Bueno,150\n",
+        dry_run=True, max_rejects_kept=10,
+    )
+    assert (st["read"], st["imported"], st["rejected"]) == (2, 1, 1)
+    assert st["rejects"] == [{"line": 2, "reason": "invalid_points", "doc_number": "41000001"}]
+    assert st["opening_points"] == 150
@@ -0,0 +1,72 @@
+# C:\Abetos_app\backend\tests\test_cachebus.py
+import itertools
+
+import pytest
+from sqlalchemy import select, delete
+
+from db import db
+from models import CacheVersion, Customer, User
+import cachebus
+
+
+_dni = itertools.count(52000001)
+
+
+def _version(key):
+    return db.session.execute(select(CacheVersion.version).where(CacheVersion.key == key)).scalar()
+
+
+@pytest.fixture
+def customer(app_ctx):
+    dni = str(next(_dni))
+    u = User(email=f"cb{dni}@test.local", role="customer", password_hash=User.UNUSABLE_PASSWORD)
+    db.session.add(u)
+    db.session.flush()
+    c = Customer(user_id=u.id, full_name="Cache Bus", doc_number=dni, member_number=f"C{dni}")
+    db.session.add(c)
+    db.session.commit()
+    return c
+
+
+def test_keys_are_seeded(app_ctx):
+    keys = set(db.session.execute(select(CacheVersion.key)).scalars())
+    assert set(cachebus.KEYS) <= keys
+
+
+def test_registration_does_not_touch_customers(app, app_ctx):
+    before = _version(cachebus.CUSTOMERS)
+    dni = str(next(_dni))
+    r = app.test_client().post("/api/auth/register", json={
+        "email": f"alta{dni}@test.local", "password": "Clave123", "full_name": "Alta", "doc_number": dni})
+    assert r.status_code == 201
+    db.session.rollback()
+    assert _version(cachebus.CUSTOMERS) == before
+
+
+def test_contact_edits_do_not_touch_customers(customer):
+    before = _version(cachebus.CUSTOMERS)
+    customer.phone = "+54 9 11 0000-0000"
+    customer.full_name = "Otro Nombre"
+    db.session.commit()
+    assert _version(cachebus.CUSTOMERS) == before
+
+
+@pytest.mark.parametrize("column, value", [
+    ("doc_number", lambda c: str(next(_dni))),
+    ("member_number", lambda c: f"X{c.id}"),
+    ("tier", lambda c: "gold"),
+])
+def test_cached_columns_touch_customers(customer, column, value):
+    before = _version(cachebus.CUSTOMERS)
+    setattr(customer, column, value(customer))
+    db.session.commit()
+    assert _version(cachebus.CUSTOMERS) == before + 1
+
+
+def test_first_touch_of_a_new_key_is_an_upsert(app_ctx):
+    db.session.execute(delete(CacheVersion.__table__).where(CacheVersion.key == "nueva"))
+    db.session.commit()
+    for _ in range(2):  # sin fila: el primero inserta, el segundo suma (sin IntegrityError)
+        with db.engine.begin() as conn:
+            cachebus.touch(conn, "nueva")
+    assert _version("nueva") == 2
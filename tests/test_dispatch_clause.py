@@ -0,0 +1,73 @@
+# C:\Abetos_app\backend\tests\test_dispatch_clause.py
+import itertools
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import select
+
+from db import db
+from models import Customer, Transaction, Reward, Redemption, DailySketch
+import bulk_import
+import leaderboard
+import redemptions
+import segments
+import sketches
+
+
+_dni = itertools.count(30111222)
+
+
+@pytest.fixture
+def migrated_customer(app_ctx):
+    """Socio importado con saldo inicial y un canje rechazado (reintegro)."""
+    dni = str(next(_dni))
+    st = bulk_import.import_text(f"dni,nombre,saldo\n{dni},Juan Perez,5000\n")
+    assert st["imported"] == 1
+    c = Customer.query.filter_by(doc_number=dni).one()
+
+    reward = Reward.query.first()
+    red = Redemption(customer_id=c.id, reward_id=reward.id, points_spent=reward.required_points,
+                     status=Redemption.STATUS_PENDING, code=f"T-REFUND-{dni}")
+    db.session.add(red)
+    db.session.commit()
+    assert redemptions.transition(db.session, "reject", ids=[red.id])["updated"] == 1
+    db.session.commit()
+    return c
+
+
+def test_opening_balance_is_marked(migrated_customer):
+    kinds = db.session.execute(
+        select(Transaction.product_code).where(Transaction.customer_id == migrated_customer.id)
+        .order_by(Transaction.id)
+    ).scalars().all()
+    assert kinds[0] == Transaction.OPENING_CODE
+    assert kinds[1].startswith(Transaction.REFUND_PREFIX)
+    # el saldo sigue contando para el cliente
+    assert migrated_customer.points_balance == 5000 + Reward.query.first().required_points
+
+
+def test_rebuilds_only_count_dispatches(migrated_customer):
+    cid = migrated_customer.id
+
+    period = leaderboard.current_period()
+    leaderboard.rebuild_period(period)
+    assert cid not in {r["customer_id"] for r in leaderboard.top_n(period, limit=1000)}
+
+    today = date.today()
+    sketches.backfill(db.session, today, today)
+    products = set(db.session.execute(
+        select(DailySketch.product_code).where(DailySketch.day == today)).scalars())
+    assert not any(p.startswith(Transaction.REFUND_PREFIX) or p == Transaction.OPENING_CODE for p in products)
+
+    assert cid not in set(segments.collect([db.session])["ids"])
+
+
+def test_dispatch_clause_matches_the_rows(migrated_customer):
+    db.session.add(Transaction(customer_id=migrated_customer.id, kind=Transaction.KIND_EARN, points=10,
+                               liters=10.0, product_code="NAFTA_SUPER", created_at=datetime.utcnow()))
+    db.session.commit()
+    rows = db.session.execute(
+        select(Transaction.product_code).where(Transaction.customer_id == migrated_customer.id,
+                                               Transaction.dispatch_clause())
+    ).scalars().all()
+    assert rows == ["NAFTA_SUPER"]
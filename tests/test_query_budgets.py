@@ -0,0 +1,56 @@
+# C:\Abetos_app\backend\tests\test_query_budgets.py
+"""
+query_audit.py como test: cantidad de sentencias y full scans por endpoint.
+
+Corre en un proceso aparte (app y DB SQLite propias, como en CI). El
+presupuesto tiene que ser exactamente lo observado: si sube, falla; si baja,
+también (hay que bajar el presupuesto en ENDPOINTS para que no quede holgura
+por donde se cuele la próxima suba).
+"""
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+from conftest import ROOT
+
+
+@pytest.fixture(scope="module")
+def results(tmp_path_factory):
+    uri = f"sqlite:///{tmp_path_factory.mktemp('audit') / 'audit.db'}"
+    proc = subprocess.run([sys.executable, "query_audit.py", "--json", uri], cwd=ROOT,
+                          capture_output=True, text=True, timeout=600, env=dict(os.environ))
+    line = next((ln for ln in proc.stdout.splitlines() if ln.startswith("QUERY_AUDIT_JSON ")), None)
+    assert line is not None, proc.stdout[-2000:] + proc.stderr[-4000:]
+    return {r["name"]: r for r in json.loads(line[len("QUERY_AUDIT_JSON "):])}
+
+
+def _endpoints():
+    sys.path.insert(0, ROOT)
+    import query_audit
+    return [e[0] for e in query_audit.ENDPOINTS]
+
+
+def _detail(r: dict) -> str:
+    return "\n".join(["sentencias:"] + [f"  {s}" for s in r["statements"]])
+
+
+@pytest.mark.parametrize("name", _endpoints())
+def test_endpoint_within_budget(results, name):
+    r = results[name]
+    assert r["status"] < 500, f"{name}: status {r['status']}"
+    assert not r["bad_scans"], f"{name}: full scan de {r['bad_scans']}\n{_detail(r)}"
+    assert r["sql"] <= r["budget"], (
+        f"{name}: {r['sql']} sentencias, presupuesto {r['budget']}. Si la suba es deliberada, "
+        f"subir el presupuesto en query_audit.ENDPOINTS con su justificación.\n{_detail(r)}"
+    )
+
+
+@pytest.mark.parametrize("name", _endpoints())
+def test_budget_is_tight(results, name):
+    r = results[name]
+    assert r["sql"] >= r["budget"], (
+        f"{name}: {r['sql']} sentencias, presupuesto {r['budget']}: bajar el presupuesto a {r['sql']}"
+    )
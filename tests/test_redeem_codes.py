@@ -0,0 +1,99 @@
+# C:\Abetos_app\backend\tests\test_redeem_codes.py
+import time
+import struct
+
+import pytest
+
+import redeem_codes
+from email_utils import _b64, _unb64
+
+
+def _flip(raw: bytes, i: int) -> bytes:
+    return raw[:i] + bytes([raw[i] ^ 0x01]) + raw[i + 1:]
+
+
+def test_roundtrip():
+    code = redeem_codes.generate_code(123, 45)
+    assert len(code) <= 30  # Redemption.code String(30)
+    payload = redeem_codes.verify_code(code)
+    assert (payload["redemption_id"], payload["reward_id"]) == (123, 45)
+
+
+def test_distinct_redemptions_never_share_a_code():
+    codes = {redeem_codes.generate_code(i, i % 50 + 1) for i in range(1, 20001)}
+    assert len(codes) == 20000
+
+
+@pytest.mark.parametrize("i", range(12))  # cada byte del payload (id | reward | exp)
+def test_tampered_payload_is_rejected(i):
+    raw = _unb64(redeem_codes.generate_code(1000, 7))
+    with pytest.raises(ValueError, match="firma"):
+        redeem_codes.verify_code(_b64(_flip(raw, i)))
+
+
+def test_forged_payload_for_other_redemption_is_rejected():
+    raw = _unb64(redeem_codes.generate_code(1000, 7))
+    forged = struct.pack(">III", 1001, 7, struct.unpack(">III", raw[:12])[2]) + raw[12:]
+    with pytest.raises(ValueError, match="firma"):
+        redeem_codes.verify_code(_b64(forged))
+
+
+@pytest.mark.parametrize("i", range(12, 20))
+def test_tampered_signature_is_rejected(i):
+    raw = _unb64(redeem_codes.generate_code(1000, 7))
+    with pytest.raises(ValueError, match="firma"):
+        redeem_codes.verify_code(_b64(_flip(raw, i)))
+
+
+def test_code_signed_with_other_key_is_rejected(monkeypatch):
+    monkeypatch.setattr(redeem_codes, "_KEY", b"otra-clave")
+    code = redeem_codes.generate_code(1000, 7)
+    monkeypatch.undo()
+    with pytest.raises(ValueError, match="firma"):
+        redeem_codes.verify_code(code)
+
+
+@pytest.mark.parametrize("code", ["", "no-es-base64!!", _b64(b"corto"), _b64(b"x" * 40)])
+def test_malformed_code_is_rejected(code):
+    with pytest.raises(ValueError):
+        redeem_codes.verify_code(code)
+
+
+def test_expired_code_is_rejected():
+    code = redeem_codes.generate_code(1000, 7, ttl_sec=60)
+    exp = redeem_codes.verify_code(code)["exp"]
+    assert redeem_codes.verify_code(code, now=exp)["exp"] == exp  # vale hasta exp inclusive
+    with pytest.raises(ValueError, match="expirado"):
+        redeem_codes.verify_code(code, now=exp + 1)
+    with pytest.raises(ValueError, match="expirado"):
+        redeem_codes.verify_code(redeem_codes.generate_code(1000, 7, ttl_sec=-1), now=int(time.time()))
+
+
+def test_mark_used_consumes_the_code_once(app_ctx):
+    from db import db
+    from models import Customer, Reward, Redemption
+
+    customer = Customer.query.first()
+    reward = Reward.query.first()
+    red = Redemption(customer_id=customer.id, reward_id=reward.id, points_spent=reward.required_points,
+                     status=Redemption.STATUS_PENDING)
+    db.session.add(red)
+    db.session.flush()
+    red.code = redeem_codes.generate_code(red.id, reward.id)
+    db.session.commit()
+
+    first = redeem_codes.mark_used(db.session, red.code)
+    db.session.commit()
+    assert first is not None and first["redemption_id"] == red.id
+
+    assert redeem_codes.mark_used(db.session, red.code) is None
+    db.session.rollback()
+    db.session.refresh(red)
+    assert red.status == Redemption.STATUS_APPROVED
+
+
+def test_mark_used_rejects_valid_signature_for_unknown_redemption(app_ctx):
+    from db import db
+
+    assert redeem_codes.mark_used(db.session, redeem_codes.generate_code(10 ** 9, 1)) is None
+    db.session.rollback()
@@ -0,0 +1,106 @@
+# C:\Abetos_app\backend\tests\test_revocation.py
+import time
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from db import db
+from revocation import Denylist
+
+
+def _payload(jti=None, sub="7", iat=None):
+    return {"jti": jti or uuid.uuid4().hex, "sub": sub, "iat": time.time() if iat is None else iat}
+
+
+def _wait_for(fn, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if fn():
+            return True
+        time.sleep(0.01)
+    return fn()
+
+
+def _workers(tmp_path, **kw):
+    stamp = str(tmp_path / "revocation.stamp")
+    kw.setdefault("poll_sec", 0)  # sin recarga completa: solo el stamp avisa
+    kw.setdefault("stamp_poll_sec", 0.05)
+    return Denylist(stamp_path=stamp, **kw), Denylist(stamp_path=stamp, **kw)
+
+
+def test_revoked_jti_propagates_to_other_worker(app_ctx, tmp_path):
+    a, b = _workers(tmp_path)
+    tok = _payload()
+    try:
+        assert not a.is_revoked(tok)
+        assert not b.is_revoked(tok)
+
+        a.revoke_jti(tok["jti"], datetime.utcnow() + timedelta(hours=1), user_id=7)
+
+        assert a.is_revoked(tok)  # el que revoca lo ve en el acto
+        assert _wait_for(lambda: b.is_revoked(tok))
+        assert not b.is_revoked(_payload())
+    finally:
+        a.stop()
+        b.stop()
+
+
+def test_revoked_user_propagates_to_other_worker(app_ctx, tmp_path):
+    a, b = _workers(tmp_path)
+    old = _payload(sub="42", iat=time.time() - 60)
+    try:
+        assert not b.is_revoked(old)
+        a.revoke_user(42, timedelta(hours=1))
+        assert _wait_for(lambda: b.is_revoked(old))
+        assert not b.is_revoked(_payload(sub="42", iat=time.time() + 1))  # emitido después del corte
+    finally:
+        a.stop()
+        b.stop()
+
+
+def test_check_does_not_query_the_db(app_ctx, tmp_path):
+    a, b = _workers(tmp_path, stamp_poll_sec=10)
+    tok = _payload()
+    b.is_revoked(tok)  # carga inicial del proceso
+
+    me = threading.get_ident()
+    on_request_thread = []
+
+    def count(*_args):
+        if threading.get_ident() == me:
+            on_request_thread.append(1)
+
+    event.listen(db.engine, "before_cursor_execute", count)
+    try:
+        a.revoke_jti(tok["jti"], datetime.utcnow() + timedelta(hours=1))
+        on_request_thread.clear()
+        # la recarga la hace el vigía (despertado por el request que ve el stamp)
+        assert _wait_for(lambda: b.is_revoked(tok))
+        for _ in range(100):
+            b.is_revoked(_payload())
+        assert on_request_thread == []
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count)
+        a.stop()
+        b.stop()
+
+
+def test_full_reload_never_exposes_empty_state(app_ctx, tmp_path):
+    a, _ = _workers(tmp_path)
+    tok = _payload()
+    a.revoke_jti(tok["jti"], datetime.utcnow() + timedelta(hours=1))
+
+    b = Denylist(stamp_path=str(tmp_path / "revocation.stamp"), poll_sec=0.001, stamp_poll_sec=0.001)
+    try:
+        assert b.is_revoked(tok)
+        misses = 0
+        end = time.monotonic() + 1.0
+        while time.monotonic() < end:  # el vigía recarga completo sin parar
+            if not b.is_revoked(tok):
+                misses += 1
+        assert misses == 0
+        assert b.stats()["revoked_jtis"] >= 1
+    finally:
+        b.stop()
@@ -0,0 +1,100 @@
+# C:\Abetos_app\backend\tests\test_sharding.py
+import sqlite3
+
+import pytest
+
+from db import db
+from models import User, Customer
+
+
+@pytest.fixture
+def sharded(tmp_path, monkeypatch):
+    """App aparte con dos shards SQLite (norte, sur) además de la DB principal."""
+    import seed
+    import rules
+    from app import create_app
+    from cachebus import bus
+
+    files = {name: tmp_path / f"{name}.db" for name in ("main", "norte", "sur")}
+    monkeypatch.setenv("SQLALCHEMY_DATABASE_URI", f"sqlite:///{files['main']}")
+    monkeypatch.setenv("STATION_SHARDS", f"norte=sqlite:///{files['norte']},sur=sqlite:///{files['sur']}")
+    monkeypatch.setattr(bus, "_app", bus._app)  # el vigía sigue atado a la app de los demás tests
+    monkeypatch.setattr(rules, "_cache", {})
+
+    seed.main()  # migraciones en la principal y en los dos shards
+    app = create_app()
+    app.config["TESTING"] = True
+
+    with app.app_context():
+        ids = []
+        for i in range(2):
+            u = User(email=f"shard{i}@test.local", role="customer", password_hash=User.UNUSABLE_PASSWORD)
+            db.session.add(u)
+            db.session.flush()
+            c = Customer(user_id=u.id, full_name=f"Shard {i}", doc_number=f"6300000{i}", member_number=f"S{i}")
+            db.session.add(c)
+            db.session.flush()
+            ids.append(c.id)
+        db.session.commit()
+
+    cl = app.test_client()
+    token = cl.post("/api/auth/login", json={"email": seed.ADMIN_EMAIL, "password": seed.ADMIN_PASS}) \
+        .get_json()["access_token"]
+    yield app, cl, {"Authorization": f"Bearer {token}"}, files, ids
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def _rows(path, sql):
+    with sqlite3.connect(path) as conn:
+        return conn.execute(sql).fetchall()
+
+
+def _purchase(cl, headers, customer_id, liters, station_id=None):
+    r = cl.post("/api/purchases", headers=headers, json={
+        "customer_id": customer_id, "product_code": "NAFTA_SUPER", "liters": liters, "station_id": station_id})
+    assert r.status_code == 201, r.get_json()
+    return r.get_json()
+
+
+def test_writes_land_in_the_station_shard(sharded):
+    app, cl, headers, files, (c1, _c2) = sharded
+    _purchase(cl, headers, c1, 10, "norte")
+    _purchase(cl, headers, c1, 20, "sur")
+    _purchase(cl, headers, c1, 30, "sur")
+    _purchase(cl, headers, c1, 40)            # estación por defecto -> DB principal
+    _purchase(cl, headers, c1, 50, "oeste")   # sin shard propio -> DB principal
+
+    sql = "SELECT station_id, points FROM transactions WHERE customer_id = %d ORDER BY id" % c1
+    assert _rows(files["norte"], sql) == [("norte", 10)]
+    assert _rows(files["sur"], sql) == [("sur", 20), ("sur", 30)]
+    assert _rows(files["main"], sql) == [("main", 40), ("oeste", 50)]
+
+    # tablas derivadas del ledger junto a sus filas (leaderboard en el shard)
+    lb = "SELECT SUM(points) FROM leaderboard_scores WHERE product_code = '*' AND customer_id = %d" % c1
+    assert _rows(files["norte"], lb) == [(10,)]
+    assert _rows(files["sur"], lb) == [(50,)]
+    assert _rows(files["main"], lb) == [(90,)]
+    # customers es global: los shards no la tienen
+    assert _rows(files["norte"], "SELECT name FROM sqlite_master WHERE name = 'customers'") == []
+
+
+def test_balances_sum_across_shards(sharded):
+    from sharding import router
+
+    app, cl, headers, _files, (c1, c2) = sharded
+    _purchase(cl, headers, c1, 10, "norte")
+    _purchase(cl, headers, c1, 20, "sur")
+    _purchase(cl, headers, c1, 30)
+    _purchase(cl, headers, c2, 5, "sur")
+
+    with app.app_context():
+        assert len(router.ledger_sessions()) == 3
+        assert router.balance(c1) == 60
+        assert router.balance(c2) == 5
+        assert router.balances([c1, c2, c1, 999999]) == {c1: 60, c2: 5, 999999: 0}
+
+    last = _purchase(cl, headers, c1, 1, "norte")
+    assert last["new_balance"] == 61
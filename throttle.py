@@ -0,0 +1,242 @@
+# C:\Abetos_app\backend\throttle.py
+"""
+Throttling de /api/auth/login con token buckets por IP y por identificador
+(email o DNI), compartidos entre los workers de gunicorn del mismo host.
+
+- Estado en un archivo mapeado en memoria (mmap, MAP_SHARED) de tamaño fijo:
+  tabla asociativa por conjuntos (WAYS slots por conjunto); cuando un conjunto
+  se llena se reemplaza el slot usado hace más tiempo (LRU). Memoria acotada:
+  LOGIN_THROTTLE_SLOTS * 24 bytes.
+- Exclusión entre procesos con fcntl.flock (sección crítica de microsegundos),
+  entre threads con un Lock. Cada proceso abre su propio descriptor (post-fork).
+- El chequeo va ANTES de cualquier consulta a la DB o hash de contraseña:
+  un intento rechazado no cuesta más que un hash blake2b y un par de lecturas.
+- Un intento rechazado no consume tokens; un login correcto repone el bucket
+  del identificador.
+- Sin fcntl (Windows) cae a una tabla LRU en memoria por proceso.
+
+Variables:
+    LOGIN_THROTTLE              on | off (default on)
+    LOGIN_THROTTLE_FILE         default <tmp>/abetos_login_throttle.bin
+    LOGIN_THROTTLE_SLOTS        default 65536
+    LOGIN_IP_BURST / LOGIN_IP_PER_MIN   default 20 / 10
+    LOGIN_ID_BURST / LOGIN_ID_PER_MIN   default 5 / 2
+    TRUSTED_PROXY_HOPS          proxies delante de la app (para X-Forwarded-For), default 0
+"""
+import os
+import math
+import time
+import struct
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+try:
+    import fcntl
+    import mmap
+except ImportError:  # Windows
+    fcntl = None
+    mmap = None
+
+
+WAYS = 8
+_SLOT = struct.Struct("<Qdd")  # clave (hash 64 bits), tokens, último acceso (epoch)
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+class _FileTable:
+    """Tabla de buckets en un archivo compartido (mmap)."""
+
+    def __init__(self, path: str, slots: int):
+        self.path = path
+        self.sets = max(1, slots // WAYS)
+        self.size = self.sets * WAYS * _SLOT.size
+        self._pid = None
+        self._fd = None
+        self._mm = None
+
+    def _open(self) -> None:
+        if self._pid == os.getpid():
+            return
+        # tras un fork hay que reabrir: flock sobre un descriptor heredado no excluye
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(fd).st_size < self.size:
+            os.ftruncate(fd, self.size)
+        self._fd = fd
+        self._mm = mmap.mmap(fd, self.size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        self._pid = os.getpid()
+
+    def lock(self):
+        self._open()
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+
+    def unlock(self):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def find(self, key: int):
+        """(offset, tokens, ts) del slot de la clave, o (offset del slot a reemplazar, None, None)."""
+        mm = self._mm
+        base = (key % self.sets) * WAYS * _SLOT.size
+        victim, victim_ts = base, math.inf
+        for off in range(base, base + WAYS * _SLOT.size, _SLOT.size):
+            k, tokens, ts = _SLOT.unpack_from(mm, off)
+            if k == key:
+                return off, tokens, ts
+            if k == 0:
+                ts = -1.0
+            if ts < victim_ts:
+                victim, victim_ts = off, ts
+        return victim, None, None
+
+    def write(self, off: int, key: int, tokens: float, ts: float) -> None:
+        _SLOT.pack_into(self._mm, off, key, tokens, ts)
+
+    def clear(self, off: int) -> None:
+        _SLOT.pack_into(self._mm, off, 0, 0.0, 0.0)
+
+    def used(self) -> int:
+        self._open()
+        return sum(1 for (k, _t, _s) in _SLOT.iter_unpack(self._mm) if k)
+
+
+class _LocalTable:
+    """Fallback por proceso: mismo contrato, LRU con OrderedDict."""
+
+    def __init__(self, slots: int):
+        self.maxsize = slots
+        self._data = OrderedDict()
+
+    def lock(self):
+        pass
+
+    def unlock(self):
+        pass
+
+    def find(self, key: int):
+        v = self._data.get(key)
+        if v is None:
+            return key, None, None
+        return key, v[0], v[1]
+
+    def write(self, off: int, key: int, tokens: float, ts: float) -> None:
+        self._data[key] = (tokens, ts)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self, off: int) -> None:
+        self._data.pop(off, None)
+
+    def used(self) -> int:
+        return len(self._data)
+
+
+class LoginThrottle:
+    def __init__(self):
+        self.enabled = os.getenv("LOGIN_THROTTLE", "on").strip().lower() not in ("off", "0", "false")
+        slots = int(_env_float("LOGIN_THROTTLE_SLOTS", 65536))
+        path = os.getenv("LOGIN_THROTTLE_FILE", os.path.join(tempfile.gettempdir(), "abetos_login_throttle.bin"))
+
+        # bucket -> (capacidad, tokens por segundo)
+        self.limits = {
+            "ip": (_env_float("LOGIN_IP_BURST", 20), _env_float("LOGIN_IP_PER_MIN", 10) / 60.0),
+            "id": (_env_float("LOGIN_ID_BURST", 5), _env_float("LOGIN_ID_PER_MIN", 2) / 60.0),
+        }
+        self.proxy_hops = int(_env_float("TRUSTED_PROXY_HOPS", 0))
+
+        self._table = _FileTable(path, slots) if fcntl is not None else _LocalTable(slots)
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    @staticmethod
+    def _key(kind: str, value: str) -> int:
+        h = hashlib.blake2b(f"{kind}:{value}".encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(h, "little") or 1
+
+    def _keys(self, ip: Optional[str], identifier: Optional[str]) -> list:
+        out = []
+        if ip:
+            out.append(("ip", self._key("ip", ip)))
+        if identifier:
+            out.append(("id", self._key("id", identifier.strip().lower())))
+        return out
+
+    def client_ip(self, req) -> str:
+        """IP del cliente; con proxies de confianza toma la entrada correspondiente de X-Forwarded-For."""
+        if self.proxy_hops > 0:
+            xff = [p.strip() for p in (req.headers.get("X-Forwarded-For") or "").split(",") if p.strip()]
+            if len(xff) >= self.proxy_hops:
+                return xff[-self.proxy_hops]
+        return req.remote_addr or "-"
+
+    def acquire(self, ip: Optional[str], identifier: Optional[str], now: Optional[float] = None) -> float:
+        """
+        Consume un token de cada bucket (IP e identificador) si todos tienen.
+        Devuelve 0 si el intento pasa, o los segundos a esperar si se rechaza.
+        """
+        if not self.enabled:
+            return 0.0
+        now = time.time() if now is None else now
+        keys = self._keys(ip, identifier)
+
+        with self._lock:
+            t = self._table
+            t.lock()
+            try:
+                state, wait = [], 0.0
+                for kind, key in keys:
+                    cap, rate = self.limits[kind]
+                    off, tokens, ts = t.find(key)
+                    if tokens is None:
+                        tokens = cap
+                    else:
+                        tokens = min(cap, tokens + max(0.0, now - ts) * rate)
+                    if tokens < 1.0:
+                        wait = max(wait, (1.0 - tokens) / rate if rate > 0 else 3600.0)
+                    state.append((off, key, tokens))
+
+                if wait > 0:
+                    self.rejected += 1
+                    return wait
+
+                for off, key, tokens in state:
+                    t.write(off, key, tokens - 1.0, now)
+                return 0.0
+            finally:
+                t.unlock()
+
+    def success(self, identifier: Optional[str]) -> None:
+        """Login correcto: el identificador recupera su cupo completo."""
+        if not self.enabled or not identifier:
+            return
+        key = self._key("id", identifier.strip().lower())
+        with self._lock:
+            t = self._table
+            t.lock()
+            try:
+                off, tokens, _ts = t.find(key)
+                if tokens is not None:
+                    t.clear(off)
+            finally:
+                t.unlock()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "backend": "file" if isinstance(self._table, _FileTable) else "local",
+            "slots_used": self._table.used(),
+            "rejected_here": self.rejected,
+            "limits": {k: {"burst": c, "per_min": r * 60} for k, (c, r) in self.limits.items()},
+        }
+
+
+# Instancia única por proceso (el estado vive en el archivo compartido)
+login_throttle = LoginThrottle()
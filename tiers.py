@@ -0,0 +1,360 @@
+# C:\Abetos_app\backend\tiers.py
+"""
+Niveles de cliente (base / silver / gold / platinum) por litros de los
+últimos TIER_WINDOW_DAYS días.
+
+El estado vive en la fila de customers (tier, tier_liters_90d,
+tier_spend_90d, tier_since): leer el nivel es O(1), sin tocar transactions.
+
+- Incremental: cada earn con litros o $ suma al bucket de su día
+  (customer_tier_buckets) y a los acumuladores del cliente, y recalcula el
+  nivel. Con el ledger en la DB principal va en la misma transacción
+  (listener after_insert); si el ledger está en un shard de estación, se
+  aplica en la DB principal apenas commitea el shard (after_commit).
+- Nocturno (python tiers.py slide): resta en bloque los buckets que salen de
+  la ventana, los borra y recalcula niveles.
+- Reparación (python tiers.py rebuild): reconstruye buckets y acumuladores
+  desde transactions (principal + shards).
+
+Cada cambio de nivel deja un evento customer.tier_changed en el outbox.
+
+Variables:
+    TIER_WINDOW_DAYS   días de la ventana (default 90)
+    TIER_THRESHOLDS    litros mínimos por nivel (default "silver=300,gold=800,platinum=1500")
+    TIER_MULTIPLIERS   multiplicador de puntos por nivel (default: ninguno,
+                       p.ej. "silver=1.05,gold=1.1,platinum=1.2")
+"""
+import os
+import sys
+from datetime import datetime, date, timedelta
+from typing import Optional
+
+from flask import current_app
+from sqlalchemy import event, select, update, insert, delete, func, case, exists, bindparam, literal, or_
+from sqlalchemy.orm import Session, object_session
+
+from db import db
+from models import Customer, CustomerTierBucket, Transaction, OutboxEvent
+import outbox
+import cachebus
+
+
+WINDOW_DAYS = int(os.getenv("TIER_WINDOW_DAYS", "90"))
+_PENDING = "tier_pending"
+
+
+def _parse_pairs(raw: str, cast) -> dict:
+    out = {}
+    for part in (raw or "").split(","):
+        if "=" not in part:
+            continue
+        k, v = part.split("=", 1)
+        try:
+            out[k.strip().lower()] = cast(v.strip())
+        except ValueError:
+            continue
+    return out
+
+
+# de mayor a menor: [("platinum", 1500.0), ("gold", 800.0), ("silver", 300.0)]
+THRESHOLDS = sorted(
+    _parse_pairs(os.getenv("TIER_THRESHOLDS", "silver=300,gold=800,platinum=1500"), float).items(),
+    key=lambda kv: kv[1], reverse=True,
+)
+MULTIPLIERS = _parse_pairs(os.getenv("TIER_MULTIPLIERS", ""), float)
+
+
+def tier_for(liters: float) -> str:
+    for name, minimum in THRESHOLDS:
+        if liters >= minimum:
+            return name
+    return Customer.TIER_BASE
+
+
+def multiplier(tier: Optional[str]) -> float:
+    return MULTIPLIERS.get((tier or "").lower(), 1.0)
+
+
+def cutoff(today: Optional[date] = None) -> date:
+    """Último día que ya quedó FUERA de la ventana."""
+    return (today or datetime.utcnow().date()) - timedelta(days=WINDOW_DAYS)
+
+
+def _tier_case(col):
+    if not THRESHOLDS:
+        return literal(Customer.TIER_BASE)
+    return case(*[(col >= minimum, name) for name, minimum in THRESHOLDS], else_=Customer.TIER_BASE)
+
+
+# ------------------------------------------------------
+# Incremental
+# ------------------------------------------------------
+def _bucket_upsert_stmt(conn):
+    """INSERT ... ON CONFLICT que suma (sqlite / postgres) o None."""
+    dialect = conn.dialect.name
+    if dialect not in ("sqlite", "postgresql"):
+        return None
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as d_insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert as d_insert
+
+    tbl = CustomerTierBucket.__table__
+    stmt = d_insert(tbl)
+    return stmt.on_conflict_do_update(
+        index_elements=[tbl.c.customer_id, tbl.c.day],
+        set_={"liters": tbl.c.liters + stmt.excluded.liters, "spend": tbl.c.spend + stmt.excluded.spend},
+    )
+
+
+def _upsert_bucket(conn, customer_id: int, day: date, liters: float, spend: float) -> None:
+    tbl = CustomerTierBucket.__table__
+    values = {"customer_id": customer_id, "day": day, "liters": liters, "spend": spend}
+
+    stmt = _bucket_upsert_stmt(conn)
+    if stmt is not None:
+        conn.execute(stmt, values)
+        return
+
+    res = conn.execute(
+        update(tbl)
+        .where(tbl.c.customer_id == customer_id, tbl.c.day == day)
+        .values(liters=tbl.c.liters + liters, spend=tbl.c.spend + spend)
+    )
+    if not res.rowcount:
+        conn.execute(insert(tbl).values(**values))
+
+
+def _emit_changes(conn, changes: list, now: datetime) -> None:
+    """changes: [(customer_id, tier_anterior, tier_nuevo, litros)]"""
+    cachebus.touch(conn, cachebus.CUSTOMERS)  # caches con el nivel del cliente (forecourt)
+    outbox.emit_many(conn, OutboxEvent.TOPIC_TIER, [
+        (cid, {"customer_id": cid, "from": old, "to": new, "liters_90d": round(liters, 3),
+               "at": now.isoformat()})
+        for cid, old, new, liters in changes
+    ])
+
+
+def apply(conn, customer_id: int, created_at: Optional[datetime], liters: float, spend: float) -> Optional[str]:
+    """Suma un despacho. Devuelve el nivel nuevo si cambió."""
+    now = datetime.utcnow()
+    day = (created_at or now).date()
+    if day <= cutoff(now.date()):
+        return None  # ya fuera de la ventana (carga atrasada)
+
+    _upsert_bucket(conn, customer_id, day, liters, spend)
+
+    c = Customer.__table__
+    stmt = (update(c).where(c.c.id == customer_id)
+            .values(tier_liters_90d=c.c.tier_liters_90d + liters, tier_spend_90d=c.c.tier_spend_90d + spend))
+    if conn.dialect.update_returning:
+        row = conn.execute(stmt.returning(c.c.tier, c.c.tier_liters_90d)).first()
+    else:
+        conn.execute(stmt)
+        row = conn.execute(select(c.c.tier, c.c.tier_liters_90d).where(c.c.id == customer_id)).first()
+    if row is None:
+        return None
+
+    new = tier_for(row.tier_liters_90d)
+    if new == row.tier:
+        return None
+    conn.execute(update(c).where(c.c.id == customer_id).values(tier=new, tier_since=now))
+    _emit_changes(conn, [(customer_id, row.tier, new, row.tier_liters_90d)], now)
+    return new
+
+
+def apply_many(conn, txs: list) -> int:
+    """
+    apply() para un lote insertado por Core (ingesta de despachos), por
+    conjuntos: un executemany para los buckets, uno para los acumuladores,
+    una lectura de los niveles y un executemany para los que cambian.
+    Devuelve cuántos clientes cambiaron de nivel.
+    """
+    now = datetime.utcnow()
+    edge = cutoff(now.date())
+    buckets, totals = {}, {}
+    for t in txs:
+        if t.get("kind") != Transaction.KIND_EARN or (t.get("liters") is None and t.get("amount_pesos") is None):
+            continue
+        day = (t.get("created_at") or now).date()
+        if day <= edge:
+            continue  # ya fuera de la ventana (carga atrasada)
+        liters, spend = float(t.get("liters") or 0.0), float(t.get("amount_pesos") or 0.0)
+        for acc, key in ((buckets, (t["customer_id"], day)), (totals, t["customer_id"])):
+            prev = acc.get(key, (0.0, 0.0))
+            acc[key] = (prev[0] + liters, prev[1] + spend)
+    if not totals:
+        return 0
+
+    stmt = _bucket_upsert_stmt(conn)
+    if stmt is None:
+        for (cid, day), (liters, spend) in buckets.items():
+            _upsert_bucket(conn, cid, day, liters, spend)
+    else:
+        conn.execute(stmt, [{"customer_id": cid, "day": day, "liters": liters, "spend": spend}
+                            for (cid, day), (liters, spend) in buckets.items()])
+
+    c = Customer.__table__
+    conn.execute(
+        update(c).where(c.c.id == bindparam("cid"))
+        .values(tier_liters_90d=c.c.tier_liters_90d + bindparam("l"),
+                tier_spend_90d=c.c.tier_spend_90d + bindparam("s")),
+        [{"cid": cid, "l": liters, "s": spend} for cid, (liters, spend) in totals.items()],
+    )
+
+    ids, changes = list(totals), []
+    for i in range(0, len(ids), 500):
+        for cid, old, liters in conn.execute(
+            select(c.c.id, c.c.tier, c.c.tier_liters_90d).where(c.c.id.in_(ids[i:i + 500]))
+        ):
+            new = tier_for(liters)
+            if new != old:
+                changes.append((cid, old, new, liters))
+    if changes:
+        conn.execute(
+            update(c).where(c.c.id == bindparam("cid")).values(tier=bindparam("new_tier"), tier_since=now),
+            [{"cid": cid, "new_tier": new} for cid, _, new, _ in changes],
+        )
+        _emit_changes(conn, changes, now)
+    return len(changes)
+
+
+def _on_transaction_insert(_mapper, connection, target):
+    if target.kind != Transaction.KIND_EARN or (target.liters is None and target.amount_pesos is None):
+        return
+    args = (target.customer_id, target.created_at, float(target.liters or 0.0), float(target.amount_pesos or 0.0))
+
+    if connection.engine is db.engine:
+        apply(connection, *args)
+        return
+
+    # ledger en un shard: customers está en otra DB -> después del commit
+    sess = object_session(target)
+    if sess is not None:
+        sess.info.setdefault(_PENDING, []).append(args)
+
+
+def _on_after_commit(session):
+    pending = session.info.pop(_PENDING, None)
+    if not pending:
+        return
+    try:
+        with db.engine.begin() as conn:
+            for args in pending:
+                apply(conn, *args)
+    except Exception:
+        # el despacho ya está commiteado; `python tiers.py rebuild` lo reconcilia
+        current_app.logger.exception("tiers: no se pudo aplicar %d despachos de shard", len(pending))
+
+
+def _on_after_rollback(session):
+    session.info.pop(_PENDING, None)
+
+
+def register() -> None:
+    """Engancha los listeners (idempotente; lo llama create_app)."""
+    for target, name, fn in (
+        (Transaction, "after_insert", _on_transaction_insert),
+        (Session, "after_commit", _on_after_commit),
+        (Session, "after_rollback", _on_after_rollback),
+    ):
+        if not event.contains(target, name, fn):
+            event.listen(target, name, fn)
+
+
+# ------------------------------------------------------
+# Nocturno y reparación
+# ------------------------------------------------------
+def _retier(conn, now: datetime) -> int:
+    """Pone el nivel que corresponde a los acumuladores; emite los cambios."""
+    c = Customer.__table__
+    new = _tier_case(c.c.tier_liters_90d)
+    rows = conn.execute(select(c.c.id, c.c.tier, new.label("new"), c.c.tier_liters_90d).where(c.c.tier != new)).all()
+    if not rows:
+        return 0
+
+    conn.execute(
+        update(c).where(c.c.id == bindparam("cid")).values(tier=bindparam("new_tier"), tier_since=now),
+        [{"cid": r.id, "new_tier": r.new} for r in rows],
+    )
+    _emit_changes(conn, [(r.id, r.tier, r.new, r.tier_liters_90d) for r in rows], now)
+    return len(rows)
+
+
+def slide(today: Optional[date] = None) -> dict:
+    """Saca de la ventana los días vencidos (todo en una transacción)."""
+    now = datetime.utcnow()
+    edge = cutoff(today or now.date())
+    b, c = CustomerTierBucket.__table__, Customer.__table__
+
+    def left(acc, col):
+        gone = (select(func.coalesce(func.sum(col), 0.0))
+                .where(b.c.customer_id == c.c.id, b.c.day <= edge)
+                .scalar_subquery())
+        return case((acc - gone > 0, acc - gone), else_=0.0)
+
+    with db.engine.begin() as conn:
+        touched = conn.execute(
+            update(c)
+            .where(exists(select(b.c.customer_id).where(b.c.customer_id == c.c.id, b.c.day <= edge)))
+            .values(tier_liters_90d=left(c.c.tier_liters_90d, b.c.liters),
+                    tier_spend_90d=left(c.c.tier_spend_90d, b.c.spend))
+        ).rowcount
+        dropped = conn.execute(delete(b).where(b.c.day <= edge)).rowcount
+        changed = _retier(conn, now)
+
+    return {"cutoff": edge.isoformat(), "customers_touched": touched, "buckets_dropped": dropped,
+            "tier_changes": changed}
+
+
+def rebuild(today: Optional[date] = None) -> dict:
+    """Reconstruye buckets y acumuladores desde el ledger (principal + shards)."""
+    from sharding import router
+
+    now = datetime.utcnow()
+    start = datetime.combine(cutoff(today or now.date()) + timedelta(days=1), datetime.min.time())
+    t = Transaction.__table__
+    day_col = func.date(t.c.created_at)
+
+    acc = {}
+    for sess in router.ledger_sessions():
+        rows = sess.execute(
+            select(t.c.customer_id, day_col, func.coalesce(func.sum(t.c.liters), 0.0),
+                   func.coalesce(func.sum(t.c.amount_pesos), 0.0))
+            .where(Transaction.dispatch_clause(t), t.c.created_at >= start,
+                   or_(t.c.liters.isnot(None), t.c.amount_pesos.isnot(None)))
+            .group_by(t.c.customer_id, day_col)
+        )
+        for cid, day, liters, spend in rows:
+            key = (cid, day if isinstance(day, date) else date.fromisoformat(str(day)[:10]))
+            prev = acc.get(key, (0.0, 0.0))
+            acc[key] = (prev[0] + liters, prev[1] + spend)
+
+    b, c = CustomerTierBucket.__table__, Customer.__table__
+
+    def total(col):
+        return select(func.coalesce(func.sum(col), 0.0)).where(b.c.customer_id == c.c.id).scalar_subquery()
+
+    with db.engine.begin() as conn:
+        conn.execute(delete(b))
+        if acc:
+            conn.execute(insert(b), [{"customer_id": cid, "day": day, "liters": l, "spend": s}
+                                     for (cid, day), (l, s) in acc.items()])
+        conn.execute(update(c).values(tier_liters_90d=total(b.c.liters), tier_spend_90d=total(b.c.spend)))
+        changed = _retier(conn, now)
+
+    return {"buckets": len(acc), "tier_changes": changed}
+
+
+if __name__ == "__main__":
+    from app import create_app
+
+    cmd = (sys.argv[1:] or ["slide"])[0]
+    if cmd not in ("slide", "rebuild"):
+        print("uso: python tiers.py [slide|rebuild]")
+        sys.exit(2)
+
+    app = create_app()
+    with app.app_context():
+        res = slide() if cmd == "slide" else rebuild()
+    print(f"✅ Niveles ({cmd}):", ", ".join(f"{k}={v}" for k, v in res.items()))